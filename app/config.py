@@ -6,11 +6,128 @@ load_dotenv()
 class Config:
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    # GOOGLE_API_KEY is the older name the transcription service used
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
     STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
     STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
     STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
     STRIPE_PRICE_ID = os.getenv("STRIPE_PRICE_ID")
+    # How long a church's subscription status is trusted without re-reading it
+    ENTITLEMENT_CACHE_TTL_SECONDS = float(os.getenv("ENTITLEMENT_CACHE_TTL_SECONDS", "60"))
+
+    # Supabase table access: pooled keep-alive PostgREST connections (HTTP/2 with httpx[http2])
+    SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+    SUPABASE_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "60"))
+    SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "30"))
+    # Intermediate status writes wait up to this long to be merged into the row's next write
+    SUPABASE_WRITE_BEHIND_SECONDS = float(os.getenv("SUPABASE_WRITE_BEHIND_SECONDS", "30"))
+
+    # Local state (job queue, caches). API and worker must share this directory
+    # (same host or a mounted volume) so queued uploads survive a restart.
+    DATA_DIR = os.getenv("SERMONFLOW_DATA_DIR", "/tmp/sermonflow")
+    UPLOAD_DIR = os.getenv("SERMONFLOW_UPLOAD_DIR", "/tmp/sermonflow_uploads")
+
+    # Uploads
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(4 * 1024 ** 3)))
+    STORAGE_UPLOAD_MAX_RETRIES = int(os.getenv("STORAGE_UPLOAD_MAX_RETRIES", "5"))
+
+    # Ingestion Job Queue
+    JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(DATA_DIR, "jobs.db"))
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "4"))
+    JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "15"))
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+    # Ingest renditions, made in one ffmpeg pass: an archival MP3 for Storage plus a small
+    # 16 kHz mono Opus copy that transcription and generation send to Gemini instead
+    INGEST_SPEECH_RENDITION = os.getenv("INGEST_SPEECH_RENDITION", "true").lower() == "true"
+    INGEST_SPEECH_BITRATE = os.getenv("INGEST_SPEECH_BITRATE", "24k")
+    INGEST_SPEECH_SAMPLE_RATE = int(os.getenv("INGEST_SPEECH_SAMPLE_RATE", "16000"))
+    # >1 speeds the speech copy up (pitch preserved, 0.5-2.0); transcript timestamps are scaled back
+    INGEST_SPEECH_TEMPO = float(os.getenv("INGEST_SPEECH_TEMPO", "1.0"))
+    # Stream-copy AAC/Opus/MP3/FLAC source audio into the archival rendition instead of re-encoding
+    INGEST_REMUX_ENABLED = os.getenv("INGEST_REMUX_ENABLED", "true").lower() == "true"
+    YTDLP_CONCURRENT_FRAGMENTS = int(os.getenv("YTDLP_CONCURRENT_FRAGMENTS", "4"))
+    # Skip re-processing media a church already submitted (same YouTube video / upload hash)
+    INGEST_DEDUP_ENABLED = os.getenv("INGEST_DEDUP_ENABLED", "true").lower() == "true"
+
+    # Worker threads per ingestion stage
+    WORKER_CONCURRENCY_MEDIA = int(os.getenv("WORKER_CONCURRENCY_MEDIA", "2"))
+    WORKER_CONCURRENCY_UPLOAD = int(os.getenv("WORKER_CONCURRENCY_UPLOAD", "4"))
+    WORKER_CONCURRENCY_TRANSCRIBE = int(os.getenv("WORKER_CONCURRENCY_TRANSCRIBE", "4"))
+
+    # Gemini rate limiting / retries (per model)
+    GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+    GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+    GEMINI_RETRY_BASE_SECONDS = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "1"))
+    GEMINI_RETRY_MAX_SECONDS = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "60"))
+
+    # Gemini File API upload cache (shared by transcription and generation)
+    GEMINI_FILE_CACHE_PATH = os.getenv("GEMINI_FILE_CACHE_PATH", os.path.join(DATA_DIR, "gemini_files.db"))
+    GEMINI_FILE_REFRESH_MARGIN_SECONDS = int(os.getenv("GEMINI_FILE_REFRESH_MARGIN_SECONDS", str(6 * 3600)))
+    GEMINI_FILE_GC_INTERVAL_SECONDS = int(os.getenv("GEMINI_FILE_GC_INTERVAL_SECONDS", "3600"))
+
+    # Gemini explicit context caching of the per-sermon prompt prefix
+    CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+    CONTEXT_CACHE_PATH = os.getenv("CONTEXT_CACHE_PATH", os.path.join(DATA_DIR, "gemini_context_caches.db"))
+    CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+
+    # Segmented transcription for long recordings
+    TRANSCRIPTION_SEGMENTED = os.getenv("TRANSCRIPTION_SEGMENTED", "true").lower() == "true"
+    TRANSCRIPTION_SEGMENT_MIN_DURATION = float(os.getenv("TRANSCRIPTION_SEGMENT_MIN_DURATION", "1200"))
+    TRANSCRIPTION_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "600"))
+    TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS", "5"))
+    TRANSCRIPTION_MAX_CONCURRENCY = int(os.getenv("TRANSCRIPTION_MAX_CONCURRENCY", "4"))
+
+    # Transcript search index: "postgres" (transcript_segments table) or "sqlite" (local FTS5 stand-in)
+    TRANSCRIPT_INDEX_BACKEND = os.getenv("TRANSCRIPT_INDEX_BACKEND", "postgres").lower()
+    TRANSCRIPT_INDEX_PATH = os.getenv("TRANSCRIPT_INDEX_PATH", os.path.join(DATA_DIR, "transcript_index.db"))
+    TRANSCRIPT_INDEX_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPT_INDEX_SEGMENT_SECONDS", "30"))
+
+    # Generation input planning (see input_planner): what each asset type sends to Gemini
+    GENERATION_INPUT_STRATEGY = os.getenv("GENERATION_INPUT_STRATEGY", "auto").lower()
+    GENERATION_TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("GENERATION_TRANSCRIPT_TOKEN_BUDGET", "24000"))
+    GENERATION_AUDIO_EXCERPT_SECONDS = int(os.getenv("GENERATION_AUDIO_EXCERPT_SECONDS", "90"))
+    # "api" (Gemini count_tokens, once per transcript) or "local" (~4 characters per token)
+    GENERATION_TOKEN_COUNTER = os.getenv("GENERATION_TOKEN_COUNTER", "api").lower()
+
+    # LLM response cache
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.db"))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+    # Local audio cache used by generation (populated at ingest)
+    AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", os.path.join(DATA_DIR, "audio_cache"))
+    AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+
+    # Asset Generation
+    GENERATION_MAX_WORKERS = int(os.getenv("GENERATION_MAX_WORKERS", "8"))
+    # Warm ReportLab worker processes; 0 renders inline in the generation thread
+    PDF_RENDER_PROCESSES = int(os.getenv("PDF_RENDER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+    # Rendered PDFs are spooled here (kept in memory up to PDF_SPOOL_MAX_BYTES when rendering inline)
+    PDF_SPOOL_DIR = os.getenv("PDF_SPOOL_DIR", os.path.join(DATA_DIR, "pdf_spool"))
+    PDF_SPOOL_MAX_BYTES = int(os.getenv("PDF_SPOOL_MAX_BYTES", str(1024 ** 2)))
+
+    # Bulk regeneration (python -m app.regenerate): sermons processed at a time, and the
+    # checkpoint that lets an interrupted run resume
+    REGENERATION_CONCURRENCY = int(os.getenv("REGENERATION_CONCURRENCY", "4"))
+    REGENERATION_CHECKPOINT_PATH = os.getenv("REGENERATION_CHECKPOINT_PATH", os.path.join(DATA_DIR, "regeneration.db"))
+    # --mode batch: "gemini" (Batch API) or "local" (same interface, runs requests through the gateway)
+    REGENERATION_BATCH_BACKEND = os.getenv("REGENERATION_BATCH_BACKEND", "gemini").lower()
+    REGENERATION_BATCH_MAX_REQUESTS = int(os.getenv("REGENERATION_BATCH_MAX_REQUESTS", "200"))
+    # Inlined batch requests are capped at 20MB per job
+    REGENERATION_BATCH_MAX_BYTES = int(os.getenv("REGENERATION_BATCH_MAX_BYTES", str(16 * 1024 ** 2)))
+    REGENERATION_BATCH_POLL_SECONDS = float(os.getenv("REGENERATION_BATCH_POLL_SECONDS", "30"))
+
+    # API cold start: "off", "background" (warm up while already serving) or "blocking"
+    # (finish before accepting requests). See app/services/startup.py
+    STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "off").lower()
+
+    # Observability: Prometheus text on the API's /metrics and on the worker's port;
+    # OpenTelemetry traces are exported when an OTLP endpoint is configured
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+    OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
 
     if not SUPABASE_URL:
         # In production this might log a warning, for now we raise to fail fast
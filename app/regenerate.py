@@ -0,0 +1,75 @@
+"""
+Bulk regeneration of a church's back catalogue, e.g. after its deep_research_profile
+or branding_assets changed:
+
+    python -m app.regenerate --church <church_id> [--series "Romans"]
+        [--since 2024-01-01] [--until 2025-01-01] [--asset-types small_group,devotional]
+        [--mode generate|rerender|batch] [--concurrency 4]
+
+Existing `assets` rows are regenerated in place. `generate` runs Gemini and the PDF
+render for each asset, `rerender` only re-draws the PDFs from the stored Markdown
+(enough for a branding change) and `batch` sends the prompts through Gemini's Batch
+API (REGENERATION_BATCH_BACKEND=local runs them through the normal gateway instead).
+Progress is checkpointed in REGENERATION_CHECKPOINT_PATH: running the same command
+again resumes, skipping finished assets and retrying failed ones.
+"""
+import argparse
+import sys
+
+from app.config import Config
+from app.services import metrics
+from app.services.pdf_engine import shutdown_pdf_render_pool
+from app.services.repository import shutdown_repository
+from app.services.regeneration import (
+    CatalogRegenerator,
+    MODES,
+    MODE_GENERATE,
+    Selection,
+    ITEM_FAILED,
+)
+
+
+def _csv(value: str):
+    return tuple(part.strip() for part in value.split(",") if part.strip())
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.regenerate", description="Regenerate a church's existing assets.")
+    parser.add_argument("--church", required=True, help="church id")
+    parser.add_argument("--series", help="only sermons in this series (exact series_title)")
+    parser.add_argument("--since", help="only sermons created on or after this date (ISO 8601)")
+    parser.add_argument("--until", help="only sermons created before this date (ISO 8601)")
+    parser.add_argument("--sermons", type=_csv, default=(), help="comma-separated sermon ids")
+    parser.add_argument("--asset-types", type=_csv, default=(), help="comma-separated asset types (default: all)")
+    parser.add_argument("--mode", choices=MODES, default=MODE_GENERATE)
+    parser.add_argument("--concurrency", type=int, default=Config.REGENERATION_CONCURRENCY, help="sermons at a time")
+    parser.add_argument("--fresh", action="store_true", help="ignore the LLM response cache")
+    parser.add_argument("--run-id", help="checkpoint id (default: derived from the selection and mode)")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and start over")
+    parser.add_argument("--no-wait", action="store_true", help="batch mode: submit and exit; run again to collect")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    metrics.configure_tracing("sermonflow-regenerate")
+    selection = Selection(
+        church_id=args.church,
+        series_title=args.series,
+        since=args.since,
+        until=args.until,
+        asset_types=args.asset_types,
+        sermon_ids=args.sermons,
+    )
+    regenerator = CatalogRegenerator(mode=args.mode, concurrency=args.concurrency, use_cache=not args.fresh)
+    try:
+        counts = regenerator.run(selection, run_id=args.run_id, restart=args.restart, wait=not args.no_wait)
+    finally:
+        # Write out any status updates still held in the write-behind buffer
+        shutdown_repository()
+        shutdown_pdf_render_pool()
+    return 1 if counts.get(ITEM_FAILED) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
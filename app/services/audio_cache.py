@@ -0,0 +1,219 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+
+from app.config import Config
+from app.services import metrics
+
+
+class AudioCache:
+    """
+    On-disk, content-addressed cache of sermon audio, so repeat generations skip
+    the download from Supabase Storage.
+
+    Layout under AUDIO_CACHE_DIR:
+        objects/<sha256>        audio bytes, named by content hash
+        urls/<sha256(url)>      pointer file holding the content hash for an audio_url
+        work/<time>-<id><ext>   per-request hardlinks handed to callers, named with
+                                the checkout time
+
+    Writes go to a temp file and are renamed into place, so concurrent workers
+    (threads or processes sharing the directory) never see a partial file.
+    Callers get a hardlink they own and delete when done; eviction can then
+    unlink the object at any time without breaking an in-flight request.
+    Eviction is least-recently-used by mtime, which is bumped on every hit.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = root or Config.AUDIO_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else Config.AUDIO_CACHE_MAX_BYTES
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.urls_dir = os.path.join(self.root, "urls")
+        self.work_dir = os.path.join(self.root, "work")
+        for d in (self.objects_dir, self.urls_dir, self.work_dir):
+            os.makedirs(d, exist_ok=True)
+        self._evict_lock = threading.Lock()
+
+    def _url_key(self, url: str) -> str:
+        # Strip signed-URL query strings so the same object maps to one key
+        return hashlib.sha256(url.split("?", 1)[0].encode()).hexdigest()
+
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256)
+
+    def _tmp_path(self, directory: str) -> str:
+        return os.path.join(directory, f".tmp-{uuid.uuid4().hex}")
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Returns the content hash cached for `url`, if its object is still present."""
+        try:
+            with open(os.path.join(self.urls_dir, self._url_key(url))) as f:
+                sha256 = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return sha256 if os.path.exists(self._object_path(sha256)) else None
+
+    def fetch(self, url: str, suffix: str = None) -> Tuple[str, str]:
+        """
+        Returns (path, sha256) for the audio at `url`, downloading only on a miss.
+        The path is a private hardlink; the caller must delete it when done. It keeps
+        the URL's extension (unless `suffix` is given) so the MIME type can be guessed.
+        """
+        suffix = suffix or os.path.splitext(url.split("?", 1)[0])[1] or ".mp3"
+        sha256 = self.lookup(url)
+        if sha256 is not None:
+            link = self._checkout(sha256, suffix)
+            if link is not None:
+                print(f"Audio cache hit: {url}")
+                metrics.record_cache("audio", True)
+                return link, sha256
+
+        metrics.record_cache("audio", False)
+        print(f"Downloading Audio: {url}")
+        with metrics.span("storage", "download_audio"):
+            sha256 = self._download(url)
+        metrics.record_bytes("storage", "download", os.path.getsize(self._object_path(sha256)))
+        self._write_pointer(url, sha256)
+        self.evict()
+        link = self._checkout(sha256, suffix)
+        if link is None:
+            raise Exception("Audio evicted immediately after download; AUDIO_CACHE_MAX_BYTES too small?")
+        return link, sha256
+
+    def put(self, path: str, url: str = None) -> str:
+        """Adds a local file to the cache (e.g. at ingest time). Returns its content hash."""
+        digest = hashlib.sha256()
+        tmp = self._tmp_path(self.objects_dir)
+        try:
+            with open(path, "rb") as src, open(tmp, "wb") as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            sha256 = digest.hexdigest()
+            os.replace(tmp, self._object_path(sha256))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        if url:
+            self._write_pointer(url, sha256)
+        self.evict()
+        return sha256
+
+    def _download(self, url: str) -> str:
+        import httpx
+
+        digest = hashlib.sha256()
+        tmp = self._tmp_path(self.objects_dir)
+        try:
+            with httpx.Client() as client:
+                with client.stream("GET", url) as r:
+                    r.raise_for_status()
+                    with open(tmp, "wb") as f:
+                        for chunk in r.iter_bytes():
+                            digest.update(chunk)
+                            f.write(chunk)
+            sha256 = digest.hexdigest()
+            os.replace(tmp, self._object_path(sha256))
+            return sha256
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _write_pointer(self, url: str, sha256: str):
+        tmp = self._tmp_path(self.urls_dir)
+        with open(tmp, "w") as f:
+            f.write(sha256)
+        os.replace(tmp, os.path.join(self.urls_dir, self._url_key(url)))
+
+    def _checkout(self, sha256: str, suffix: str) -> Optional[str]:
+        src = self._object_path(sha256)
+        # A hardlink shares the object's mtime, which every checkout bumps, so the
+        # link's age is kept in its name for the abandoned-link sweep in evict()
+        link = os.path.join(self.work_dir, f"{int(time.time())}-{uuid.uuid4().hex}{suffix}")
+        try:
+            os.utime(src)  # LRU touch
+            try:
+                os.link(src, link)
+            except OSError:
+                shutil.copyfile(src, link)  # e.g. filesystems without hardlinks
+            return link
+        except FileNotFoundError:
+            return None  # evicted between lookup and checkout
+
+    def evict(self):
+        """
+        Deletes least-recently-used objects until the cache fits in max_bytes. Live work
+        links count toward the budget when they hold bytes no object does (copies, or
+        links to evicted objects); objects that are checked out are kept, since deleting
+        them would free nothing.
+        """
+        with self._evict_lock:
+            # Drop links abandoned by crashed requests first (dangling URL pointers are
+            # harmless; lookup() treats them as misses)
+            cutoff = time.time() - 24 * 3600
+            for entry in os.scandir(self.work_dir):
+                try:
+                    if self._checked_out_at(entry) < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+            entries = []
+            inodes = set()
+            total = 0
+            for entry in os.scandir(self.objects_dir):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, st.st_nlink, entry.path))
+                inodes.add((st.st_dev, st.st_ino))
+                total += st.st_size
+            for entry in os.scandir(self.work_dir):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if (st.st_dev, st.st_ino) not in inodes:
+                    inodes.add((st.st_dev, st.st_ino))
+                    total += st.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, links, path in sorted(entries):
+                if links > 1:
+                    continue  # checked out; the bytes stay on disk until the caller is done
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    @staticmethod
+    def _checked_out_at(entry: os.DirEntry) -> float:
+        stamp = entry.name.split("-", 1)[0]
+        if stamp.isdigit():
+            return float(stamp)
+        return entry.stat().st_mtime  # links from before names carried the time
+
+
+_cache: Optional[AudioCache] = None
+_cache_lock = threading.Lock()
+
+def get_audio_cache() -> AudioCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AudioCache()
+    return _cache
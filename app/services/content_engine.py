@@ -1,60 +1,303 @@
 import os
-import time
-from google import genai
-from google.genai import types
+import threading
+from typing import Iterator, Optional
 from app.models.schemas import DeepResearchProfile
-from app.config import Config
 from app.services.prompt_builder import PromptBuilder
+from app.config import Config
+from app.services.gemini_file_cache import get_gemini_file_cache, sha256_file
+from app.services.llm_cache import get_response_cache, response_cache_key
+from app.services.gemini_gateway import GeminiError, get_gemini_gateway
+from app.services.context_cache import get_context_cache
+from app.services import metrics
+
+# Gemini 3.0 Configuration
+# "everything else should be 3 flash" -> gemini-3-flash-preview
+CONTENT_MODEL = "gemini-3-flash-preview"
+CONTENT_TEMPERATURE = 0.7
 
 class ContentGenerator:
     def __init__(self):
         self.prompt_builder = PromptBuilder()
 
-    def _upload_file(self, client: genai.Client, path: str, mime_type: str = "audio/mp3"):
-        """Uploads a file to the Gemini File API."""
-        print(f"Uploading file: {path}")
-        file_ref = client.files.upload(file=path, config={"mime_type": mime_type})
-        print(f"Uploaded file: {file_ref.name}")
-        return file_ref
-
-    def _call_llm(self, system_prompt: str, user_prompt: str, audio_path: str = None) -> str:
-        if not Config.GEMINI_API_KEY:
-            return "Error: GEMINI_API_KEY not set. Cannot generate content."
-            
+    def _upload_file(self, path: str, mime_type: str = None, sha256: str = None):
+        """
+        Uploads a file to the Gemini File API, reusing an earlier upload of the same bytes.
+        The MIME type defaults to a guess from the extension (MP3 archival or Opus speech copy).
+        """
+        return get_gemini_file_cache().get_or_upload(path, mime_type=mime_type, sha256=sha256)
+
+    def _audio_part(self, audio_path: str = None, audio_file=None, audio_sha256: str = None):
+        # If audio is present, upload (unless already uploaded)
+        if audio_file is not None:
+            return audio_file
+        if audio_path and os.path.exists(audio_path):
+            return self._upload_file(audio_path, sha256=audio_sha256)
+        return None
+
+    def _context_cache_name(
+        self,
+        system_prompt: str,
+        context_prompt: str,
+        audio_path: str = None,
+        audio_file=None,
+        audio_sha256: str = None,
+    ):
+        """Name of the Gemini cached content holding the sermon prefix, or None to send it inline."""
+        if not Config.CONTEXT_CACHE_ENABLED:
+            return None
         try:
-            client = genai.Client(api_key=Config.GEMINI_API_KEY)
-            
-            contents = []
-            
-            # If audio is present, upload and add to contents
-            if audio_path and os.path.exists(audio_path):
-                # We assume MP3 for now, but could detect
-                audio_file = self._upload_file(client, audio_path)
-                contents.append(audio_file)
-            
-            # Add text prompt
-            contents.append(user_prompt)
-
-            # Gemini 3.0 Configuration
-            # "everything else should be 3 flash" -> gemini-3-flash-preview
-            # We use system_instruction in the config
-            response = client.models.generate_content(
-                model="gemini-3-flash-preview",
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    temperature=0.7, 
+            return get_context_cache().get_or_create(
+                CONTENT_MODEL,
+                system_prompt,
+                context_prompt,
+                audio_sha256=audio_sha256,
+                audio_loader=lambda: self._audio_part(audio_path, audio_file, audio_sha256),
+            )
+        except GeminiError as e:
+            print(f"Gemini context cache unavailable ({e}); sending prompts inline.")
+            return None
+
+    def _cache_gone(self, cache_name: str, e: GeminiError):
+        if e.code not in (403, 404):
+            raise e
+        # Cache expired or was deleted under us
+        print(f"Gemini context cache {cache_name} gone ({e}); sending prompts inline.")
+        get_context_cache().invalidate(cache_name)
+
+    def _inline_request(
+        self,
+        system_prompt: str,
+        context_prompt: str,
+        task_prompt: str,
+        audio_path: str = None,
+        audio_file=None,
+        audio_sha256: str = None,
+    ):
+        contents = []
+        audio = self._audio_part(audio_path, audio_file, audio_sha256)
+        if audio is not None:
+            contents.append(audio)
+
+        # Add text prompt
+        contents.append(context_prompt + task_prompt)
+
+        # We use system_instruction in the config
+        from google.genai import types
+
+        config = types.GenerateContentConfig(
+            system_instruction=system_prompt,
+            temperature=CONTENT_TEMPERATURE,
+        )
+        return contents, config
+
+    def _call_llm(
+        self,
+        system_prompt: str,
+        context_prompt: str,
+        task_prompt: str,
+        audio_path: str = None,
+        audio_file=None,
+        audio_sha256: str = None,
+    ) -> str:
+        """
+        Calls Gemini through the shared gateway (rate limiting + retries).
+        The sermon prefix (profile, audio, transcript) goes through an explicit context
+        cache when possible, so only the task prompt is sent per asset; otherwise
+        everything is sent inline.
+        Raises GeminiError on failure, so an error never ends up rendered into a PDF.
+        """
+        from google.genai import types
+
+        gateway = get_gemini_gateway()
+
+        cache_name = self._context_cache_name(system_prompt, context_prompt, audio_path, audio_file, audio_sha256)
+        if cache_name is not None:
+            try:
+                response = gateway.generate_content(
+                    model=CONTENT_MODEL,
+                    contents=[task_prompt],
+                    config=types.GenerateContentConfig(
+                        cached_content=cache_name,
+                        temperature=CONTENT_TEMPERATURE,
+                    )
+                )
+                return response.text
+            except GeminiError as e:
+                self._cache_gone(cache_name, e)
+
+        contents, config = self._inline_request(
+            system_prompt, context_prompt, task_prompt, audio_path, audio_file, audio_sha256
+        )
+        response = gateway.generate_content(model=CONTENT_MODEL, contents=contents, config=config)
+        return response.text
+
+    def _stream_llm(
+        self,
+        system_prompt: str,
+        context_prompt: str,
+        task_prompt: str,
+        audio_path: str = None,
+        audio_file=None,
+        audio_sha256: str = None,
+    ) -> Iterator[str]:
+        """`_call_llm` over generate_content_stream; yields text as it arrives."""
+        from google.genai import types
+
+        gateway = get_gemini_gateway()
+
+        stream = None
+        cache_name = self._context_cache_name(system_prompt, context_prompt, audio_path, audio_file, audio_sha256)
+        if cache_name is not None:
+            try:
+                stream = gateway.generate_content_stream(
+                    model=CONTENT_MODEL,
+                    contents=[task_prompt],
+                    config=types.GenerateContentConfig(
+                        cached_content=cache_name,
+                        temperature=CONTENT_TEMPERATURE,
+                    )
                 )
+            except GeminiError as e:
+                self._cache_gone(cache_name, e)
+
+        if stream is None:
+            contents, config = self._inline_request(
+                system_prompt, context_prompt, task_prompt, audio_path, audio_file, audio_sha256
             )
-            return response.text
-        except Exception as e:
-            # Clean up logic for file could go here if we tracked the file_name
-            return f"Error calling Gemini API: {str(e)}"
+            stream = gateway.generate_content_stream(model=CONTENT_MODEL, contents=contents, config=config)
 
-    def generate(self, profile: DeepResearchProfile, transcript: str, asset_type: str, audio_path: str = None) -> str:
-        # Build Prompts
+        for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    def _prepare(self, profile: DeepResearchProfile, transcript: str, asset_type: str, audio_path, audio_file, audio_sha256, sources):
+        """Builds the prompts and the response-cache key. Returns (prompts, audio_sha256, key)."""
         system_prompt = self.prompt_builder.build_system_prompt(profile)
-        user_prompt = self.prompt_builder.build_user_prompt(asset_type, transcript)
-        
+        context_prompt = self.prompt_builder.build_context_prompt(transcript)
+        if sources:
+            task_prompt = self.prompt_builder.build_task_prompt(asset_type, sources)
+        else:
+            task_prompt = self.prompt_builder.build_task_prompt(asset_type)
+        user_prompt = context_prompt + task_prompt
+
+        if audio_sha256 is None:
+            if audio_file is not None:
+                # Only the remote name is known; good enough to key reuse of this upload
+                audio_sha256 = audio_file.name
+            elif audio_path and os.path.exists(audio_path):
+                audio_sha256 = sha256_file(audio_path)
+
+        key = response_cache_key(system_prompt, user_prompt, audio_sha256, CONTENT_MODEL, CONTENT_TEMPERATURE)
+        return (system_prompt, context_prompt, task_prompt), audio_sha256, key
+
+    def _cached_response(self, key: str, asset_type: str, use_cache: bool) -> Optional[str]:
+        cache = get_response_cache() if Config.LLM_CACHE_ENABLED else None
+        if cache and use_cache:
+            cached = cache.get(key)
+            metrics.record_cache("llm_response", cached is not None)
+            if cached is not None:
+                print(f"LLM cache hit for {asset_type}")
+                return cached
+        return None
+
+    def _store_response(self, key: str, text: str):
+        if Config.LLM_CACHE_ENABLED and text:
+            get_response_cache().put(key, text, model=CONTENT_MODEL)
+
+    def batch_request(
+        self,
+        profile: DeepResearchProfile,
+        transcript: str,
+        asset_type: str,
+        use_cache: bool = True,
+        sources: str = None,
+    ):
+        """
+        For the Gemini Batch API: returns (key, request, cached). `request` is one inlined,
+        text-only generate_content request, `key` its response-cache key (pass the
+        response to `store_response` with it) and `cached` the cached response, if any,
+        in which case the request needn't be sent at all.
+        """
+        (system_prompt, context_prompt, task_prompt), _, key = self._prepare(
+            profile, transcript, asset_type, None, None, None, sources
+        )
+        request = {
+            "contents": [context_prompt + task_prompt],
+            "config": {"system_instruction": system_prompt, "temperature": CONTENT_TEMPERATURE},
+        }
+        return key, request, self._cached_response(key, asset_type, use_cache)
+
+    def store_response(self, key: str, text: str):
+        self._store_response(key, text)
+
+    def generate(
+        self,
+        profile: DeepResearchProfile,
+        transcript: str,
+        asset_type: str,
+        audio_path: str = None,
+        audio_file=None,
+        audio_sha256: str = None,
+        use_cache: bool = True,
+        sources: str = None,
+    ) -> str:
+        """
+        Responses are cached on (system prompt, user prompt, audio hash, model, temperature),
+        so regenerating with unchanged inputs returns in milliseconds without touching Gemini.
+        `use_cache=False` forces a fresh call (the new response still refreshes the cache).
+        `audio_file` is an already-uploaded File API reference, used instead of `audio_path`.
+        `sources` describes the attached inputs in the task prompt (see input_planner).
+        """
+        prompts, audio_sha256, key = self._prepare(
+            profile, transcript, asset_type, audio_path, audio_file, audio_sha256, sources
+        )
+        cached = self._cached_response(key, asset_type, use_cache)
+        if cached is not None:
+            return cached
+
         # Call LLM
-        return self._call_llm(system_prompt, user_prompt, audio_path)
+        text = self._call_llm(*prompts, audio_path, audio_file=audio_file, audio_sha256=audio_sha256)
+        self._store_response(key, text)
+        return text
+
+    def generate_stream(
+        self,
+        profile: DeepResearchProfile,
+        transcript: str,
+        asset_type: str,
+        audio_path: str = None,
+        audio_file=None,
+        audio_sha256: str = None,
+        use_cache: bool = True,
+        sources: str = None,
+    ) -> Iterator[str]:
+        """
+        `generate`, yielding the Markdown piece by piece as Gemini produces it.
+        A response-cache hit is yielded in one piece; a fresh response is cached once
+        the stream has finished.
+        """
+        prompts, audio_sha256, key = self._prepare(
+            profile, transcript, asset_type, audio_path, audio_file, audio_sha256, sources
+        )
+        cached = self._cached_response(key, asset_type, use_cache)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        for text in self._stream_llm(*prompts, audio_path, audio_file=audio_file, audio_sha256=audio_sha256):
+            parts.append(text)
+            yield text
+        self._store_response(key, "".join(parts))
+
+
+_generator: Optional[ContentGenerator] = None
+_lock = threading.Lock()
+
+def get_content_generator() -> ContentGenerator:
+    global _generator
+    if _generator is None:
+        with _lock:
+            if _generator is None:
+                _generator = ContentGenerator()
+    return _generator
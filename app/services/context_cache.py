@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Set
+
+from app.config import Config
+from app.services import metrics
+from app.services.gemini_gateway import GeminiError, get_gemini_gateway
+
+DISPLAY_NAME_PREFIX = "sermonflow-ctx-"
+# Don't start a generation on a cache that is about to expire under it
+MIN_REMAINING_SECONDS = 120
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gemini_context_caches (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    model TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def context_cache_key(key_id: str, model: str, system_prompt: str, context_prompt: str, audio_sha256: Optional[str]) -> str:
+    """Hash of everything that goes into the cached prefix."""
+    payload = json.dumps([key_id, model, system_prompt, context_prompt, audio_sha256 or ""], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ContextCache:
+    """
+    Keeps one Gemini cached-content object per sermon prefix (church profile as the
+    system instruction, then audio + transcript), so every asset type generated for
+    the sermon only sends its short task prompt.
+
+    Caches live for CONTEXT_CACHE_TTL_SECONDS and are extended when reused past half
+    their lifetime, so they last for a working session and then expire server-side.
+    Names are recorded in SQLite so the API and other workers share them. Prefixes
+    Gemini refuses to cache (e.g. below the model's minimum token count) are
+    remembered for the life of the process so we don't ask again.
+    """
+
+    def __init__(self, path: str = None, ttl_seconds: int = None):
+        self.path = path or Config.CONTEXT_CACHE_PATH
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.CONTEXT_CACHE_TTL_SECONDS
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._uncacheable: Set[str] = set()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_or_create(
+        self,
+        model: str,
+        system_prompt: str,
+        context_prompt: str,
+        audio_sha256: str = None,
+        audio_loader: Callable = None,
+    ) -> Optional[str]:
+        """
+        Returns the cached-content name for this prefix, creating it on a miss.
+        `audio_loader` returns the File API reference for the audio and is only called
+        when a cache has to be created. Returns None if the prefix can't be cached;
+        raises GeminiError if creation failed for another reason.
+        """
+        gateway = get_gemini_gateway()
+        key = context_cache_key(gateway.key_id, model, system_prompt, context_prompt, audio_sha256)
+
+        # Serialize per prefix so a batch of asset types creates the cache once
+        with self._lock_for(key):
+            if key in self._uncacheable:
+                return None
+
+            name = self._lookup(gateway, key)
+            metrics.record_cache("gemini_context", name is not None)
+            if name is not None:
+                print(f"Gemini context cache hit: {name}")
+                return name
+
+            contents = []
+            audio = audio_loader() if audio_loader else None
+            if audio is not None:
+                contents.append(audio)
+            contents.append(context_prompt)
+
+            from google.genai import types
+
+            try:
+                cached = gateway.create_cache(
+                    model,
+                    types.CreateCachedContentConfig(
+                        system_instruction=system_prompt,
+                        contents=contents,
+                        ttl=f"{self.ttl_seconds}s",
+                        display_name=f"{DISPLAY_NAME_PREFIX}{key[:16]}",
+                    ),
+                )
+            except GeminiError as e:
+                if e.code == 400:
+                    # Too few tokens for this model, or a model without caching support
+                    print(f"Gemini context cache not available for this prefix ({e}); sending prompts inline.")
+                    self._uncacheable.add(key)
+                    return None
+                raise
+
+            print(f"Created Gemini context cache: {cached.name}")
+            self._store(key, cached, model)
+            return cached.name
+
+    def _lookup(self, gateway, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT name, expires_at FROM gemini_context_caches WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        remaining = row["expires_at"] - time.time()
+        if remaining < MIN_REMAINING_SECONDS:
+            self.invalidate(row["name"])
+            return None
+
+        if remaining < self.ttl_seconds / 2:
+            from google.genai import types
+
+            try:
+                updated = gateway.update_cache(row["name"], types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"))
+            except GeminiError as e:
+                print(f"Gemini context cache {row['name']} could not be extended ({e}); recreating.")
+                self.invalidate(row["name"])
+                return None
+            self._conn().execute(
+                "UPDATE gemini_context_caches SET expires_at = ? WHERE key = ?",
+                (self._expires_at(updated), key),
+            )
+        return row["name"]
+
+    def _expires_at(self, cached) -> float:
+        expire_time = getattr(cached, "expire_time", None)
+        return expire_time.timestamp() if expire_time else time.time() + self.ttl_seconds
+
+    def _store(self, key: str, cached, model: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO gemini_context_caches (key, name, model, expires_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, cached.name, model, self._expires_at(cached), time.time()),
+        )
+
+    def invalidate(self, name: str):
+        """Forgets a cache, e.g. after Gemini reports it gone."""
+        self._conn().execute("DELETE FROM gemini_context_caches WHERE name = ?", (name,))
+        self._conn().execute("DELETE FROM gemini_context_caches WHERE expires_at < ?", (time.time(),))
+
+
+_cache: Optional[ContextCache] = None
+_cache_lock = threading.Lock()
+
+def get_context_cache() -> ContextCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ContextCache()
+    return _cache
@@ -0,0 +1,198 @@
+import hashlib
+import mimetypes
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from app.config import Config
+from app.services import metrics
+from app.services.gemini_gateway import get_gemini_gateway
+
+# Gemini File API files are deleted server-side ~48h after upload.
+GEMINI_FILE_TTL_SECONDS = 48 * 3600
+DISPLAY_NAME_PREFIX = "sermonflow-"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS gemini_files (
+    sha256 TEXT NOT NULL,
+    key_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    mime_type TEXT,
+    size_bytes INTEGER,
+    expires_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    PRIMARY KEY (sha256, key_id)
+);
+"""
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class GeminiFileCache:
+    """
+    Maps audio content (SHA-256) to an uploaded Gemini File API file, so the same bytes
+    are uploaded once and shared by transcription and every later generation.
+
+    Entries are keyed per API key, since uploaded files are only visible to the project
+    that uploaded them. A file is reused while it is ACTIVE and has more than
+    GEMINI_FILE_REFRESH_MARGIN_SECONDS left; otherwise it is re-uploaded and the old
+    remote file deleted. `gc` removes expired entries and orphaned remote files.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.GEMINI_FILE_CACHE_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_or_upload(self, path: str, mime_type: str = None, sha256: str = None):
+        """
+        Returns an ACTIVE File API file for the contents of `path`, uploading only on a miss.
+        Pass `sha256` if the caller already knows the content hash.
+        """
+        gateway = get_gemini_gateway()
+        sha256 = sha256 or sha256_file(path)
+        key_id = gateway.key_id
+        mime_type = mime_type or mimetypes.guess_type(path)[0] or "audio/mpeg"
+
+        # Serialize per content hash so concurrent callers don't upload the same bytes twice.
+        with self._lock_for(f"{key_id}:{sha256}"):
+            file_ref = self._lookup(gateway, sha256, key_id)
+            metrics.record_cache("gemini_files", file_ref is not None)
+            if file_ref is not None:
+                print(f"Gemini file cache hit: {file_ref.name}")
+                return file_ref
+
+            print(f"Uploading file: {path}")
+            size = os.path.getsize(path)
+            with metrics.span("gemini", "file_upload", sha256=sha256):
+                file_ref = gateway.upload_file(
+                    path,
+                    config={"mime_type": mime_type, "display_name": f"{DISPLAY_NAME_PREFIX}{sha256[:16]}"}
+                )
+                file_ref = gateway.wait_until_active(file_ref)
+            metrics.record_bytes("gemini_files", "upload", size)
+            print(f"Uploaded file: {file_ref.name}")
+            self._store(sha256, key_id, file_ref, mime_type, size)
+            return file_ref
+
+    def _lookup(self, gateway, sha256: str, key_id: str):
+        row = self._conn().execute(
+            "SELECT * FROM gemini_files WHERE sha256 = ? AND key_id = ?", (sha256, key_id)
+        ).fetchone()
+        if row is None:
+            return None
+
+        if row["expires_at"] - time.time() < Config.GEMINI_FILE_REFRESH_MARGIN_SECONDS:
+            # Too close to server-side expiry to start a long request with it; replace it.
+            self._evict(gateway, row)
+            return None
+
+        try:
+            file_ref = gateway.get_file(row["name"])
+            file_ref = gateway.wait_until_active(file_ref)
+        except Exception as e:
+            print(f"Cached Gemini file {row['name']} unusable ({e}); re-uploading.")
+            self._evict(gateway, row)
+            return None
+
+        self._conn().execute(
+            "UPDATE gemini_files SET last_used_at = ? WHERE sha256 = ? AND key_id = ?",
+            (time.time(), sha256, key_id),
+        )
+        return file_ref
+
+    def _store(self, sha256: str, key_id: str, file_ref, mime_type: str, size_bytes: int):
+        now = time.time()
+        expiration = getattr(file_ref, "expiration_time", None)
+        expires_at = expiration.timestamp() if expiration else now + GEMINI_FILE_TTL_SECONDS
+        self._conn().execute(
+            "INSERT OR REPLACE INTO gemini_files "
+            "(sha256, key_id, name, uri, mime_type, size_bytes, expires_at, created_at, last_used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (sha256, key_id, file_ref.name, file_ref.uri, mime_type, size_bytes, expires_at, now, now),
+        )
+
+    def _evict(self, gateway, row: sqlite3.Row):
+        self._conn().execute(
+            "DELETE FROM gemini_files WHERE sha256 = ? AND key_id = ? AND name = ?",
+            (row["sha256"], row["key_id"], row["name"]),
+        )
+        try:
+            gateway.delete_file(row["name"])
+        except Exception:
+            pass  # Already gone server-side
+
+    def gc(self) -> int:
+        """
+        Deletes cache entries that are near expiry, and remote files we uploaded that the
+        cache no longer references (crashed uploads, replaced entries). Returns the number
+        of remote files deleted.
+        """
+        gateway = get_gemini_gateway()
+        key_id = gateway.key_id
+        cutoff = time.time() + Config.GEMINI_FILE_REFRESH_MARGIN_SECONDS
+        deleted = 0
+
+        for row in self._conn().execute(
+            "SELECT * FROM gemini_files WHERE key_id = ? AND expires_at < ?", (key_id, cutoff)
+        ).fetchall():
+            self._evict(gateway, row)
+            deleted += 1
+
+        known = {
+            row["name"] for row in self._conn().execute(
+                "SELECT name FROM gemini_files WHERE key_id = ?", (key_id,)
+            ).fetchall()
+        }
+        try:
+            for remote in gateway.list_files():
+                display_name = getattr(remote, "display_name", None) or ""
+                if display_name.startswith(DISPLAY_NAME_PREFIX) and remote.name not in known:
+                    # Skip recent uploads that another worker may not have recorded yet
+                    created = getattr(remote, "create_time", None)
+                    if created is None or time.time() - created.timestamp() < 3600:
+                        continue
+                    gateway.delete_file(remote.name)
+                    deleted += 1
+        except Exception as e:
+            print(f"Gemini file GC listing failed: {e}")
+
+        return deleted
+
+
+_cache: Optional[GeminiFileCache] = None
+_cache_lock = threading.Lock()
+
+def get_gemini_file_cache() -> GeminiFileCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GeminiFileCache()
+    return _cache
@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from app.config import Config
+from app.services import metrics
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+THROTTLE_MARKERS = ("RESOURCE_EXHAUSTED", "429", "rate limit", "quota")
+
+
+class GeminiError(Exception):
+    """Raised when a Gemini call fails for good (after retries, or non-retryable)."""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+def _error_code(e: Exception) -> Optional[int]:
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def _is_throttle(e: Exception) -> bool:
+    return _error_code(e) == 429 or any(m in str(e) for m in THROTTLE_MARKERS)
+
+
+def _is_retryable(e: Exception) -> bool:
+    code = _error_code(e)
+    if code is not None:
+        return code in RETRYABLE_CODES
+    # Transport-level failures (connection reset, timeouts) carry no status code
+    return _is_throttle(e) or isinstance(e, (ConnectionError, TimeoutError)) or "UNAVAILABLE" in str(e)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose refill rate backs off on throttling (halves on every 429) and
+    creeps back up on success (additive increase), so a burst settles just under the
+    real quota instead of hammering it.
+    """
+
+    def __init__(self, requests_per_minute: float, min_requests_per_minute: float = 1.0):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = min_requests_per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token (possibly going into debt) and returns how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class GeminiGateway:
+    """
+    Process-wide access point for Gemini. Holds the one `genai.Client` (so HTTP
+    connections are reused), applies a per-model adaptive rate limit, and retries
+    transient failures with jittered exponential backoff. Errors are raised as
+    GeminiError rather than returned as text.
+    """
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or Config.GEMINI_API_KEY
+        if not self.api_key:
+            raise GeminiError("GEMINI_API_KEY not set. Cannot call Gemini.")
+        # The SDK takes a noticeable share of cold start; only load it once Gemini is needed
+        from google import genai
+
+        self.client = genai.Client(api_key=self.api_key)
+        self._limiters: Dict[str, AdaptiveRateLimiter] = {}
+        self._limiters_lock = threading.Lock()
+
+    @property
+    def aio(self):
+        return self.client.aio
+
+    @property
+    def key_id(self) -> str:
+        """Short fingerprint of the API key; uploads and caches are only visible to their project."""
+        return hashlib.sha256(self.api_key.encode()).hexdigest()[:12]
+
+    def limiter(self, model: str) -> AdaptiveRateLimiter:
+        with self._limiters_lock:
+            if model not in self._limiters:
+                self._limiters[model] = AdaptiveRateLimiter(Config.GEMINI_REQUESTS_PER_MINUTE)
+            return self._limiters[model]
+
+    def _backoff(self, attempt: int) -> float:
+        base = Config.GEMINI_RETRY_BASE_SECONDS * (2 ** attempt)
+        return min(Config.GEMINI_RETRY_MAX_SECONDS, random.uniform(0, base))  # full jitter
+
+    def _record_success(self, model: str, result, started: float):
+        metrics.GEMINI_REQUESTS.inc(model=model, outcome="ok")
+        metrics.GEMINI_DURATION.observe(time.perf_counter() - started, model=model)
+        metrics.record_gemini_usage(model, result)
+
+    def _record_failure(self, model: str, started: float):
+        metrics.GEMINI_REQUESTS.inc(model=model, outcome="error")
+        metrics.GEMINI_DURATION.observe(time.perf_counter() - started, model=model)
+
+    def call(self, model: Optional[str], fn, /, *args, **kwargs):
+        """
+        Runs a blocking SDK call with rate limiting and retries.
+        `model` selects the limiter bucket; pass None for file operations. It is
+        positional-only, so `model=` in kwargs still reaches the SDK call.
+        """
+        model_label = model or "files"
+        limiter = self.limiter(model_label)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+                limiter.on_success()
+                self._record_success(model_label, result, started)
+                return result
+            except Exception as e:
+                if _is_throttle(e):
+                    limiter.on_throttled()
+                if not _is_retryable(e) or attempt >= Config.GEMINI_MAX_RETRIES:
+                    self._record_failure(model_label, started)
+                    raise GeminiError(f"Gemini call failed: {e}", code=_error_code(e)) from e
+                metrics.GEMINI_RETRIES.inc(model=model_label, reason="throttled" if _is_throttle(e) else "transient")
+                delay = self._backoff(attempt)
+                print(f"Gemini call failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, model: Optional[str], fn, /, *args, **kwargs):
+        """Async twin of `call` for `client.aio` coroutines."""
+        model_label = model or "files"
+        limiter = self.limiter(model_label)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            await limiter.acquire_async()
+            try:
+                result = await fn(*args, **kwargs)
+                limiter.on_success()
+                self._record_success(model_label, result, started)
+                return result
+            except Exception as e:
+                if _is_throttle(e):
+                    limiter.on_throttled()
+                if not _is_retryable(e) or attempt >= Config.GEMINI_MAX_RETRIES:
+                    self._record_failure(model_label, started)
+                    raise GeminiError(f"Gemini call failed: {e}", code=_error_code(e)) from e
+                metrics.GEMINI_RETRIES.inc(model=model_label, reason="throttled" if _is_throttle(e) else "transient")
+                delay = self._backoff(attempt)
+                print(f"Gemini call failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def generate_content(self, model: str, contents, config=None):
+        return self.call(model, self.client.models.generate_content, model=model, contents=contents, config=config)
+
+    def generate_content_stream(self, model: str, contents, config=None) -> Iterator:
+        """
+        Starts a streaming generation and returns an iterator over its chunks.
+        Opening the stream (up to its first chunk) is rate limited and retried like `call`,
+        and errors there are raised here. A failure after that is raised mid-iteration as
+        GeminiError without a retry, since the text already yielded can't be taken back.
+        """
+        first, rest = self.call(model, self._open_stream, model=model, contents=contents, config=config)
+        return self._iter_stream(model, first, rest)
+
+    def _open_stream(self, **kwargs):
+        stream = iter(self.client.models.generate_content_stream(**kwargs))
+        return next(stream, None), stream
+
+    def _iter_stream(self, model: str, first, rest) -> Iterator:
+        last = first
+        if first is not None:
+            yield first
+        try:
+            for chunk in rest:
+                last = chunk
+                yield chunk
+        except Exception as e:
+            raise GeminiError(f"Gemini stream failed: {e}", code=_error_code(e)) from e
+        # Usage is reported on the final chunk
+        metrics.record_gemini_usage(model, last)
+
+    def count_tokens(self, model: str, contents):
+        # Free, but limited separately from generation, so it gets its own bucket
+        return self.call("count_tokens", self.client.models.count_tokens, model=model, contents=contents)
+
+    async def generate_content_async(self, model: str, contents, config=None):
+        return await self.call_async(model, self.client.aio.models.generate_content, model=model, contents=contents, config=config)
+
+    def create_batch(self, model: str, src, config: Dict = None):
+        """Submits a Batch API job (`src` is a list of inlined requests). Jobs get their own bucket."""
+        return self.call("batches", self.client.batches.create, model=model, src=src, config=config)
+
+    def get_batch(self, name: str):
+        return self.call("batches", self.client.batches.get, name=name)
+
+    def create_cache(self, model: str, config):
+        return self.call(model, self.client.caches.create, model=model, config=config)
+
+    def update_cache(self, name: str, config):
+        return self.call(None, self.client.caches.update, name=name, config=config)
+
+    def upload_file(self, path: str, config: Dict = None):
+        return self.call(None, self.client.files.upload, file=path, config=config)
+
+    def get_file(self, name: str):
+        return self.call(None, self.client.files.get, name=name)
+
+    def delete_file(self, name: str):
+        return self.call(None, self.client.files.delete, name=name)
+
+    def list_files(self):
+        # The SDK pager fetches further pages lazily; drain it inside one limited call
+        return self.call(None, lambda: list(self.client.files.list()))
+
+    def wait_until_active(self, file_ref, timeout: float = 300):
+        """Polls file state with exponential backoff (0.5s doubling up to 8s) until it leaves PROCESSING."""
+        deadline = time.time() + timeout
+        delay = 0.5
+        while True:
+            state = getattr(getattr(file_ref, "state", None), "name", "ACTIVE")
+            if state == "ACTIVE":
+                return file_ref
+            if state == "FAILED":
+                raise GeminiError(f"Gemini File processing failed: {file_ref.name}")
+            if time.time() > deadline:
+                raise GeminiError(f"Gemini File {file_ref.name} still {state} after {timeout}s.")
+            time.sleep(delay)
+            delay = min(8.0, delay * 2)
+            file_ref = self.get_file(file_ref.name)
+
+
+_gateway: Optional[GeminiGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_gemini_gateway() -> GeminiGateway:
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = GeminiGateway()
+    return _gateway
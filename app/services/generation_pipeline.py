@@ -0,0 +1,322 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.config import Config
+from app.models.schemas import DeepResearchProfile, BrandingAssets
+from app.services.repository import get_repository
+from app.services.content_engine import get_content_generator
+from app.services.pdf_engine import get_pdf_engine
+from app.services.audio_cache import get_audio_cache
+from app.services.input_planner import SermonInputPlanner, needs_audio
+from app.services import metrics
+from app.services.progress_tracker import (
+    get_progress_tracker,
+    STAGE_DOWNLOADING_AUDIO,
+    STAGE_GENERATING_CONTENT,
+    STAGE_RENDERING_PDF,
+    STAGE_UPLOADING_PDF,
+    STAGE_COMPLETED,
+)
+
+
+# on_event(event, data) for streaming generation; see GenerationPipeline._produce
+EventCallback = Optional[Callable[[str, Dict], None]]
+
+# Only what generation and the subscription gate read; the full `sermons`/`churches` rows
+# carry columns (titles, errors, Stripe ids) that no generation step uses.
+SERMON_CONTEXT_COLUMNS = (
+    "id, transcript, audio_url, speech_audio_url, "
+    "churches(id, name, subscription_status, deep_research_profile, branding_assets)"
+)
+# Enough to render and upload PDFs for stored Markdown
+SERMON_RENDER_COLUMNS = "id, churches(id, name, subscription_status, deep_research_profile, branding_assets)"
+
+
+class GenerationPipeline:
+    """
+    Produces one asset: sermon context -> audio download -> Gemini -> PDF -> Storage.
+    Every method here is blocking (httpx, genai, ReportLab), so the API only ever calls
+    it from a worker thread, never on the event loop; the `*_async` variants are the exception.
+    """
+
+    def __init__(self):
+        self.content_engine = get_content_generator()
+        self.pdf_engine = get_pdf_engine()
+        self.tracker = get_progress_tracker()
+
+    def load_context(self, sermon_id: str, columns: str = SERMON_CONTEXT_COLUMNS) -> Dict:
+        """
+        Fetches the sermon with its church and parses the profiles.
+        Raises HTTPException so the endpoint can surface errors before accepting the job.
+        `columns=SERMON_RENDER_COLUMNS` skips the transcript when only rendering.
+        """
+        rows = get_repository().select("sermons", columns, {"id": sermon_id})
+        return self._build_context(sermon_id, rows)
+
+    async def load_context_async(self, sermon_id: str) -> Dict:
+        """`load_context` on the repository's async client, for request handlers."""
+        rows = await get_repository().select_async("sermons", SERMON_CONTEXT_COLUMNS, {"id": sermon_id})
+        return self._build_context(sermon_id, rows)
+
+    def _build_context(self, sermon_id: str, rows: List[Dict]) -> Dict:
+        if not rows:
+            raise HTTPException(status_code=404, detail="Sermon not found")
+
+        sermon_row = rows[0]
+        church_row = sermon_row.get("churches")
+
+        if not church_row:
+            raise HTTPException(status_code=404, detail="Church not found for this sermon")
+
+        # Parse Profiles
+        try:
+            profile_data = church_row.get("deep_research_profile", {})
+            if "church_name" not in profile_data:
+                profile_data["church_name"] = church_row.get("name", "Unknown Church")
+
+            profile = DeepResearchProfile(**profile_data)
+
+            branding_data = church_row.get("branding_assets", {})
+            branding = BrandingAssets(**branding_data)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Data validation error: {str(e)}")
+
+        return {
+            "sermon_id": sermon_id,
+            "sermon": sermon_row,
+            "church": church_row,
+            "profile": profile,
+            "branding": branding,
+            # Note: We allow missing transcript IF we have audio, but prompt builder logic prefers transcript.
+            "transcript": sermon_row.get("transcript", "") or "",
+            # The speech copy is what Gemini gets; sermons ingested before it existed only have audio_url
+            "audio_url": sermon_row.get("speech_audio_url") or sermon_row.get("audio_url"),
+        }
+
+    def create_asset(self, sermon_id: str, asset_type: str) -> str:
+        """Inserts the placeholder `assets` row so the caller gets an id immediately."""
+        return self.create_assets(sermon_id, [asset_type])[asset_type]
+
+    def create_assets(self, sermon_id: str, asset_types: List[str]) -> Dict[str, str]:
+        """Inserts one placeholder row per asset type in a single round trip. Returns {asset_type: asset_id}."""
+        rows = get_repository().insert("assets", self._asset_rows(sermon_id, asset_types), returning="id, type")
+        return self._register_assets(sermon_id, asset_types, rows)
+
+    async def create_assets_async(self, sermon_id: str, asset_types: List[str]) -> Dict[str, str]:
+        rows = await get_repository().insert_async("assets", self._asset_rows(sermon_id, asset_types), returning="id, type")
+        return self._register_assets(sermon_id, asset_types, rows)
+
+    @staticmethod
+    def _asset_rows(sermon_id: str, asset_types: List[str]) -> List[Dict]:
+        return [{"sermon_id": sermon_id, "type": asset_type, "status": "processing"} for asset_type in asset_types]
+
+    def _register_assets(self, sermon_id: str, asset_types: List[str], rows: List[Dict]) -> Dict[str, str]:
+        if not rows or len(rows) != len(asset_types):
+            raise HTTPException(status_code=500, detail="Failed to create asset record")
+
+        asset_ids = {}
+        for row in rows:
+            asset_ids[row["type"]] = row["id"]
+            self.tracker.start(row["id"], sermon_id=sermon_id, asset_type=row["type"])
+        return asset_ids
+
+    def download_audio(self, audio_url: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns (path, sha256) for a local copy of the sermon audio, served from the audio
+        cache when possible. The caller owns the returned path and deletes it.
+        Returns (None, None) on failure (audio is optional context).
+        """
+        try:
+            return get_audio_cache().fetch(audio_url)
+        except Exception as e:
+            print(f"Warning: Failed to download audio for context: {e}")
+            # Non-blocking, we proceed without audio if download fails
+            return None, None
+
+    def run(self, asset_id: str, context: Dict, asset_type: str, on_event: EventCallback = None) -> Dict:
+        """Runs the full pipeline for one asset. See `run_batch`."""
+        return self.run_batch({asset_type: asset_id}, context, on_event=on_event)[asset_type]
+
+    def run_batch(self, asset_ids: Dict[str, str], context: Dict, on_event: EventCallback = None) -> Dict[str, Dict]:
+        """
+        Produces several assets for the same sermon.
+        A SermonInputPlanner picks each asset's Gemini input (transcript, audio or a
+        short excerpt) within the token budget. The audio is downloaded once, and only
+        if some asset's plan uses it; then the LLM calls and PDF renders fan out
+        concurrently, one thread per asset. The File API upload happens lazily on the
+        first response-cache miss; the Gemini file cache serializes uploads per content
+        hash, so the batch still uploads at most once and a fully cached batch not at all.
+        With `on_event`, content is streamed from Gemini and `on_event(event, data)` gets
+        every stage change and Markdown delta as it happens (see `_produce`).
+        Never raises: failures are stored on each `assets` row and in the progress tracker.
+        """
+        temp_audio_path = None
+        audio_sha256 = None
+        planner = None
+        try:
+            if context.get("audio_url") and needs_audio(context["transcript"], asset_ids):
+                for asset_id in asset_ids.values():
+                    self._set_stage(asset_id, STAGE_DOWNLOADING_AUDIO, on_event)
+                with metrics.span("generation", "download_audio"):
+                    temp_audio_path, audio_sha256 = self.download_audio(context["audio_url"])
+
+            planner = SermonInputPlanner(context["transcript"], temp_audio_path, audio_sha256)
+            if len(asset_ids) == 1:
+                (asset_type, asset_id), = asset_ids.items()
+                return {asset_type: self._produce(asset_id, asset_type, context, planner, on_event)}
+
+            with ThreadPoolExecutor(max_workers=len(asset_ids), thread_name_prefix="asset") as pool:
+                futures = {
+                    asset_type: pool.submit(self._produce, asset_id, asset_type, context, planner, on_event)
+                    for asset_type, asset_id in asset_ids.items()
+                }
+                return {asset_type: future.result() for asset_type, future in futures.items()}
+        finally:
+            # Cleanup audio once every generation has used it
+            if planner is not None:
+                planner.cleanup()
+            if temp_audio_path and os.path.exists(temp_audio_path):
+                os.remove(temp_audio_path)
+
+    def _set_stage(self, asset_id: str, stage: str, on_event: EventCallback = None):
+        self.tracker.set_stage(asset_id, stage)
+        if on_event is not None:
+            on_event("stage", {"asset_id": asset_id, "stage": stage})
+
+    def _generate_content(self, asset_id: str, asset_type: str, context: Dict, planner: SermonInputPlanner, on_event) -> str:
+        plan = planner.plan(asset_type)
+        kwargs = dict(
+            audio_path=plan.audio_path,
+            audio_sha256=plan.audio_sha256,
+            use_cache=context.get("use_cache", True),
+            sources=plan.sources,
+        )
+        if on_event is None:
+            return self.content_engine.generate(context["profile"], plan.transcript, asset_type, **kwargs)
+
+        parts = []
+        for text in self.content_engine.generate_stream(context["profile"], plan.transcript, asset_type, **kwargs):
+            parts.append(text)
+            on_event("delta", {"asset_id": asset_id, "text": text})
+        return "".join(parts)
+
+    def publish(self, asset_id: str, asset_type: str, context: Dict, markdown: str, save_markdown: bool = True) -> Dict:
+        """
+        Renders and uploads Markdown that was produced elsewhere (a stored asset being
+        re-rendered, a Gemini batch result) and completes the asset without calling Gemini.
+        `save_markdown=False` leaves `content_markdown` as it is. Never raises.
+        """
+        return self._produce(asset_id, asset_type, context, None, markdown=markdown, save_markdown=save_markdown)
+
+    def _produce(
+        self,
+        asset_id: str,
+        asset_type: str,
+        context: Dict,
+        planner: Optional[SermonInputPlanner],
+        on_event: EventCallback = None,
+        markdown: str = None,
+        save_markdown: bool = True,
+    ) -> Dict:
+        """
+        Events, in order: `stage` on each transition, `delta` per streamed Markdown piece,
+        `content` once the Markdown is saved (the PDF render starts right after), then
+        `completed` with the pdf_url or `failed` with the error.
+        With `markdown`, generation is skipped and that content is rendered.
+        """
+        repository = get_repository()
+        sermon_id = context["sermon_id"]
+
+        try:
+            with metrics.span("generation", "asset", asset_id=asset_id, asset_type=asset_type):
+                # 1. Content Generation
+                if markdown is None:
+                    self._set_stage(asset_id, STAGE_GENERATING_CONTENT, on_event)
+                    with metrics.span("generation", "generate_content", asset_type=asset_type):
+                        markdown_content = self._generate_content(
+                            asset_id, asset_type, context, planner, on_event
+                        )
+                else:
+                    markdown_content = markdown
+
+                # 2. Save Markdown Asset. Written behind (normally riding along with the final
+                # status update) unless a client is streaming and may reload it right away.
+                if save_markdown:
+                    repository.update_row("assets", asset_id, {"content_markdown": markdown_content}, defer=on_event is None)
+                if on_event is not None:
+                    on_event("content", {"asset_id": asset_id, "content_markdown": markdown_content})
+
+                # 3. PDF Generation & Upload
+                self._set_stage(asset_id, STAGE_RENDERING_PDF, on_event)
+                with metrics.span("generation", "render_pdf", asset_type=asset_type):
+                    pdf_file = self.pdf_engine.generate_pdf_file(markdown_content, context["branding"])
+
+                # Streamed from the spooled file to Storage; the PDF is never held as bytes
+                with pdf_file:
+                    self._set_stage(asset_id, STAGE_UPLOADING_PDF, on_event)
+                    with metrics.span("generation", "upload_pdf", asset_type=asset_type):
+                        public_url = self.pdf_engine.upload_to_supabase(
+                            pdf_file,
+                            context["profile"].church_name,
+                            sermon_id,
+                            file_name=f"{asset_type}_{asset_id}.pdf"
+                        )
+        except Exception as e:
+            print(f"Asset {asset_id} failed: {e}")
+            self.tracker.fail(asset_id, str(e))
+            if on_event is not None:
+                on_event("failed", {"asset_id": asset_id, "error": str(e)})
+            repository.update_row("assets", asset_id, {"status": "failed", "error": str(e)})
+            return {"status": "failed", "asset_id": asset_id, "error": str(e)}
+
+        # 4. Update Asset Record
+        repository.update_row("assets", asset_id, {
+            "status": "completed",
+            "pdf_url": public_url
+        })
+        self.tracker.set_stage(asset_id, STAGE_COMPLETED)
+        self.tracker.update(asset_id, pdf_url=public_url)
+        if on_event is not None:
+            on_event("completed", {"asset_id": asset_id, "pdf_url": public_url})
+
+        return {"status": "success", "asset_id": asset_id, "pdf_url": public_url}
+
+
+# Bounded pool for generation work so a burst of requests queues here instead of
+# spawning unbounded threads. Shared by every request on this process.
+_executor: Optional[ThreadPoolExecutor] = None
+_pipeline: Optional[GenerationPipeline] = None
+_lock = threading.Lock()
+
+def get_generation_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.GENERATION_MAX_WORKERS, thread_name_prefix="generation"
+                )
+    return _executor
+
+def get_generation_pipeline() -> GenerationPipeline:
+    global _pipeline
+    if _pipeline is None:
+        with _lock:
+            if _pipeline is None:
+                _pipeline = GenerationPipeline()
+    return _pipeline
+
+def submit_generation(asset_id: str, context: Dict, asset_type: str) -> Future:
+    """Schedules the pipeline in the background and returns immediately."""
+    return get_generation_executor().submit(get_generation_pipeline().run, asset_id, context, asset_type)
+
+def submit_batch_generation(asset_ids: Dict[str, str], context: Dict) -> Future:
+    return get_generation_executor().submit(get_generation_pipeline().run_batch, asset_ids, context)
+
+def submit_streaming_generation(asset_id: str, context: Dict, asset_type: str, on_event: EventCallback) -> Future:
+    """`submit_generation`, streaming the content; `on_event` is called from the generation thread."""
+    return get_generation_executor().submit(get_generation_pipeline().run, asset_id, context, asset_type, on_event)
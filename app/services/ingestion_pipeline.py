@@ -0,0 +1,238 @@
+import mimetypes
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import Config
+from app.services.repository import get_repository
+from app.services.ingestion_service import get_ingestion_service, ARCHIVAL_RENDITION, SPEECH_RENDITION, youtube_video_id
+from app.services.storage_service import StorageService
+from app.services.audio_cache import get_audio_cache
+from app.services.transcript_index import build_segments, get_transcript_index
+from app.services import metrics
+
+JOB_KIND_INGEST = "ingest_sermon"
+
+# Stages run in this order. Each one is idempotent given its input payload,
+# so a job that is retried or re-leased after a crash just re-runs the stage it was on.
+STAGE_MEDIA = "media"            # yt-dlp download / ffmpeg renditions / validation
+STAGE_UPLOAD = "upload"          # push the renditions to Supabase Storage
+STAGE_TRANSCRIBE = "transcribe"  # Gemini transcription
+STAGE_DONE = "done"
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv')
+
+# Payload key for `sermons` values a stage leaves for the next write. The queue persists
+# them with the stage, so unlike the repository's write-behind buffer they survive a crash
+# and travel to whichever worker process runs the next stage.
+PENDING_VALUES = "sermon_values"
+
+# What a duplicate submission copies from the sermon that was actually processed
+LINKED_COLUMNS = "status, audio_url, speech_audio_url, transcript"
+
+
+def index_transcript(church_id: str, sermon_ids: List[str], transcript: str):
+    """
+    Makes the sermons' transcript searchable (see transcript_index). Best effort: the
+    transcript is already saved, so a failure only leaves it out of search.
+    """
+    if not church_id or not transcript:
+        return
+    try:
+        with metrics.span("ingestion", "index_transcript"):
+            segments = build_segments(transcript)
+            for sermon_id in sermon_ids:
+                get_transcript_index().replace(church_id, sermon_id, segments)
+    except Exception as e:
+        print(f"Warning: Failed to index transcript for {sermon_ids}: {e}")
+
+
+class IngestionPipeline:
+    """
+    Sermon ingestion, split into resumable stages for the job queue:
+    1. Extract/Download Audio
+    2. Upload to Supabase
+    3. Transcribe with Gemini
+    Each stage receives the job payload and returns (next_stage, payload).
+    """
+
+    def __init__(self):
+        self.ingestion = get_ingestion_service()
+        self._storage = None
+        self._transcription = None
+
+    @property
+    def storage(self) -> StorageService:
+        if self._storage is None:
+            self._storage = StorageService()
+        return self._storage
+
+    @property
+    def transcription(self):
+        # Constructed lazily: it needs the Gemini key, which media-only workers don't.
+        if self._transcription is None:
+            from app.services.transcription_service import get_transcription_service
+            self._transcription = get_transcription_service()
+        return self._transcription
+
+    @staticmethod
+    def initial_payload(sermon_id: str, input_path: str, is_youtube: bool, church_id: str = None) -> Dict:
+        return {"sermon_id": sermon_id, "input_path": input_path, "is_youtube": is_youtube, "church_id": church_id}
+
+    @staticmethod
+    def source_fingerprint(input_path: str, is_youtube: bool, input_sha256: str = None) -> Optional[str]:
+        """Identifies the media itself (not the link or filename), for dedup. None if unknown."""
+        if is_youtube:
+            video_id = youtube_video_id(input_path)
+            return f"youtube:{video_id}" if video_id else None
+        return f"sha256:{input_sha256}" if input_sha256 else None
+
+    @staticmethod
+    def link_duplicates(source_sermon_id: str, sermon_ids: List[str]) -> bool:
+        """
+        Copies a completed sermon's audio and transcript onto duplicate submissions of
+        the same media. Returns False, writing nothing, if the source is gone or unfinished.
+        """
+        repository = get_repository()
+        rows = repository.select("sermons", f"church_id, {LINKED_COLUMNS}", {"id": source_sermon_id})
+        if not rows or rows[0].get("status") != "completed":
+            return False
+        values = dict(rows[0])
+        church_id = values.pop("church_id")
+        repository.update("sermons", values, {"id": list(sermon_ids)})
+        index_transcript(church_id, list(sermon_ids), values.get("transcript"))
+        return True
+
+    @staticmethod
+    def fail_duplicates(sermon_ids: Iterable[str], error: str):
+        sermon_ids = list(sermon_ids)
+        if sermon_ids:
+            get_repository().update("sermons", {"status": "failed", "processing_error": error}, {"id": sermon_ids})
+
+    def run_stage(self, stage: str, sermon_id: str, payload: Dict) -> Tuple[str, Dict]:
+        with metrics.span("ingestion", stage, sermon_id=sermon_id):
+            if stage == STAGE_MEDIA:
+                return STAGE_UPLOAD, self._process_media(sermon_id, payload)
+            if stage == STAGE_UPLOAD:
+                return STAGE_TRANSCRIBE, self._upload_audio(sermon_id, payload)
+            if stage == STAGE_TRANSCRIBE:
+                return STAGE_DONE, self._transcribe(sermon_id, payload)
+        raise ValueError(f"Unknown ingestion stage: {stage}")
+
+    def _process_media(self, sermon_id: str, payload: Dict) -> Dict:
+        # Written now: the first sign work has started, and this stage can take minutes
+        get_repository().update_row("sermons", sermon_id, {"status": "processing_audio"})
+
+        input_path = payload["input_path"]
+        source_path = input_path
+        archival = True
+        if payload.get("is_youtube"):
+            with metrics.span("ingestion", "youtube_download"):
+                source_path = self.ingestion.download_youtube_audio(input_path)
+        elif not input_path.lower().endswith(VIDEO_EXTENSIONS):
+            # Assume audio, just validate; the upload itself is kept as the archival copy
+            self.ingestion.validate_audio_file(input_path)
+            archival = False
+
+        # One ffmpeg pass for the archival MP3 and the speech copy that goes to Gemini
+        speech = Config.INGEST_SPEECH_RENDITION
+        tempo = min(2.0, max(0.5, Config.INGEST_SPEECH_TEMPO)) if speech else 1.0
+        renditions = {}
+        if archival or speech:
+            with metrics.span("ingestion", "transcode"):
+                renditions = self.ingestion.transcode(source_path, archival=archival, speech=speech, tempo=tempo)
+        if payload.get("is_youtube"):
+            os.remove(source_path)  # raw download; the renditions replace it
+
+        return {
+            **payload,
+            "audio_path": renditions.get(ARCHIVAL_RENDITION, input_path),
+            "speech_path": renditions.get(SPEECH_RENDITION),
+            "speech_tempo": tempo,
+        }
+
+    def _upload_audio(self, sermon_id: str, payload: Dict) -> Dict:
+        local_paths = [payload["audio_path"]] + ([payload["speech_path"]] if payload.get("speech_path") else [])
+        if not all(os.path.exists(path) for path in local_paths):
+            # Local files are gone (e.g. tmp wiped on restart); redo the media stage inline.
+            payload = self._process_media(sermon_id, payload)
+
+        public_url = self._store(sermon_id, payload["audio_path"])
+        values = {"audio_url": public_url}
+        # Generation sends the speech copy to Gemini when there is one
+        context_path, context_url = payload["audio_path"], public_url
+        if payload.get("speech_path"):
+            values["speech_audio_url"] = self._store(sermon_id, payload["speech_path"])
+            context_path, context_url = payload["speech_path"], values["speech_audio_url"]
+
+        # Seed the generation audio cache while we still have the file locally
+        try:
+            get_audio_cache().put(context_path, context_url)
+        except Exception as e:
+            print(f"Warning: Failed to cache audio for {sermon_id}: {e}")
+
+        # No round trip here: the values ride along with the transcribe stage's final write
+        return {
+            **payload,
+            "audio_url": public_url,
+            "speech_audio_url": values.get("speech_audio_url"),
+            PENDING_VALUES: values,
+        }
+
+    def _store(self, sermon_id: str, path: str) -> str:
+        content_type = mimetypes.guess_type(path)[0] or "audio/mpeg"
+        return self.storage.upload_file(path, f"{sermon_id}/{os.path.basename(path)}", content_type)
+
+    def _transcribe(self, sermon_id: str, payload: Dict) -> Dict:
+        # Transcribe the speech copy when there is one (far fewer bytes to upload)
+        audio_path = payload.get("speech_path") or payload["audio_path"]
+        fetched_path = None
+        if not os.path.exists(audio_path):
+            # Already uploaded, so fetch it back rather than re-running the whole pipeline.
+            fetched_path, _ = get_audio_cache().fetch(payload.get("speech_audio_url") or payload["audio_url"])
+            audio_path = fetched_path
+
+        try:
+            transcript_text = self.transcription.generate_transcript(audio_path, tempo=payload.get("speech_tempo", 1.0))
+        finally:
+            if fetched_path and os.path.exists(fetched_path):
+                os.remove(fetched_path)
+
+        get_repository().update_row("sermons", sermon_id, {
+            **payload.get(PENDING_VALUES, {}),
+            "status": "completed",
+            "transcript": transcript_text
+        })
+        index_transcript(self._church_id(sermon_id, payload), [sermon_id], transcript_text)
+
+        self.cleanup(payload)
+        return payload
+
+    @staticmethod
+    def _church_id(sermon_id: str, payload: Dict) -> str:
+        # Jobs queued before church_id was part of the payload have to look it up
+        if payload.get("church_id"):
+            return payload["church_id"]
+        rows = get_repository().select("sermons", "church_id", {"id": sermon_id})
+        return rows[0]["church_id"] if rows else None
+
+    def mark_failed(self, sermon_id: str, payload: Dict, error: str, followers: Iterable[str] = ()):
+        """Called once a job has exhausted its retries. `followers` are duplicates waiting on it."""
+        print(f"Error processing sermon {sermon_id}: {error}")
+        try:
+            get_repository().update_row("sermons", sermon_id, {
+                **payload.get(PENDING_VALUES, {}),  # keep the audio_url of a finished upload
+                "status": "failed",
+                "processing_error": error
+            })
+            self.fail_duplicates(followers, error)
+        finally:
+            self.cleanup(payload)
+
+    def cleanup(self, payload: Dict):
+        # Note: input_path might be same as audio_path if direct audio upload
+        for key in ("audio_path", "speech_path", "input_path"):
+            path = payload.get(key)
+            if key == "input_path" and payload.get("is_youtube"):
+                continue  # it's a URL
+            if path and os.path.exists(path):
+                os.remove(path)
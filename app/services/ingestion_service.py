@@ -1,63 +1,235 @@
 import os
+import re
+import threading
 import uuid
-import yt_dlp
-import ffmpeg
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 from fastapi import HTTPException
+from app.config import Config
 
 STATUS_PROCESSING = "processing"
 STATUS_FAILED = "failed"
 
+# Renditions produced by IngestionService.transcode
+ARCHIVAL_RENDITION = "archival"
+SPEECH_RENDITION = "speech"
+
+# Source audio codecs the archival rendition can stream-copy instead of re-encoding,
+# and the container each goes into (all formats Gemini and browsers accept)
+REMUX_CONTAINERS = {"aac": ".aac", "mp3": ".mp3", "opus": ".ogg", "vorbis": ".ogg", "flac": ".flac"}
+
+YOUTUBE_HOSTS = ("youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com")
+YOUTUBE_PATH_PREFIXES = ("shorts", "live", "embed", "v")
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def youtube_video_id(url: str) -> Optional[str]:
+    """
+    The 11-character video id of a YouTube URL (watch?v=, youtu.be/, /shorts/, /live/,
+    /embed/), or None if it isn't one. Tracking parameters, timestamps and hosts all
+    normalize away, so every link to the same video gives the same id.
+    """
+    url = url.strip()
+    try:
+        parsed = urlparse(url if "://" in url else f"https://{url}")
+    except ValueError:
+        return None
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    parts = [p for p in parsed.path.split("/") if p]
+
+    candidate = None
+    if host == "youtu.be" and parts:
+        candidate = parts[0]
+    elif host in YOUTUBE_HOSTS:
+        if parts[:1] == ["watch"]:
+            candidate = (parse_qs(parsed.query).get("v") or [None])[0]
+        elif len(parts) >= 2 and parts[0] in YOUTUBE_PATH_PREFIXES:
+            candidate = parts[1]
+    return candidate if candidate and _YOUTUBE_ID.match(candidate) else None
+
 class IngestionService:
+    """
+    Media handling for ingest and generation (yt-dlp, ffmpeg). Both libraries are
+    imported by the methods that use them, so importing this module (as the API does)
+    stays cheap.
+    """
+
     def __init__(self, upload_dir: str = "/tmp/sermonflow_uploads"):
         self.upload_dir = upload_dir
         os.makedirs(self.upload_dir, exist_ok=True)
 
     def download_youtube_audio(self, url: str) -> str:
         """
-        Downloads audio from a YouTube URL and returns the path to the MP3 file.
+        Downloads the best audio-only stream for a YouTube URL, as published (no
+        re-encode; `transcode` makes the renditions). Opus and AAC are preferred since
+        they can be stream-copied; fragmented streams (livestream VODs) download
+        YTDLP_CONCURRENT_FRAGMENTS fragments at a time. Returns the downloaded path.
         """
+        import yt_dlp
+
         try:
             filename = f"{uuid.uuid4()}"
             ydl_opts = {
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
+                'format': 'bestaudio[acodec^=opus]/bestaudio[acodec^=mp4a]/bestaudio/best',
                 'outtmpl': os.path.join(self.upload_dir, f"{filename}.%(ext)s"),
+                'concurrent_fragment_downloads': Config.YTDLP_CONCURRENT_FRAGMENTS,
                 'quiet': True,
                 'no_warnings': True,
             }
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            
-            # yt-dlp automatically appends the extension
-            expected_path = os.path.join(self.upload_dir, f"{filename}.mp3")
-            if not os.path.exists(expected_path):
-                 # Fallback check if it didn't convert for some reason, though postprocessor should handle it
-                 raise Exception("File not found after download.")
-            return expected_path
+                info = ydl.extract_info(url, download=True)
+                downloaded_path = ydl.prepare_filename(info)
+
+            if not os.path.exists(downloaded_path):
+                raise Exception("File not found after download.")
+            return downloaded_path
         except Exception as e:
             raise Exception(f"YouTube Download failed: {str(e)}")
 
+    def transcode(self, input_path: str, archival: bool = True, speech: bool = True, tempo: float = 1.0) -> Dict[str, str]:
+        """
+        Makes the ingest renditions in a single ffmpeg pass.
+        - "archival": for Storage and listening. When ffprobe finds a codec in
+          REMUX_CONTAINERS the source audio is stream-copied (no decode or encode at all,
+          INGEST_REMUX_ENABLED); otherwise it is encoded to MP3 (VBR ~190kbps).
+        - "speech": 16 kHz mono Opus at a speech bitrate, for transcription and LLM context.
+          `tempo` > 1 speeds it up with `atempo` (pitch preserved).
+        Falls back to encoding if the stream copy fails. Returns {rendition: path} for the
+        renditions requested.
+        """
+        codec = self.probe_audio_codec(input_path) if archival and Config.INGEST_REMUX_ENABLED else None
+        if codec in REMUX_CONTAINERS:
+            try:
+                return self._render(input_path, archival, speech, tempo, copy_extension=REMUX_CONTAINERS[codec])
+            except Exception as e:
+                print(f"Warning: Stream copy of {codec} audio failed, re-encoding instead: {e}")
+        return self._render(input_path, archival, speech, tempo)
+
+    def _render(self, input_path: str, archival: bool, speech: bool, tempo: float, copy_extension: str = None) -> Dict[str, str]:
+        base = os.path.splitext(input_path)[0]
+        targets = {}
+        if archival:
+            targets[ARCHIVAL_RENDITION] = f"{base}_archival{copy_extension or '.mp3'}"
+        if speech:
+            targets[SPEECH_RENDITION] = f"{base}_speech.ogg"
+        if not targets:
+            return {}
+
+        import ffmpeg
+
+        try:
+            # The stream probe_audio_codec looked at; '.audio' would map every track (0:a)
+            audio = ffmpeg.input(input_path)['a:0']
+            # A stream copy reads the packets directly, so only encoded outputs share the decode
+            encoded = [r for r in targets if not (r == ARCHIVAL_RENDITION and copy_extension)]
+            branches = dict(zip(encoded, audio.asplit())) if len(encoded) > 1 else {}
+            outputs = []
+            for rendition, path in targets.items():
+                branch = branches.get(rendition, audio)
+                if rendition == ARCHIVAL_RENDITION and copy_extension:
+                    outputs.append(ffmpeg.output(branch, path, acodec='copy'))
+                elif rendition == ARCHIVAL_RENDITION:
+                    outputs.append(ffmpeg.output(branch, path, acodec='libmp3lame', qscale=2))
+                else:
+                    if tempo != 1.0:
+                        branch = branch.filter('atempo', tempo)
+                    outputs.append(ffmpeg.output(
+                        branch, path,
+                        acodec='libopus', audio_bitrate=Config.INGEST_SPEECH_BITRATE, application='voip',
+                        ac=1, ar=Config.INGEST_SPEECH_SAMPLE_RATE,
+                    ))
+            ffmpeg.merge_outputs(*outputs).run(overwrite_output=True, quiet=True)
+            return targets
+        except Exception as e:
+            for path in targets.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            raise Exception(f"Audio transcode failed: {str(e)}")
+
     def extract_audio_from_video(self, input_path: str) -> str:
         """
-        Extracts audio from a video file and saves it as MP3.
+        Extracts audio from a video file, stream-copied when the codec allows, else as MP3.
         Returns the path to the new audio file.
         """
+        return self.transcode(input_path, speech=False)[ARCHIVAL_RENDITION]
+
+    def probe_audio_codec(self, file_path: str) -> Optional[str]:
+        """The first audio stream's codec name (e.g. "aac", "opus"), or None if it can't be probed."""
+        import ffmpeg
+
         try:
-            output_path = f"{os.path.splitext(input_path)[0]}_extracted.mp3"
-            # Use ffmpeg to extract audio
-            # -y overwrites output
-            # -vn disables video recording
-            # -acodec libmp3lame sets codec to mp3
-            stream = ffmpeg.input(input_path)
-            stream = ffmpeg.output(stream, output_path, vn=None, acodec='libmp3lame', qscale=2)
+            info = ffmpeg.probe(file_path, select_streams="a:0")
+        except Exception as e:
+            print(f"Warning: ffprobe failed for {file_path}: {e}")
+            return None
+        streams = info.get("streams") or []
+        return streams[0].get("codec_name") if streams else None
+
+    def probe_duration(self, file_path: str) -> float:
+        """Returns the media duration in seconds."""
+        import ffmpeg
+
+        info = ffmpeg.probe(file_path)
+        return float(info["format"]["duration"])
+
+    def detect_silences(self, file_path: str, noise_db: int = -30, min_silence: float = 0.5) -> List[Tuple[float, float]]:
+        """
+        Runs ffmpeg's silencedetect over the file and returns [(start, end), ...] in seconds.
+        Decodes the audio once; nothing is written.
+        """
+        import ffmpeg
+
+        _, stderr = (
+            ffmpeg.input(file_path)
+            .filter("silencedetect", noise=f"{noise_db}dB", d=min_silence)
+            .output("-", format="null")
+            .run(capture_stdout=True, capture_stderr=True, quiet=True)
+        )
+        silences = []
+        start = None
+        for line in stderr.decode(errors="ignore").splitlines():
+            m = re.search(r"silence_start: (-?[\d.]+)", line)
+            if m:
+                start = max(0.0, float(m.group(1)))
+                continue
+            m = re.search(r"silence_end: ([\d.]+)", line)
+            if m and start is not None:
+                silences.append((start, float(m.group(1))))
+                start = None
+        return silences
+
+    def plan_segments(self, duration: float, silences: List[Tuple[float, float]], target_seconds: float, search_window: float = 60.0) -> List[float]:
+        """
+        Picks cut points roughly every `target_seconds`, snapped to the middle of the
+        nearest silence within `search_window` so cuts don't land mid-word.
+        Returns boundaries [0, c1, ..., duration].
+        """
+        boundaries = [0.0]
+        next_cut = target_seconds
+        while next_cut < duration - target_seconds / 4:
+            candidates = [
+                (s + e) / 2 for s, e in silences
+                if abs((s + e) / 2 - next_cut) <= search_window and (s + e) / 2 > boundaries[-1]
+            ]
+            cut = min(candidates, key=lambda c: abs(c - next_cut)) if candidates else next_cut
+            boundaries.append(cut)
+            next_cut = cut + target_seconds
+        boundaries.append(duration)
+        return boundaries
+
+    def cut_segment(self, input_path: str, start: float, length: float, output_path: str) -> str:
+        """Copies [start, start+length) out of the input without re-encoding."""
+        import ffmpeg
+
+        try:
+            stream = ffmpeg.input(input_path, ss=start, t=length)
+            stream = ffmpeg.output(stream, output_path, vn=None, acodec="copy")
             ffmpeg.run(stream, overwrite_output=True, quiet=True)
             return output_path
         except Exception as e:
-            raise Exception(f"Audio extraction failed: {str(e)}")
+            raise Exception(f"Audio segmentation failed: {str(e)}")
 
     def validate_audio_file(self, file_path: str) -> bool:
         """
@@ -74,3 +246,16 @@ class IngestionService:
         """Removes the temporary file."""
         if os.path.exists(path):
             os.remove(path)
+
+
+_service: Optional[IngestionService] = None
+_lock = threading.Lock()
+
+def get_ingestion_service() -> IngestionService:
+    """The shared service on UPLOAD_DIR; it holds no per-call state."""
+    global _service
+    if _service is None:
+        with _lock:
+            if _service is None:
+                _service = IngestionService(upload_dir=Config.UPLOAD_DIR)
+    return _service
@@ -0,0 +1,262 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+from app.config import Config
+from app.services import metrics
+from app.services.transcript_segments import parse_lines
+
+STRATEGY_TRANSCRIPT = "transcript"
+STRATEGY_AUDIO = "audio"
+STRATEGY_TRANSCRIPT_EXCERPT = "transcript+excerpt"
+STRATEGY_TRANSCRIPT_AUDIO = "transcript+audio"  # everything, as before the planner
+STRATEGIES = (STRATEGY_TRANSCRIPT, STRATEGY_AUDIO, STRATEGY_TRANSCRIPT_EXCERPT, STRATEGY_TRANSCRIPT_AUDIO)
+
+# Assets that echo how the sermon was delivered, not just what was said, get a short
+# stretch of audio for tone. Everything else is written from the transcript alone.
+ASSET_STRATEGIES = {
+    "service_host": STRATEGY_TRANSCRIPT_EXCERPT,
+    "guest_follow_up": STRATEGY_TRANSCRIPT_EXCERPT,
+}
+DEFAULT_STRATEGY = STRATEGY_TRANSCRIPT
+
+# Gemini's documented rate for audio input, and a rough text ratio for the local estimator
+AUDIO_TOKENS_PER_SECOND = 32
+CHARS_PER_TOKEN = 4.0
+
+GAP_MARKER = "[...]"
+_FILLER_RE = re.compile(r"\b(?:u+h+|u+m+|e+r+m+|you know|I mean)\b,?\s*", re.IGNORECASE)
+
+_SOURCES = {
+    STRATEGY_TRANSCRIPT: "sermon transcript",
+    STRATEGY_AUDIO: "sermon audio",
+    STRATEGY_TRANSCRIPT_EXCERPT: "sermon transcript and a short excerpt of the sermon audio (use it for the preacher's tone and delivery)",
+    STRATEGY_TRANSCRIPT_AUDIO: "sermon audio and transcript",
+}
+
+
+class InputPlan(NamedTuple):
+    strategy: str
+    transcript: str
+    audio_path: Optional[str]
+    audio_sha256: Optional[str]
+    sources: str  # how the task prompt refers to the inputs
+
+
+def estimate_tokens(text: str) -> int:
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def _requested_strategy(asset_type: str) -> str:
+    strategy = Config.GENERATION_INPUT_STRATEGY
+    if strategy not in STRATEGIES:
+        strategy = ASSET_STRATEGIES.get(asset_type, DEFAULT_STRATEGY)
+    return strategy
+
+
+def needs_audio(transcript: str, asset_types: Iterable[str]) -> bool:
+    """Whether planning any of `asset_types` would use the sermon audio, whole or as an excerpt."""
+    if not (transcript or "").strip():
+        return True
+    return any(_requested_strategy(asset_type) != STRATEGY_TRANSCRIPT for asset_type in asset_types)
+
+
+_token_counts: "OrderedDict[str, int]" = OrderedDict()
+_token_counts_lock = threading.Lock()
+_TOKEN_COUNTS_MAX = 1024
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Text tokens for `model`. Uses Gemini's count_tokens when GENERATION_TOKEN_COUNTER is
+    "api" (once per distinct text; results are kept in a small in-process LRU) and the
+    local estimate when it is "local" or the call fails.
+    """
+    if not text:
+        return 0
+    if Config.GENERATION_TOKEN_COUNTER != "api":
+        return estimate_tokens(text)
+
+    key = hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+    with _token_counts_lock:
+        if key in _token_counts:
+            _token_counts.move_to_end(key)
+            return _token_counts[key]
+    try:
+        from app.services.gemini_gateway import get_gemini_gateway
+        tokens = get_gemini_gateway().count_tokens(model, [text]).total_tokens
+    except Exception as e:
+        print(f"Warning: count_tokens failed ({e}); estimating locally.")
+        return estimate_tokens(text)
+    with _token_counts_lock:
+        _token_counts[key] = tokens
+        while len(_token_counts) > _TOKEN_COUNTS_MAX:
+            _token_counts.popitem(last=False)
+    return tokens
+
+
+def compact_transcript(transcript: str, budget_tokens: int, tokens: Callable[[str], int] = estimate_tokens) -> str:
+    """
+    Shrinks a transcript to about `budget_tokens`. Timestamps and filler words go first;
+    if that isn't enough, the opening and closing fifth of the budget are kept whole and
+    the middle is sampled evenly, with GAP_MARKER wherever lines were dropped.
+    """
+    lines = [_FILLER_RE.sub("", text).strip() for _, text in parse_lines(transcript)]
+    lines = [line for line in lines if line]
+    compacted = "\n".join(lines)
+    if tokens(compacted) <= budget_tokens or not lines:
+        return compacted
+
+    costs = [max(1, tokens(line)) for line in lines]
+    target = budget_tokens
+    for _ in range(3):
+        result = _sample_lines(lines, costs, target)
+        size = tokens(result)
+        if size <= budget_tokens:
+            break
+        # The gap markers and line breaks aren't in the per-line costs; aim lower
+        target = int(target * budget_tokens / size)
+    return result
+
+
+def _sample_lines(lines: List[str], costs: List[int], budget_tokens: int) -> str:
+    edge_budget = budget_tokens // 5
+
+    head, spent = 0, 0
+    while head < len(lines) and spent + costs[head] <= edge_budget:
+        spent += costs[head]
+        head += 1
+    tail, spent = len(lines), 0
+    while tail > head and spent + costs[tail - 1] <= edge_budget:
+        spent += costs[tail - 1]
+        tail -= 1
+
+    middle = range(head, tail)
+    middle_cost = sum(costs[i] for i in middle)
+    middle_budget = budget_tokens - sum(costs[:head]) - sum(costs[tail:])
+    keep = set(range(head)) | set(range(tail, len(lines)))
+    if middle_cost and middle_budget > 0:
+        # Spread the budget evenly: keep a line whenever the accrued share covers it
+        ratio = middle_budget / middle_cost
+        credit = 0.0
+        for i in middle:
+            credit += costs[i] * ratio
+            if credit >= costs[i]:
+                keep.add(i)
+                credit -= costs[i]
+
+    output: List[str] = []
+    for i, line in enumerate(lines):
+        if i in keep:
+            output.append(line)
+        elif not output or output[-1] != GAP_MARKER:
+            output.append(GAP_MARKER)
+    return "\n".join(output)
+
+
+class SermonInputPlanner:
+    """
+    Decides, per asset type, what Gemini gets for one sermon: the transcript, the audio,
+    or the transcript plus a GENERATION_AUDIO_EXCERPT_SECONDS clip from the middle of the
+    recording (ASSET_STRATEGIES; GENERATION_INPUT_STRATEGY forces one for every type).
+    Transcripts over GENERATION_TRANSCRIPT_TOKEN_BUDGET are compacted. The compacted
+    transcript and the excerpt are made once and shared by the batch; call `cleanup`
+    when it is done.
+    """
+
+    def __init__(self, transcript: str, audio_path: str = None, audio_sha256: str = None, model: str = None):
+        from app.services.content_engine import CONTENT_MODEL
+
+        self.transcript = transcript or ""
+        self.audio_path = audio_path if audio_path and os.path.exists(audio_path) else None
+        self.audio_sha256 = audio_sha256
+        self.model = model or CONTENT_MODEL
+        self._lock = threading.Lock()
+        self._compacted: Optional[str] = None
+        self._excerpt = None  # (path, sha256); (None, None) once an attempt failed
+
+    def strategy_for(self, asset_type: str) -> str:
+        strategy = _requested_strategy(asset_type)
+        if not self.transcript.strip():
+            return STRATEGY_AUDIO if self.audio_path else STRATEGY_TRANSCRIPT
+        if strategy != STRATEGY_TRANSCRIPT and not self.audio_path:
+            return STRATEGY_TRANSCRIPT
+        return strategy
+
+    def plan(self, asset_type: str) -> InputPlan:
+        strategy = self.strategy_for(asset_type)
+        audio_path, audio_sha256 = None, None
+        if strategy == STRATEGY_TRANSCRIPT_EXCERPT:
+            audio_path, audio_sha256 = self.excerpt()
+            if audio_path is None:
+                strategy = STRATEGY_TRANSCRIPT
+        elif strategy in (STRATEGY_AUDIO, STRATEGY_TRANSCRIPT_AUDIO):
+            audio_path, audio_sha256 = self.audio_path, self.audio_sha256
+
+        transcript = "" if strategy == STRATEGY_AUDIO else self.compacted()
+        sources = _SOURCES[strategy]
+        if transcript and transcript != self.transcript and GAP_MARKER in transcript:
+            sources += f" (condensed; {GAP_MARKER} marks omitted passages)"
+
+        text_tokens = estimate_tokens(transcript)
+        metrics.GENERATION_INPUT_TOKENS.inc(text_tokens, asset_type=asset_type, strategy=strategy, kind="text")
+        if strategy == STRATEGY_TRANSCRIPT_EXCERPT:
+            audio_tokens = Config.GENERATION_AUDIO_EXCERPT_SECONDS * AUDIO_TOKENS_PER_SECOND
+            metrics.GENERATION_INPUT_TOKENS.inc(audio_tokens, asset_type=asset_type, strategy=strategy, kind="audio")
+        print(f"Input plan for {asset_type}: {strategy}, ~{text_tokens} transcript tokens")
+        return InputPlan(strategy, transcript, audio_path, audio_sha256, sources)
+
+    def compacted(self) -> str:
+        with self._lock:
+            if self._compacted is None:
+                self._compacted = self._compact()
+            return self._compacted
+
+    def _compact(self) -> str:
+        budget = Config.GENERATION_TRANSCRIPT_TOKEN_BUDGET
+        total = count_tokens(self.transcript, self.model)
+        if total <= budget:
+            return self.transcript
+        # Compaction sizes lines with the local estimate, calibrated to the real count
+        scale = total / max(1, estimate_tokens(self.transcript))
+        compacted = compact_transcript(self.transcript, budget, lambda text: int(estimate_tokens(text) * scale))
+        print(f"Compacted transcript from {total} to ~{int(estimate_tokens(compacted) * scale)} tokens (budget {budget})")
+        return compacted
+
+    def excerpt(self):
+        """(path, sha256) of a clip from the middle of the audio, cut once per batch without re-encoding."""
+        with self._lock:
+            if self._excerpt is None:
+                self._excerpt = self._cut_excerpt()
+            return self._excerpt
+
+    def _cut_excerpt(self):
+        from app.services.gemini_file_cache import sha256_file
+        from app.services.ingestion_service import get_ingestion_service
+
+        length = Config.GENERATION_AUDIO_EXCERPT_SECONDS
+        base, ext = os.path.splitext(self.audio_path)
+        path = f"{base}_excerpt{ext}"
+        try:
+            service = get_ingestion_service()
+            try:
+                duration = service.probe_duration(self.audio_path)
+            except Exception:
+                duration = 0.0
+            start = max(0.0, duration / 2 - length / 2)
+            with metrics.span("generation", "audio_excerpt"):
+                service.cut_segment(self.audio_path, start, length, path)
+            return path, sha256_file(path)
+        except Exception as e:
+            print(f"Warning: Audio excerpt failed ({e}); using the transcript alone.")
+            if os.path.exists(path):
+                os.remove(path)
+            return None, None
+
+    def cleanup(self):
+        path = self._excerpt[0] if self._excerpt else None
+        if path and os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,294 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from app.config import Config
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Outcomes of JobQueue.enqueue_or_attach
+ENQUEUED = "enqueued"
+ATTACHED = "attached"
+ALREADY_DONE = "done"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim_idx ON jobs (stage, status, available_at);
+-- Latest job per input fingerprint (e.g. church id + YouTube video id), for dedup
+CREATE TABLE IF NOT EXISTS job_sources (
+    scope TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (scope, fingerprint)
+);
+-- Duplicate submissions waiting on an in-flight job's result
+CREATE TABLE IF NOT EXISTS job_followers (
+    job_id TEXT NOT NULL,
+    follower_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, follower_id)
+);
+"""
+
+
+class JobQueue:
+    """
+    Persistent job queue backed by SQLite.
+
+    Jobs move through named stages. A worker claims a job for one stage and holds a
+    lease on it; the lease is extended by heartbeats while the stage runs. If a worker
+    dies the lease expires and the job becomes claimable again, so nothing is lost
+    on restart or deploy. The payload is rewritten after every completed stage,
+    which is what lets a retried job resume where it left off.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.JOB_QUEUE_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not thread safe, so keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"] or "{}")
+        return job
+
+    def enqueue(self, kind: str, stage: str, payload: Dict, job_id: str = None, max_attempts: int = None) -> str:
+        """Adds a job at the given stage and returns its id."""
+        now = time.time()
+        job_id = job_id or str(uuid.uuid4())
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, stage, status, payload, max_attempts, available_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, stage, STATUS_PENDING, json.dumps(payload),
+             max_attempts or Config.JOB_MAX_ATTEMPTS, now, now, now),
+        )
+        return job_id
+
+    def enqueue_or_attach(
+        self,
+        kind: str,
+        stage: str,
+        payload: Dict,
+        job_id: str,
+        scope: str,
+        fingerprint: str,
+        replace: bool = False,
+    ) -> Tuple[str, Dict]:
+        """
+        Enqueues a job unless one for the same input (`scope`, `fingerprint`) exists.
+        Returns (outcome, job):
+          ENQUEUED      a new job was added (also when the earlier one failed);
+          ATTACHED      an earlier job is still pending/running; `job_id` is recorded as
+                        its follower and gets its result (see `followers`);
+          ALREADY_DONE  an earlier job finished; the caller reuses its result.
+        The check and the insert happen in one transaction, so of two concurrent
+        duplicates exactly one is enqueued. `replace` always enqueues and makes this job
+        the fingerprint's source (e.g. when the earlier result turned out to be gone).
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT jobs.* FROM job_sources JOIN jobs ON jobs.id = job_sources.job_id "
+                "WHERE job_sources.scope = ? AND job_sources.fingerprint = ?",
+                (scope, fingerprint),
+            ).fetchone()
+            if replace:
+                row = None
+            if row is not None and row["status"] in (STATUS_PENDING, STATUS_RUNNING):
+                conn.execute(
+                    "INSERT OR IGNORE INTO job_followers (job_id, follower_id, created_at) VALUES (?, ?, ?)",
+                    (row["id"], job_id, now),
+                )
+                outcome = ATTACHED
+            elif row is not None and row["status"] == STATUS_DONE:
+                outcome = ALREADY_DONE
+            else:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, stage, status, payload, max_attempts, available_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, stage, STATUS_PENDING, json.dumps(payload), Config.JOB_MAX_ATTEMPTS, now, now, now),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO job_sources (scope, fingerprint, job_id, created_at) VALUES (?, ?, ?, ?)",
+                    (scope, fingerprint, job_id, now),
+                )
+                outcome = ENQUEUED
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return outcome, (self.get(job_id) if outcome == ENQUEUED else self._row_to_job(row))
+
+    def followers(self, job_id: str) -> List[str]:
+        """Ids attached to `job_id` by enqueue_or_attach. Read it after complete()/fail() so none are missed."""
+        rows = self._conn().execute(
+            "SELECT follower_id FROM job_followers WHERE job_id = ? ORDER BY created_at", (job_id,)
+        ).fetchall()
+        return [row["follower_id"] for row in rows]
+
+    def claim(self, stages: List[str], worker_id: str, lease_seconds: int = None) -> Optional[Dict]:
+        """
+        Claims the oldest runnable job in one of `stages`.
+        Runnable means pending and due, or running with an expired lease (crashed worker).
+        """
+        lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        now = time.time()
+        placeholders = ",".join("?" for _ in stages)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE stage IN ({placeholders}) AND ("
+                f"(status = ? AND available_at <= ?) OR (status = ? AND lease_expires_at < ?)"
+                f") ORDER BY available_at LIMIT 1",
+                (*stages, STATUS_PENDING, now, STATUS_RUNNING, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, worker_id, now + lease_seconds, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        job = self._row_to_job(row)
+        job["attempts"] += 1
+        job["status"] = STATUS_RUNNING
+        job["lease_owner"] = worker_id
+        return job
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int = None) -> bool:
+        """Extends the lease. Returns False if the lease was lost to another worker."""
+        lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ? AND status = ?",
+            (now + lease_seconds, now, job_id, worker_id, STATUS_RUNNING),
+        )
+        return cur.rowcount == 1
+
+    def advance(self, job_id: str, worker_id: str, next_stage: str, payload: Dict) -> bool:
+        """Records a completed stage and makes the job available to the next stage's workers."""
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET stage = ?, status = ?, payload = ?, attempts = 0, available_at = ?, "
+            "lease_owner = NULL, lease_expires_at = NULL, last_error = NULL, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ?",
+            (next_stage, STATUS_PENDING, json.dumps(payload), now, now, job_id, worker_id),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, payload: Dict = None) -> bool:
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = ?, payload = COALESCE(?, payload), "
+            "lease_owner = NULL, lease_expires_at = NULL, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ?",
+            (STATUS_DONE, json.dumps(payload) if payload is not None else None, now, job_id, worker_id),
+        )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, payload: Dict = None) -> bool:
+        """
+        Records a failed attempt at the current stage.
+        Returns True if the job was rescheduled (exponential backoff with jitter),
+        False if it ran out of attempts and is now permanently failed.
+        """
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?", (job_id, worker_id)
+        ).fetchone()
+        if row is None:
+            # Lease was lost to another worker, which now owns the retry.
+            return True
+
+        now = time.time()
+        payload_json = json.dumps(payload) if payload is not None else None
+        if row["attempts"] >= row["max_attempts"]:
+            conn.execute(
+                "UPDATE jobs SET status = ?, last_error = ?, payload = COALESCE(?, payload), "
+                "lease_owner = NULL, lease_expires_at = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (STATUS_FAILED, error, payload_json, now, job_id, worker_id),
+            )
+            return False
+
+        delay = Config.JOB_RETRY_BASE_SECONDS * (2 ** (row["attempts"] - 1))
+        delay += random.uniform(0, delay / 2)
+        conn.execute(
+            "UPDATE jobs SET status = ?, last_error = ?, payload = COALESCE(?, payload), available_at = ?, "
+            "lease_owner = NULL, lease_expires_at = NULL, updated_at = ? WHERE id = ? AND lease_owner = ?",
+            (STATUS_PENDING, error, payload_json, now + delay, now, job_id, worker_id),
+        )
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Returns {stage: {status: count}} for unfinished jobs."""
+        rows = self._conn().execute(
+            "SELECT stage, status, COUNT(*) AS n FROM jobs WHERE status IN (?, ?) GROUP BY stage, status",
+            (STATUS_PENDING, STATUS_RUNNING),
+        ).fetchall()
+        result: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            result.setdefault(row["stage"], {})[row["status"]] = row["n"]
+        return result
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.config import Config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    response TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_responses_lru_idx ON llm_responses (last_used_at);
+"""
+
+
+def response_cache_key(system_prompt: str, user_prompt: str, audio_sha256: Optional[str], model: str, temperature: float) -> str:
+    """Hash of everything that determines the model's output."""
+    payload = json.dumps(
+        [system_prompt, user_prompt, audio_sha256 or "", model, round(float(temperature), 4)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache of Gemini responses in SQLite. Entries expire after
+    LLM_CACHE_TTL_SECONDS; when the table grows past LLM_CACHE_MAX_BYTES the least
+    recently used entries are dropped.
+    """
+
+    # Eviction scans the table, so only run it every N writes
+    EVICT_EVERY = 50
+
+    def __init__(self, path: str = None, ttl_seconds: int = None, max_bytes: int = None):
+        self.path = path or Config.LLM_CACHE_PATH
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.LLM_CACHE_TTL_SECONDS
+        self.max_bytes = max_bytes if max_bytes is not None else Config.LLM_CACHE_MAX_BYTES
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if now - row["created_at"] > self.ttl_seconds:
+            self._conn().execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            return None
+        self._conn().execute("UPDATE llm_responses SET last_used_at = ? WHERE key = ?", (now, key))
+        return row["response"]
+
+    def put(self, key: str, response: str, model: str = None):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO llm_responses (key, model, response, size_bytes, created_at, last_used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, response, len(response.encode("utf-8")), now, now),
+        )
+        with self._writes_lock:
+            self._writes += 1
+            should_evict = self._writes % self.EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from least recently used, deleting until we're under budget
+        to_free = total - self.max_bytes
+        keys = []
+        for row in conn.execute("SELECT key, size_bytes FROM llm_responses ORDER BY last_used_at"):
+            keys.append(row["key"])
+            to_free -= row["size_bytes"]
+            if to_free <= 0:
+                break
+        conn.executemany("DELETE FROM llm_responses WHERE key = ?", [(k,) for k in keys])
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
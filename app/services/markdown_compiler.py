@@ -0,0 +1,237 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from reportlab.lib.units import inch
+from reportlab.platypus import Flowable, HRFlowable, ListFlowable, ListItem, Paragraph, Preformatted
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_ITEM_RE = re.compile(r"^(\s*)([-*+]|\d{1,9}[.)])\s+(.*)$")
+_RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_QUOTE_RE = re.compile(r"^\s*>\s?(.*)$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)\s]+)\)")
+
+# Inline delimiters and the ReportLab tag each one maps to
+_EMPHASIS_TAGS = {"**": "b", "__": "b", "*": "i", "_": "i"}
+_ESCAPABLE = set("\\`*_[]()#+-.!>|")
+
+
+def escape(text: str) -> str:
+    """Escapes the characters ReportLab's paragraph parser treats as markup."""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def inline_markup(text: str) -> str:
+    """
+    Converts Markdown inline syntax (bold, italic, code spans, links, backslash
+    escapes) into ReportLab paragraph markup in one left-to-right scan.
+
+    Emphasis is matched with a delimiter stack, so the output is always well nested:
+    an opener that is never closed, or one that would cross another tag, is emitted
+    as literal text instead of producing markup ReportLab would reject.
+    """
+    out: List[str] = []
+    stack: List[Tuple[str, int]] = []  # (delimiter, index of its placeholder in out)
+    i, n = 0, len(text)
+
+    while i < n:
+        c = text[i]
+
+        if c == "\\" and i + 1 < n and text[i + 1] in _ESCAPABLE:
+            out.append(escape(text[i + 1]))
+            i += 2
+            continue
+
+        if c == "`":
+            end = text.find("`", i + 1)
+            if end != -1:
+                out.append(f'<font face="Courier">{escape(text[i + 1:end])}</font>')
+                i = end + 1
+                continue
+
+        if c == "[":
+            match = _LINK_RE.match(text, i)
+            if match:
+                href = escape(match.group(2)).replace('"', "&quot;")
+                out.append(f'<link href="{href}" color="blue">{inline_markup(match.group(1))}</link>')
+                i = match.end()
+                continue
+
+        if c in "*_":
+            delim = c * 2 if text.startswith(c * 2, i) else c
+            if delim == c * 2 and stack and stack[-1][0] == c and text.startswith(c * 3, i):
+                delim = c  # "***" closing "***x": close the inner italic first, then the bold
+            prev_char = text[i - 1] if i > 0 else " "
+            next_char = text[i + len(delim)] if i + len(delim) < n else " "
+            open_delims = [d for d, _ in stack]
+
+            if c == "_" and prev_char.isalnum() and next_char.isalnum():
+                pass  # intraword underscore (snake_case), never emphasis
+            elif delim in open_delims and not prev_char.isspace():
+                # Close it; anything opened after it was never closed and stays literal
+                while stack[-1][0] != delim:
+                    stack.pop()
+                _, index = stack.pop()
+                tag = _EMPHASIS_TAGS[delim]
+                out[index] = f"<{tag}>"
+                out.append(f"</{tag}>")
+                i += len(delim)
+                continue
+            elif not next_char.isspace() and not (c == "_" and prev_char.isalnum()):
+                stack.append((delim, len(out)))
+                out.append(delim)
+                i += len(delim)
+                continue
+
+            out.append(delim)
+            i += len(delim)
+            continue
+
+        out.append(escape(c))
+        i += 1
+
+    return "".join(out)
+
+
+def _join_lines(lines: List[str]) -> str:
+    """Joins soft-wrapped lines with spaces; a trailing double space or backslash forces a break."""
+    parts = []
+    for index, line in enumerate(lines):
+        last = index == len(lines) - 1
+        if not last and (line.endswith("  ") or line.endswith("\\")):
+            parts.append(inline_markup(line.strip().rstrip("\\").rstrip()) + "<br/>")
+        else:
+            parts.append(inline_markup(line.strip()) + ("" if last else " "))
+    return "".join(parts)
+
+
+class _ListEntry:
+    def __init__(self, indent: int, marker: str, text: str):
+        self.indent = indent
+        self.ordered = marker[0].isdigit()
+        self.start = int(marker[:-1]) if self.ordered else None
+        self.lines = [text]
+
+
+def _build_list(entries: List[_ListEntry], pos: int, styles: Dict) -> Tuple[Flowable, int]:
+    """Builds one ListFlowable from entries[pos:] at entries[pos]'s indent; deeper entries nest."""
+    first = entries[pos]
+    indent = first.indent
+    items: List[List[Flowable]] = []
+
+    while pos < len(entries) and entries[pos].indent >= indent:
+        entry = entries[pos]
+        if entry.indent > indent and items:
+            nested, pos = _build_list(entries, pos, styles)
+            items[-1].append(nested)
+            continue
+        items.append([Paragraph(_join_lines(entry.lines), styles["list"])])
+        pos += 1
+
+    flowable = ListFlowable(
+        [ListItem(item if len(item) > 1 else item[0]) for item in items],
+        bulletType="1" if first.ordered else "bullet",
+        start=first.start if first.ordered else None,
+        leftIndent=0.25 * inch,
+        spaceAfter=6,
+    )
+    return flowable, pos
+
+
+def compile_markdown(markdown_text: str, styles: Dict) -> List[Flowable]:
+    """
+    Compiles Markdown into ReportLab flowables in a single pass over the lines.
+
+    Consecutive text lines are merged into one paragraph, consecutive list items into
+    one (possibly nested) ListFlowable, and consecutive quote lines into one quote
+    paragraph. Blank lines only end blocks; spacing comes from the styles.
+
+    `styles` needs "h1", "h2", "h3", "body", "list", "quote" and "code".
+    """
+    flowables: List[Flowable] = []
+    paragraph: List[str] = []
+    quote: List[str] = []
+    entries: List[_ListEntry] = []
+    code: Optional[List[str]] = None
+    blank_in_list = False
+
+    def flush():
+        nonlocal blank_in_list
+        if paragraph:
+            flowables.append(Paragraph(_join_lines(paragraph), styles["body"]))
+            paragraph.clear()
+        if quote:
+            flowables.append(Paragraph(_join_lines(quote), styles["quote"]))
+            quote.clear()
+        if entries:
+            pos = 0
+            while pos < len(entries):
+                flowable, pos = _build_list(entries, pos, styles)
+                flowables.append(flowable)
+            entries.clear()
+        blank_in_list = False
+
+    for raw in markdown_text.splitlines():
+        line = raw.rstrip("\n")
+
+        if code is not None:
+            if _FENCE_RE.match(line):
+                flowables.append(Preformatted("\n".join(code), styles["code"]))
+                code = None
+            else:
+                code.append(line)
+            continue
+
+        if not line.strip():
+            if entries:
+                blank_in_list = True  # a loose list continues if the next line is an item
+            else:
+                flush()
+            continue
+
+        if _FENCE_RE.match(line):
+            flush()
+            code = []
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            flush()
+            level = min(len(heading.group(1)), 3)
+            flowables.append(Paragraph(inline_markup(heading.group(2)), styles[f"h{level}"]))
+            continue
+
+        if _RULE_RE.match(line):
+            flush()
+            flowables.append(HRFlowable(width="100%", thickness=0.5, color=styles["body"].textColor, spaceBefore=4, spaceAfter=8))
+            continue
+
+        item = _LIST_ITEM_RE.match(line)
+        if item:
+            if paragraph or quote:
+                flush()
+            blank_in_list = False
+            entries.append(_ListEntry(len(item.group(1).expandtabs(4)), item.group(2), item.group(3)))
+            continue
+
+        quoted = _QUOTE_RE.match(line)
+        if quoted:
+            if paragraph or entries:
+                flush()
+            quote.append(quoted.group(1))
+            continue
+
+        if entries:
+            if blank_in_list and not raw[:1].isspace():
+                flush()  # unindented text after a blank line ends the list
+            else:
+                entries[-1].lines.append(line.strip())
+                continue
+        if quote:
+            flush()
+        paragraph.append(line)
+
+    if code is not None:
+        flowables.append(Preformatted("\n".join(code), styles["code"]))
+    flush()
+    return flowables
@@ -0,0 +1,321 @@
+import bisect
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config import Config
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8, 5e8, 1e9)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at scrape time by `set_function`."""
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], Dict[LabelValues, float]]):
+        """`fn` returns {label values tuple: value}; called on every scrape."""
+        self._function = fn
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                values = self._function()
+            except Exception as e:
+                print(f"Metrics collector for {self.name} failed: {e}")
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            state[index] += 1
+            state[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Metric definitions ---
+
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "sermonflow_stage_duration_seconds", "Duration of named pipeline stages.", ["pipeline", "stage", "outcome"]
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "sermonflow_stage_in_flight", "Stages currently running in this process.", ["pipeline", "stage"]
+))
+BYTES_TRANSFERRED = REGISTRY.register(Histogram(
+    "sermonflow_bytes_transferred", "Size of transfers in bytes.", ["target", "direction"], buckets=BYTES_BUCKETS
+))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    "sermonflow_http_request_duration_seconds", "API request latency.", ["method", "route", "status"]
+))
+GEMINI_REQUESTS = REGISTRY.register(Counter(
+    "sermonflow_gemini_requests_total", "Gemini calls by final outcome.", ["model", "outcome"]
+))
+GEMINI_RETRIES = REGISTRY.register(Counter(
+    "sermonflow_gemini_retries_total", "Gemini attempts that were retried.", ["model", "reason"]
+))
+GEMINI_DURATION = REGISTRY.register(Histogram(
+    "sermonflow_gemini_request_duration_seconds", "Gemini call latency including retries.", ["model"]
+))
+GEMINI_TOKENS = REGISTRY.register(Counter(
+    "sermonflow_gemini_tokens_total", "Gemini tokens by kind (prompt, cached, output).", ["model", "kind"]
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "sermonflow_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"]
+))
+GENERATION_INPUT_TOKENS = REGISTRY.register(Counter(
+    "sermonflow_generation_input_tokens_total", "Estimated sermon input tokens planned per asset.", ["asset_type", "strategy", "kind"]
+))
+SUPABASE_REQUESTS = REGISTRY.register(Counter(
+    "sermonflow_supabase_requests_total", "PostgREST round trips by table, method and outcome.", ["table", "method", "outcome"]
+))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "sermonflow_startup_seconds", "Seconds from process start to each startup milestone, and the warm-up's duration.", ["phase"]
+))
+JOB_QUEUE_JOBS = REGISTRY.register(Gauge(
+    "sermonflow_ingestion_jobs", "Ingestion jobs in the persistent queue by stage and status.", ["stage", "status"]
+))
+
+
+def _job_queue_counts() -> Dict[LabelValues, float]:
+    from app.services.job_queue import get_job_queue
+
+    values = {}
+    for stage, statuses in get_job_queue().counts().items():
+        for status, count in statuses.items():
+            values[(stage, status)] = count
+    return values
+
+JOB_QUEUE_JOBS.set_function(_job_queue_counts)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_bytes(target: str, direction: str, size: Optional[int]):
+    if size:
+        BYTES_TRANSFERRED.observe(size, target=target, direction=direction)
+
+
+def record_gemini_usage(model: str, response):
+    """Adds a response's token usage to the token counters (if the SDK reported any)."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, attr in (("prompt", "prompt_token_count"), ("cached", "cached_content_token_count"), ("output", "candidates_token_count")):
+        count = getattr(usage, attr, None)
+        if count:
+            GEMINI_TOKENS.inc(count, model=model, kind=kind)
+
+
+# --- Spans ---
+
+_tracer = None
+
+def configure_tracing(service_name: str):
+    """
+    Enables OpenTelemetry trace export when OTEL_EXPORTER_OTLP_ENDPOINT is set and the
+    opentelemetry SDK + OTLP exporter are installed. Spans are then exported in addition
+    to the Prometheus histograms; without it, spans only feed the histograms.
+    """
+    global _tracer
+    if not Config.OTEL_EXPORTER_OTLP_ENDPOINT:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        print(f"Warning: OpenTelemetry export requested but not installed ({e}); spans go to /metrics only.")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("sermonflow")
+    print(f"OpenTelemetry trace export enabled for {service_name}")
+
+
+@contextmanager
+def span(pipeline: str, stage: str, **attributes):
+    """
+    Times a named stage: observes sermonflow_stage_duration_seconds{pipeline, stage, outcome},
+    tracks it as in flight, and exports an OpenTelemetry span when tracing is configured.
+    """
+    otel_span = None
+    if _tracer is not None:
+        otel_span = _tracer.start_as_current_span(f"{pipeline}.{stage}", attributes={
+            k: str(v) for k, v in attributes.items() if v is not None
+        })
+        otel_span.__enter__()
+
+    IN_FLIGHT.inc(pipeline=pipeline, stage=stage)
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, pipeline=pipeline, stage=stage, outcome=outcome)
+        IN_FLIGHT.dec(pipeline=pipeline, stage=stage)
+        if otel_span is not None:
+            otel_span.__exit__(*sys.exc_info())
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def start_metrics_server(port: int):
+    """Serves /metrics on a background thread (for processes without the FastAPI app, e.g. the worker)."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Metrics on :{port}/metrics")
+    return server
@@ -1,33 +1,120 @@
 import os
 import io
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+import functools
+import hashlib
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, BinaryIO, Dict, Optional
 
+from app.config import Config
 from app.models.schemas import BrandingAssets
-from app.services.supabase_client import get_supabase
+
+# ReportLab (and markdown_compiler, built on it) is imported where it is used: it is
+# the largest import in the API, whose renders normally happen in the worker pool.
+if TYPE_CHECKING:
+    from reportlab.lib.styles import ParagraphStyle
+
+
+def _hex_to_color(hex_code: str):
+    from reportlab.lib import colors
+
+    try:
+        return colors.HexColor(hex_code)
+    except:
+        return colors.black
+
+
+@functools.lru_cache(maxsize=64)
+def _compiled_styles(branding_json: str) -> Dict[str, "ParagraphStyle"]:
+    """
+    Builds the style set for one branding, once per process. Keyed by the branding's
+    JSON, so editing `branding_assets` simply produces a new entry.
+    """
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+
+    branding = BrandingAssets.model_validate_json(branding_json)
+    styles = getSampleStyleSheet()
+
+    # Custom Styles based on branding fonts (generic fallback to Helvetica for now)
+    # In a real app, we would register generic fonts or use branding.font_header if it maps to a file.
+    return {
+        "h1": ParagraphStyle(
+            'CustomH1',
+            parent=styles['Heading1'],
+            textColor=_hex_to_color(branding.secondary_color)
+        ),
+        "h2": styles['Heading2'],
+        "h3": styles['Heading3'],
+        "normal": styles['Normal'],
+        "body": ParagraphStyle('Body', parent=styles['Normal'], spaceAfter=6),
+        "list": ParagraphStyle('ListBody', parent=styles['Normal'], spaceAfter=2),
+        "quote": ParagraphStyle(
+            'Quote',
+            parent=styles['Normal'],
+            fontName='Helvetica-Oblique',
+            leftIndent=0.3 * inch,
+            textColor=_hex_to_color(branding.secondary_color),
+            spaceAfter=6,
+        ),
+        "code": styles['Code'],
+    }
+
 
 class PDFEngine:
     def __init__(self):
         self.bucket_name = "sermon-assets"
+        self._storage = None
 
-    def _hex_to_color(self, hex_code: str):
-        try:
-            return colors.HexColor(hex_code)
-        except:
-            return colors.black
+    @property
+    def storage(self):
+        if self._storage is None:
+            # Imported here so render worker processes never load the Supabase client
+            from app.services.storage_service import StorageService
+            self._storage = StorageService(bucket_name=self.bucket_name)
+        return self._storage
+
+    def _branding_json(self, branding: BrandingAssets) -> str:
+        return branding.model_dump_json()
+
+    def _styles(self, branding: BrandingAssets) -> Dict[str, "ParagraphStyle"]:
+        return _compiled_styles(self._branding_json(branding))
 
     def _draw_header_footer(self, canvas, doc, branding: BrandingAssets):
         """
-        Draws header and footer on every page.
+        Draws header and footer on every page. The static part (colour bars, title) is
+        recorded once per document as a form XObject and referenced from each page;
+        only the page number is drawn per page.
         """
+        from reportlab.lib import colors
+        from reportlab.lib.units import inch
+
+        form_name = "hf" + hashlib.sha1(self._branding_json(branding).encode()).hexdigest()[:12]
+        if not canvas.hasForm(form_name):
+            canvas.beginForm(form_name)
+            self._draw_header_footer_static(canvas, branding)
+            canvas.endForm()
+
+        canvas.saveState()
+        canvas.doForm(form_name)
+        canvas.setFillColor(colors.white)
+        canvas.setFont("Helvetica", 9)
+        page_num = canvas.getPageNumber()
+        canvas.drawString(0.5 * inch, 0.2 * inch, f"Page {page_num}")
+        canvas.restoreState()
+
+    def _draw_header_footer_static(self, canvas, branding: BrandingAssets):
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import inch
+
         canvas.saveState()
         
         # Header - Primary Color Bar
-        primary_color = self._hex_to_color(branding.primary_color)
+        primary_color = _hex_to_color(branding.primary_color)
         canvas.setFillColor(primary_color)
         canvas.rect(0, A4[1] - 1 * inch, A4[0], 1 * inch, fill=True, stroke=False)
         
@@ -43,57 +130,66 @@ class PDFEngine:
         canvas.setFillColor(primary_color)
         canvas.rect(0, 0, A4[0], 0.5 * inch, fill=True, stroke=False)
         
-        canvas.setFillColor(colors.white)
-        canvas.setFont("Helvetica", 9)
-        page_num = canvas.getPageNumber()
-        canvas.drawString(0.5 * inch, 0.2 * inch, f"Page {page_num}")
-        
         canvas.restoreState()
 
     def _markdown_to_flowables(self, markdown_text: str, branding: BrandingAssets):
-        styles = getSampleStyleSheet()
-        
-        # Custom Styles based on branding fonts (generic fallback to Helvetica for now)
-        # In a real app, we would register generic fonts or use branding.font_header if it maps to a file.
-        
-        h1_style = ParagraphStyle(
-            'CustomH1', 
-            parent=styles['Heading1'], 
-            textColor=self._hex_to_color(branding.secondary_color)
-        )
-        norm_style = styles['Normal']
-        
-        flowables = []
-        
-        lines = markdown_text.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                flowables.append(Spacer(1, 0.1 * inch))
-                continue
-            
-            if line.startswith('# '):
-                flowables.append(Paragraph(line[2:], h1_style))
-                flowables.append(Spacer(1, 0.1 * inch))
-            elif line.startswith('## '):
-                # Map to h2
-                flowables.append(Paragraph(line[3:], styles['Heading2']))
-                flowables.append(Spacer(1, 0.1 * inch))
-            elif line.startswith('### '):
-                flowables.append(Paragraph(line[4:], styles['Heading3']))
-            elif line.startswith('* ') or line.startswith('- '):
-                # List item
-                flowables.append(Paragraph(f"• {line[2:]}", norm_style, bulletText='•'))
-            else:
-                flowables.append(Paragraph(line, norm_style))
-                
-        return flowables
+        from app.services.markdown_compiler import compile_markdown
+
+        return compile_markdown(markdown_text, self._styles(branding))
 
     def generate_pdf(self, markdown_text: str, branding: BrandingAssets) -> bytes:
+        """Renders and returns the whole PDF as bytes. Prefer `generate_pdf_file` for uploads."""
+        with self.generate_pdf_file(markdown_text, branding) as pdf_file:
+            return pdf_file.read()
+
+    def generate_pdf_file(self, markdown_text: str, branding: BrandingAssets) -> BinaryIO:
+        """
+        Renders and returns an open file positioned at the start; the caller closes it.
+        Renders on the warm process pool (PDF_RENDER_PROCESSES), keeping layout CPU off
+        the API's GIL, and falls back to rendering inline if the pool is disabled or
+        broken. The PDF never round-trips through `bytes`: workers write to a file in
+        PDF_SPOOL_DIR, inline renders to a temp file kept in memory only up to
+        PDF_SPOOL_MAX_BYTES.
+        """
+        os.makedirs(Config.PDF_SPOOL_DIR, exist_ok=True)
+        pool = get_pdf_render_pool()
+        if pool is not None:
+            try:
+                path = pool.submit(_render_in_worker, markdown_text, branding, Config.PDF_SPOOL_DIR).result()
+            except BrokenProcessPool as e:
+                print(f"PDF render pool broken ({e}); rendering inline.")
+                _reset_pdf_render_pool(pool)
+            else:
+                pdf_file = open(path, "rb")
+                os.remove(path)  # the open handle keeps the data until it's closed
+                return pdf_file
+
+        pdf_file = tempfile.SpooledTemporaryFile(max_size=Config.PDF_SPOOL_MAX_BYTES, dir=Config.PDF_SPOOL_DIR)
+        try:
+            self.render_pdf_to(pdf_file, markdown_text, branding)
+        except Exception:
+            pdf_file.close()
+            raise
+        pdf_file.seek(0)
+        return pdf_file
+
+    def render_pdf(self, markdown_text: str, branding: BrandingAssets) -> bytes:
+        """Renders in the calling process."""
         buffer = io.BytesIO()
+        self.render_pdf_to(buffer, markdown_text, branding)
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        return pdf_bytes
+
+    def render_pdf_to(self, fileobj: BinaryIO, markdown_text: str, branding: BrandingAssets):
+        """Renders in the calling process into a writable binary file."""
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+        from app.services.markdown_compiler import escape
+
         doc = SimpleDocTemplate(
-            buffer, 
+            fileobj, 
             pagesize=A4,
             rightMargin=0.5*inch, leftMargin=0.5*inch,
             topMargin=1.2*inch, bottomMargin=0.8*inch
@@ -104,35 +200,108 @@ class PDFEngine:
         except Exception as e:
             # Robust fallback logic
             print(f"MD Parsing failed: {e}. Falling back to plain text.")
-            styles = getSampleStyleSheet()
-            story = [Paragraph("Error parsing content format. Raw content below:", styles['Heading3']), Spacer(1, 0.2*inch)]
+            styles = self._styles(branding)
+            story = [Paragraph("Error parsing content format. Raw content below:", styles['h3']), Spacer(1, 0.2*inch)]
             for line in markdown_text.split('\n'):
-                 story.append(Paragraph(line, styles['Normal']))
+                 story.append(Paragraph(escape(line), styles['normal']))
         
         # Build PDF
         def on_page(canvas, doc):
             self._draw_header_footer(canvas, doc, branding)
 
         doc.build(story, onFirstPage=on_page, onLaterPages=on_page)
-        
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
-        return pdf_bytes
 
-    def upload_to_supabase(self, pdf_bytes: bytes, church_name: str, sermon_id: str, file_name: str = "asset.pdf") -> str:
-        supabase = get_supabase()
-        
+    def upload_to_supabase(self, pdf, church_name: str, sermon_id: str, file_name: str = "asset.pdf") -> str:
+        """
+        Uploads the PDF and returns its public URL.
+        `pdf` may be bytes or a seekable binary file; files are streamed in chunks.
+        """
         # Clean church name for path
         safe_church_name = church_name.replace(" ", "_").lower().strip()
         path = f"{safe_church_name}/{sermon_id}/{file_name}"
         
-        # Upload
-        response = supabase.storage.from_(self.bucket_name).upload(
-            path=path,
-            file=pdf_bytes,
-            file_options={"content-type": "application/pdf", "upsert": "true"}
-        )
-        
-        # Get Public URL
-        public_url = supabase.storage.from_(self.bucket_name).get_public_url(path)
-        return public_url
+        fileobj = io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else pdf
+        return self.storage.upload_fileobj(fileobj, path, "application/pdf")["public_url"]
+
+
+_engine: Optional[PDFEngine] = None
+_engine_lock = threading.Lock()
+
+def get_pdf_engine() -> PDFEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PDFEngine()
+    return _engine
+
+
+# --- Render worker pool ---
+# Worker processes are spawned (not forked, the API process has threads) and warmed
+# by rendering a tiny document, so ReportLab's imports and font metrics are loaded
+# before the first real job. Style sets are then cached per worker.
+
+_WARM_BRANDING = BrandingAssets(
+    primary_color="#000000", secondary_color="#000000", logo_url="", font_header="Helvetica", font_body="Helvetica"
+)
+
+_worker_engine: Optional[PDFEngine] = None
+
+def warm_up_renderer(engine: PDFEngine = None):
+    """Loads ReportLab, its font metrics and a style set in this process by rendering a tiny document."""
+    (engine or get_pdf_engine()).render_pdf("# Warm-up\n\nReady.", _WARM_BRANDING)
+
+def _warm_render_worker():
+    global _worker_engine
+    _worker_engine = PDFEngine()
+    warm_up_renderer(_worker_engine)
+
+def _render_in_worker(markdown_text: str, branding: BrandingAssets, spool_dir: str) -> str:
+    """Renders to a file in `spool_dir` and returns its path; the parent opens and deletes it."""
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=spool_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            _worker_engine.render_pdf_to(f, markdown_text, branding)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+def _noop():
+    return None
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_pdf_render_pool() -> Optional[ProcessPoolExecutor]:
+    """Returns the shared render pool, starting (and warming) it on first use. None if disabled."""
+    global _pool
+    if Config.PDF_RENDER_PROCESSES <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=Config.PDF_RENDER_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_render_worker,
+                )
+                # Start every worker now rather than on the first real renders
+                for _ in range(Config.PDF_RENDER_PROCESSES):
+                    _pool.submit(_noop)
+    return _pool
+
+def _reset_pdf_render_pool(broken: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_pdf_render_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Generation stages, in order
+STAGE_QUEUED = "queued"
+STAGE_DOWNLOADING_AUDIO = "downloading_audio"
+STAGE_GENERATING_CONTENT = "generating_content"
+STAGE_RENDERING_PDF = "rendering_pdf"
+STAGE_UPLOADING_PDF = "uploading_pdf"
+STAGE_COMPLETED = "completed"
+STAGE_FAILED = "failed"
+
+STAGES = [
+    STAGE_QUEUED,
+    STAGE_DOWNLOADING_AUDIO,
+    STAGE_GENERATING_CONTENT,
+    STAGE_RENDERING_PDF,
+    STAGE_UPLOADING_PDF,
+    STAGE_COMPLETED,
+]
+
+
+class ProgressTracker:
+    """
+    In-process, per-asset stage progress for the status endpoint.
+    The `assets` row stays the source of truth for the final outcome; this only adds
+    the fine-grained stage and timings while the asset is being produced on this worker.
+    """
+
+    def __init__(self, max_entries: int = 2000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, asset_id: str, **info):
+        now = time.time()
+        with self._lock:
+            self._entries[asset_id] = {
+                "asset_id": asset_id,
+                "stage": STAGE_QUEUED,
+                "stages": [{"stage": STAGE_QUEUED, "started_at": now}],
+                "error": None,
+                "created_at": now,
+                **info,
+            }
+            self._entries.move_to_end(asset_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set_stage(self, asset_id: str, stage: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(asset_id)
+            if entry is None:
+                return
+            previous = entry["stages"][-1]
+            previous["finished_at"] = now
+            previous["duration_ms"] = round((now - previous["started_at"]) * 1000)
+            entry["stage"] = stage
+            if stage not in (STAGE_COMPLETED, STAGE_FAILED):
+                entry["stages"].append({"stage": stage, "started_at": now})
+
+    def fail(self, asset_id: str, error: str):
+        self.set_stage(asset_id, STAGE_FAILED)
+        with self._lock:
+            if asset_id in self._entries:
+                self._entries[asset_id]["error"] = error
+
+    def update(self, asset_id: str, **info):
+        with self._lock:
+            if asset_id in self._entries:
+                self._entries[asset_id].update(info)
+
+    def get(self, asset_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(asset_id)
+            if entry is None:
+                return None
+            snapshot = dict(entry)
+            snapshot["stages"] = [dict(s) for s in entry["stages"]]
+
+        if snapshot["stage"] in STAGES:
+            snapshot["progress"] = round(STAGES.index(snapshot["stage"]) / (len(STAGES) - 1), 2)
+        return snapshot
+
+
+_tracker = ProgressTracker()
+
+def get_progress_tracker() -> ProgressTracker:
+    return _tracker
@@ -31,23 +31,40 @@ Create content that strictly adheres to the church's unique voice, theology, and
 {lexicon_str}
 
 **INSTRUCTIONS:**
-1.  Analyze the provided sermon (Audio + Transcript).
+1.  Analyze the provided sermon (transcript and/or audio).
 2.  Detect the emotional arc and specific emphasis of the preacher.
 3.  Generate the requested asset calling upon the Insider Lexicon where appropriate.
 4.  Do NOT be generic. Sound exactly like {profile.church_name}.
 """
         return prompt
 
-    def build_user_prompt(self, asset_type: str, transcript: str) -> str:
+    def build_context_prompt(self, transcript: str) -> str:
         """
-        Constructs the specific user task.
+        The sermon material shared by every asset type. Kept separate from the task so
+        it forms a stable prefix that can be cached once per sermon.
+        Empty when the sermon is sent as audio only.
         """
+        if not transcript:
+            return ""
         return f"""
-**TASK:** Generate a **{asset_type}** based on the attached sermon audio and transcript.
-
 **TRANSCRIPT:**
 {transcript}
+"""
+
+    def build_task_prompt(self, asset_type: str, sources: str = "sermon audio and transcript") -> str:
+        """
+        The small per-asset suffix sent after the cached sermon context.
+        `sources` names what was actually attached (see input_planner).
+        """
+        return f"""
+**TASK:** Generate a **{asset_type}** based on the attached {sources}.
 
 **OUTPUT FORMAT:**
 Return strict Markdown. Do not wrap in ```markdown code blocks.
 """
+
+    def build_user_prompt(self, asset_type: str, transcript: str, sources: str = "sermon audio and transcript") -> str:
+        """
+        Constructs the specific user task (sermon context followed by the task).
+        """
+        return self.build_context_prompt(transcript) + self.build_task_prompt(asset_type, sources)
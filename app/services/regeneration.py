@@ -0,0 +1,567 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.config import Config
+from app.services.repository import Filter, get_repository
+from app.services.generation_pipeline import (
+    GenerationPipeline,
+    SERMON_CONTEXT_COLUMNS,
+    SERMON_RENDER_COLUMNS,
+    get_generation_pipeline,
+)
+from app.services.input_planner import SermonInputPlanner
+
+MODE_GENERATE = "generate"  # Gemini + PDF for every asset, through the normal pipeline
+MODE_RERENDER = "rerender"  # PDF only, from the stored content_markdown
+MODE_BATCH = "batch"        # Gemini Batch API, then PDF
+MODES = (MODE_GENERATE, MODE_RERENDER, MODE_BATCH)
+
+ITEM_PENDING = "pending"
+ITEM_SUBMITTED = "submitted"  # waiting in a batch job
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+# Rows per PostgREST page when selecting sermons, and sermon ids per `in.()` filter
+SELECT_PAGE_SIZE = 500
+ID_CHUNK_SIZE = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS regeneration_runs (
+    run_id TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    selection TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS regeneration_items (
+    run_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    asset_id TEXT NOT NULL,
+    sermon_id TEXT NOT NULL,
+    asset_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    batch_name TEXT,
+    batch_index INTEGER,
+    cache_key TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, asset_id)
+);
+CREATE INDEX IF NOT EXISTS regeneration_items_status_idx ON regeneration_items (run_id, status, position);
+CREATE INDEX IF NOT EXISTS regeneration_items_batch_idx ON regeneration_items (run_id, batch_name);
+"""
+
+
+class Selection(NamedTuple):
+    church_id: str
+    series_title: Optional[str] = None
+    since: Optional[str] = None  # sermons created at or after (ISO date or timestamp)
+    until: Optional[str] = None  # ... and before
+    asset_types: Tuple[str, ...] = ()  # empty: every asset the sermons have
+    sermon_ids: Tuple[str, ...] = ()
+
+    def run_id(self, mode: str) -> str:
+        """Stable id for this selection and mode, so running the same command again resumes it."""
+        payload = {**self._asdict(), "asset_types": sorted(self.asset_types), "sermon_ids": sorted(self.sermon_ids)}
+        return hashlib.sha256(json.dumps([mode, payload], sort_keys=True).encode()).hexdigest()[:16]
+
+
+def select_assets(selection: Selection) -> List[Dict]:
+    """
+    The existing `assets` rows of the selected sermons, oldest sermon first:
+    [{"asset_id", "sermon_id", "asset_type"}]. Sermons are paged and their assets fetched
+    ID_CHUNK_SIZE sermons at a time, so a large catalogue never comes back in one response.
+    """
+    repository = get_repository()
+    filters: Dict = {"church_id": selection.church_id}
+    if selection.series_title:
+        filters["series_title"] = selection.series_title
+    created_at = []
+    if selection.since:
+        created_at.append(Filter("gte", selection.since))
+    if selection.until:
+        created_at.append(Filter("lt", selection.until))
+    if created_at:
+        filters["created_at"] = created_at
+    if selection.sermon_ids:
+        filters["id"] = list(selection.sermon_ids)
+
+    sermon_ids: List[str] = []
+    while True:
+        page = repository.select(
+            "sermons", "id", filters, order="created_at.asc,id", limit=SELECT_PAGE_SIZE, offset=len(sermon_ids)
+        )
+        sermon_ids.extend(row["id"] for row in page)
+        if len(page) < SELECT_PAGE_SIZE:
+            break
+
+    items: List[Dict] = []
+    for start in range(0, len(sermon_ids), ID_CHUNK_SIZE):
+        chunk = sermon_ids[start:start + ID_CHUNK_SIZE]
+        asset_filters: Dict = {"sermon_id": chunk}
+        if selection.asset_types:
+            asset_filters["type"] = list(selection.asset_types)
+        rows = repository.select("assets", "id, sermon_id, type", asset_filters, order="created_at.asc,id")
+        by_sermon: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_sermon.setdefault(row["sermon_id"], []).append(
+                {"asset_id": row["id"], "sermon_id": row["sermon_id"], "asset_type": row["type"]}
+            )
+        for sermon_id in chunk:
+            items.extend(by_sermon.get(sermon_id, []))
+    return items
+
+
+class RegenerationCheckpoint:
+    """
+    Progress of regeneration runs in SQLite (REGENERATION_CHECKPOINT_PATH): the assets a
+    run selected and each one's status, plus the batch job and response-cache key of
+    assets waiting on the Batch API. Items are written as they finish, so a run that is
+    interrupted loses at most the assets that were in flight.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.REGENERATION_CHECKPOINT_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def exists(self, run_id: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM regeneration_runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row is not None
+
+    def create(self, run_id: str, mode: str, selection: Selection, items: List[Dict]):
+        """Records a run and its assets in one transaction, so a run never exists half-selected."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO regeneration_runs (run_id, mode, selection, created_at) VALUES (?, ?, ?, ?)",
+                (run_id, mode, json.dumps(selection._asdict()), now),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO regeneration_items "
+                "(run_id, position, asset_id, sermon_id, asset_type, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, i, item["asset_id"], item["sermon_id"], item["asset_type"], ITEM_PENDING, now)
+                    for i, item in enumerate(items)
+                ],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, run_id: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM regeneration_items WHERE run_id = ?", (run_id,))
+        conn.execute("DELETE FROM regeneration_runs WHERE run_id = ?", (run_id,))
+
+    def items(self, run_id: str, statuses: Tuple[str, ...]) -> List[Dict]:
+        rows = self._conn().execute(
+            f"SELECT * FROM regeneration_items WHERE run_id = ? AND status IN ({','.join('?' * len(statuses))}) "
+            "ORDER BY position",
+            (run_id, *statuses),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark(self, run_id: str, asset_id: str, status: str, error: str = None):
+        self._conn().execute(
+            "UPDATE regeneration_items SET status = ?, error = ?, updated_at = ? WHERE run_id = ? AND asset_id = ?",
+            (status, error, time.time(), run_id, asset_id),
+        )
+
+    def mark_submitted(self, run_id: str, batch_name: str, entries: List[Tuple[str, str]]):
+        """`entries` are (asset_id, cache_key) in the order they were sent in the job."""
+        now = time.time()
+        self._conn().executemany(
+            "UPDATE regeneration_items SET status = ?, error = NULL, batch_name = ?, batch_index = ?, cache_key = ?, "
+            "updated_at = ? WHERE run_id = ? AND asset_id = ?",
+            [
+                (ITEM_SUBMITTED, batch_name, index, cache_key, now, run_id, asset_id)
+                for index, (asset_id, cache_key) in enumerate(entries)
+            ],
+        )
+
+    def batch_names(self, run_id: str) -> List[str]:
+        rows = self._conn().execute(
+            "SELECT DISTINCT batch_name FROM regeneration_items WHERE run_id = ? AND status = ?",
+            (run_id, ITEM_SUBMITTED),
+        ).fetchall()
+        return [row["batch_name"] for row in rows]
+
+    def batch_items(self, run_id: str, batch_name: str) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT * FROM regeneration_items WHERE run_id = ? AND batch_name = ? AND status = ? ORDER BY batch_index",
+            (run_id, batch_name, ITEM_SUBMITTED),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) AS n FROM regeneration_items WHERE run_id = ? GROUP BY status", (run_id,)
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class GeminiBatchBackend:
+    """
+    Gemini's Batch API: inlined requests run asynchronously at half the interactive price,
+    typically within hours (at most 24). Jobs live on Gemini's side, so a resumed run
+    picks up the ones it had submitted.
+    """
+
+    FAILED_STATES = ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+
+    def submit(self, requests: List[Dict], display_name: str) -> str:
+        from app.services.content_engine import CONTENT_MODEL
+        from app.services.gemini_gateway import get_gemini_gateway
+
+        job = get_gemini_gateway().create_batch(CONTENT_MODEL, requests, config={"display_name": display_name})
+        return job.name
+
+    def poll(self, name: str) -> Optional[List[Tuple[Optional[str], Optional[str]]]]:
+        """None while the job runs; then one (text, error) per request, in order. Raises if the job failed."""
+        from app.services.content_engine import CONTENT_MODEL
+        from app.services.gemini_gateway import GeminiError, get_gemini_gateway
+        from app.services import metrics
+
+        job = get_gemini_gateway().get_batch(name)
+        state = getattr(job.state, "name", str(job.state))
+        if state in self.FAILED_STATES:
+            raise GeminiError(f"Gemini batch {name} ended in {state}: {getattr(job, 'error', None)}")
+        if state != "JOB_STATE_SUCCEEDED":
+            return None
+
+        results = []
+        for inlined in job.dest.inlined_responses or []:
+            if getattr(inlined, "error", None):
+                results.append((None, str(inlined.error)))
+                continue
+            metrics.record_gemini_usage(CONTENT_MODEL, inlined.response)
+            try:
+                results.append((inlined.response.text, None))
+            except Exception as e:
+                results.append((None, f"Unreadable batch response: {e}"))
+        return results
+
+
+class LocalBatchBackend:
+    """
+    Stand-in with the Batch API's interface for development and tests: `submit` runs the
+    requests through the normal gateway straight away, REGENERATION_CONCURRENCY at a
+    time, and `poll` hands back the results. They are only held in this process; a
+    resumed run fails the jobs it can't find and submits those assets again.
+    """
+
+    def __init__(self):
+        self._results: Dict[str, List[Tuple[Optional[str], Optional[str]]]] = {}
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def submit(self, requests: List[Dict], display_name: str) -> str:
+        with ThreadPoolExecutor(max_workers=Config.REGENERATION_CONCURRENCY, thread_name_prefix="batch") as pool:
+            results = list(pool.map(self._generate, requests))
+        with self._lock:
+            self._count += 1
+            name = f"local-batches/{display_name}-{self._count}"
+            self._results[name] = results
+        return name
+
+    @staticmethod
+    def _generate(request: Dict) -> Tuple[Optional[str], Optional[str]]:
+        from google.genai import types
+        from app.services.content_engine import CONTENT_MODEL
+        from app.services.gemini_gateway import get_gemini_gateway
+
+        try:
+            response = get_gemini_gateway().generate_content(
+                model=CONTENT_MODEL,
+                contents=request["contents"],
+                config=types.GenerateContentConfig(**request["config"]),
+            )
+            return response.text, None
+        except Exception as e:
+            return None, str(e)
+
+    def poll(self, name: str) -> Optional[List[Tuple[Optional[str], Optional[str]]]]:
+        with self._lock:
+            if name not in self._results:
+                raise Exception(f"Local batch {name} not found (results are kept in-process)")
+            return self._results.pop(name)
+
+
+def get_batch_backend():
+    """The backend selected by REGENERATION_BATCH_BACKEND ("gemini" or "local")."""
+    if Config.REGENERATION_BATCH_BACKEND == "local":
+        return LocalBatchBackend()
+    return GeminiBatchBackend()
+
+
+def _by_sermon(items: List[Dict]) -> "OrderedDict[str, List[Dict]]":
+    groups: "OrderedDict[str, List[Dict]]" = OrderedDict()
+    for item in items:
+        groups.setdefault(item["sermon_id"], []).append(item)
+    return groups
+
+
+class CatalogRegenerator:
+    """
+    Regenerates the existing assets of a selection of sermons in place, up to
+    `concurrency` sermons at a time (each sermon's assets fan out as in
+    GenerationPipeline.run_batch). Every asset's outcome is checkpointed; running the
+    same selection and mode again skips what is done and retries what failed.
+    """
+
+    def __init__(
+        self,
+        mode: str = MODE_GENERATE,
+        concurrency: int = None,
+        use_cache: bool = True,
+        checkpoint: RegenerationCheckpoint = None,
+        pipeline: GenerationPipeline = None,
+        batch_backend=None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown regeneration mode {mode!r}; expected one of {', '.join(MODES)}")
+        self.mode = mode
+        self.concurrency = max(1, concurrency or Config.REGENERATION_CONCURRENCY)
+        self.use_cache = use_cache
+        self.checkpoint = checkpoint or RegenerationCheckpoint()
+        self.pipeline = pipeline or get_generation_pipeline()
+        self.batch_backend = batch_backend
+
+    def run(self, selection: Selection, run_id: str = None, restart: bool = False, wait: bool = True) -> Dict[str, int]:
+        """
+        Runs (or resumes) the regeneration and returns the run's item counts per status.
+        A resumed run keeps the assets it selected when it started. With `wait=False`,
+        batch mode returns once its jobs are submitted; run it again to collect them.
+        """
+        run_id = run_id or selection.run_id(self.mode)
+        if restart:
+            self.checkpoint.delete(run_id)
+        if self.checkpoint.exists(run_id):
+            print(f"Resuming regeneration run {run_id}: {self.checkpoint.counts(run_id)}")
+        else:
+            items = select_assets(selection)
+            self.checkpoint.create(run_id, self.mode, selection, items)
+            print(f"Regeneration run {run_id}: {len(items)} assets selected")
+
+        if self.mode == MODE_BATCH:
+            self._run_batch(run_id, wait)
+        else:
+            self._run_sermons(run_id, self._regenerate_sermon, self.checkpoint.items(run_id, (ITEM_PENDING, ITEM_FAILED)))
+
+        counts = self.checkpoint.counts(run_id)
+        print(f"Regeneration run {run_id} finished: {counts}")
+        return counts
+
+    def _run_sermons(self, run_id: str, fn, items: List[Dict], *args):
+        groups = _by_sermon(items)
+        if not groups:
+            return
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="regenerate") as pool:
+            futures = {pool.submit(fn, run_id, sermon_id, group, *args): group for sermon_id, group in groups.items()}
+            for future, group in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    # One sermon's failure never stops the run; its assets are retried on resume
+                    self._fail(run_id, group, str(e))
+
+    def _record(self, run_id: str, item: Dict, result: Dict):
+        if result["status"] == "success":
+            self.checkpoint.mark(run_id, item["asset_id"], ITEM_DONE)
+        else:
+            self.checkpoint.mark(run_id, item["asset_id"], ITEM_FAILED, result.get("error"))
+
+    def _fail(self, run_id: str, items: List[Dict], error: str):
+        print(f"Regeneration of {len(items)} assets failed: {error}")
+        for item in items:
+            self.checkpoint.mark(run_id, item["asset_id"], ITEM_FAILED, error)
+
+    def _load_context(self, run_id: str, sermon_id: str, items: List[Dict], columns: str) -> Optional[Dict]:
+        try:
+            context = self.pipeline.load_context(sermon_id, columns)
+        except Exception as e:
+            self._fail(run_id, items, f"Sermon {sermon_id}: {e}")
+            return None
+        context["use_cache"] = self.use_cache
+        return context
+
+    # --- generate / rerender ---
+
+    def _regenerate_sermon(self, run_id: str, sermon_id: str, items: List[Dict], context: Dict = None):
+        if self.mode == MODE_RERENDER:
+            return self._rerender_sermon(run_id, sermon_id, items)
+        context = context or self._load_context(run_id, sermon_id, items, SERMON_CONTEXT_COLUMNS)
+        if context is None:
+            return
+        # run_batch takes one asset per type; a sermon generated twice has two of some
+        rounds: List[Dict[str, Dict]] = []
+        for item in items:
+            for batch in rounds:
+                if item["asset_type"] not in batch:
+                    batch[item["asset_type"]] = item
+                    break
+            else:
+                rounds.append({item["asset_type"]: item})
+        for batch in rounds:
+            results = self.pipeline.run_batch({t: item["asset_id"] for t, item in batch.items()}, context)
+            for asset_type, item in batch.items():
+                self._record(run_id, item, results[asset_type])
+
+    def _rerender_sermon(self, run_id: str, sermon_id: str, items: List[Dict]):
+        context = self._load_context(run_id, sermon_id, items, SERMON_RENDER_COLUMNS)
+        if context is None:
+            return
+        try:
+            rows = get_repository().select(
+                "assets", "id, content_markdown", {"id": [item["asset_id"] for item in items]}
+            )
+        except Exception as e:
+            return self._fail(run_id, items, str(e))
+        markdown = {row["id"]: row.get("content_markdown") for row in rows}
+        for item in items:
+            content = markdown.get(item["asset_id"])
+            if not content:
+                self.checkpoint.mark(run_id, item["asset_id"], ITEM_FAILED, "No stored content_markdown to re-render")
+                continue
+            result = self.pipeline.publish(item["asset_id"], item["asset_type"], context, content, save_markdown=False)
+            self._record(run_id, item, result)
+
+    # --- batch ---
+
+    def _run_batch(self, run_id: str, wait: bool):
+        """
+        Builds each asset's text-only request and submits them in jobs of up to
+        REGENERATION_BATCH_MAX_REQUESTS (or REGENERATION_BATCH_MAX_BYTES), then polls the
+        jobs and renders results as they arrive. Response-cache hits skip the batch, and
+        sermons without a transcript go through the normal pipeline with their audio.
+        """
+        if self.batch_backend is None:
+            self.batch_backend = get_batch_backend()
+        pending = self.checkpoint.items(run_id, (ITEM_PENDING, ITEM_FAILED))
+        groups = list(_by_sermon(pending).items())
+
+        buffer: List[Tuple[Dict, str, Dict]] = []
+        size = 0
+        jobs = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="regenerate") as pool:
+            # Sermons are prepared concurrently, a window at a time, so only a window's
+            # transcripts are held in memory on top of the job being filled
+            window = self.concurrency * 4
+            for start in range(0, len(groups), window):
+                prepared = pool.map(lambda group: self._prepare_sermon(run_id, *group), groups[start:start + window])
+                for requests in prepared:
+                    for entry in requests:
+                        buffer.append(entry)
+                        size += len(json.dumps(entry[2]))
+                        if len(buffer) >= Config.REGENERATION_BATCH_MAX_REQUESTS or size >= Config.REGENERATION_BATCH_MAX_BYTES:
+                            jobs += 1
+                            self._submit(run_id, buffer, jobs)
+                            buffer, size = [], 0
+            if buffer:
+                jobs += 1
+                self._submit(run_id, buffer, jobs)
+
+        if not wait:
+            print(f"Regeneration run {run_id}: batch jobs submitted; run again to collect the results")
+            return
+        self._collect(run_id)
+
+    def _prepare_sermon(self, run_id: str, sermon_id: str, items: List[Dict]) -> List[Tuple[Dict, str, Dict]]:
+        try:
+            return self._prepare_requests(run_id, sermon_id, items)
+        except Exception as e:
+            # As in _run_sermons, one sermon's failure never stops the run
+            self._fail(run_id, items, str(e))
+            return []
+
+    def _prepare_requests(self, run_id: str, sermon_id: str, items: List[Dict]) -> List[Tuple[Dict, str, Dict]]:
+        """(item, cache_key, request) for each asset that needs Gemini; everything else is handled here."""
+        context = self._load_context(run_id, sermon_id, items, SERMON_CONTEXT_COLUMNS)
+        if context is None:
+            return []
+        if not context["transcript"].strip():
+            # Audio-only sermons need a File API upload, which inlined batch requests can't carry
+            self._regenerate_sermon(run_id, sermon_id, items, context)
+            return []
+
+        requests = []
+        planner = SermonInputPlanner(context["transcript"])
+        try:
+            for item in items:
+                try:
+                    plan = planner.plan(item["asset_type"])
+                    key, request, cached = self.pipeline.content_engine.batch_request(
+                        context["profile"], plan.transcript, item["asset_type"], use_cache=self.use_cache, sources=plan.sources
+                    )
+                except Exception as e:
+                    self._fail(run_id, [item], str(e))
+                    continue
+                if cached is not None:
+                    self._record(run_id, item, self.pipeline.publish(item["asset_id"], item["asset_type"], context, cached))
+                else:
+                    requests.append((item, key, request))
+        finally:
+            planner.cleanup()
+        return requests
+
+    def _submit(self, run_id: str, entries: List[Tuple[Dict, str, Dict]], number: int):
+        try:
+            name = self.batch_backend.submit(
+                [request for _, _, request in entries], display_name=f"sermonflow-regenerate-{run_id}-{number}"
+            )
+        except Exception as e:
+            return self._fail(run_id, [item for item, _, _ in entries], f"Batch submission failed: {e}")
+        self.checkpoint.mark_submitted(run_id, name, [(item["asset_id"], key) for item, key, _ in entries])
+        print(f"Submitted batch {name} with {len(entries)} requests")
+
+    def _collect(self, run_id: str):
+        while True:
+            running = 0
+            for name in self.checkpoint.batch_names(run_id):
+                items = self.checkpoint.batch_items(run_id, name)
+                try:
+                    results = self.batch_backend.poll(name)
+                except Exception as e:
+                    self._fail(run_id, items, str(e))
+                    continue
+                if results is None:
+                    running += 1
+                    continue
+                print(f"Batch {name} finished; rendering {len(items)} assets")
+                self._run_sermons(run_id, self._publish_results, items, results)
+            if not running:
+                return
+            time.sleep(Config.REGENERATION_BATCH_POLL_SECONDS)
+
+    def _publish_results(self, run_id: str, sermon_id: str, items: List[Dict], results: List[Tuple]):
+        context = self._load_context(run_id, sermon_id, items, SERMON_RENDER_COLUMNS)
+        if context is None:
+            return
+        for item in items:
+            index = item["batch_index"]
+            text, error = results[index] if index < len(results) else (None, "Missing from the batch results")
+            if not text:
+                self.checkpoint.mark(run_id, item["asset_id"], ITEM_FAILED, error or "Empty batch response")
+                continue
+            self.pipeline.content_engine.store_response(item["cache_key"], text)
+            self._record(run_id, item, self.pipeline.publish(item["asset_id"], item["asset_type"], context, text))
@@ -0,0 +1,288 @@
+import importlib.util
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from app.config import Config
+from app.services import metrics
+
+RowKey = Tuple[str, str]
+
+
+def _http2_available() -> bool:
+    # httpx only speaks HTTP/2 with the optional `h2` package (httpx[http2])
+    return importlib.util.find_spec("h2") is not None
+
+
+class Filter(NamedTuple):
+    """A PostgREST operator other than equality, e.g. Filter("gte", "2024-01-01")."""
+    operator: str
+    value: object
+
+
+def _compact(columns: str) -> str:
+    # PostgREST rejects whitespace in `select`; call sites keep their projections readable
+    return "".join(columns.split())
+
+
+class SupabaseRepository:
+    """
+    Table access over PostgREST (Supabase's REST API) on long-lived connection pools:
+    one `httpx.Client` for the pipeline threads and one `httpx.AsyncClient` for the API's
+    event loop, both keep-alive and HTTP/2 when available. Every call names the columns
+    it reads (`columns`) and returns, so nothing pulls `*`.
+    Filters are {column: value} equality matches; a list value matches any of its items,
+    a `Filter` applies another operator and a list of Filters is ANDed (a range).
+    Storage still goes through supabase-py.
+    """
+
+    def __init__(self, url: str = None, key: str = None):
+        url = url or Config.SUPABASE_URL
+        key = key or Config.SUPABASE_KEY
+        if not url or not key:
+            raise ValueError("Supabase repository is not configured. check SUPABASE_URL and SUPABASE_KEY.")
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self.headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+        self.write_behind = WriteBehindBuffer(self)
+
+    def _client_options(self) -> Dict:
+        return {
+            "base_url": self.base_url,
+            "headers": self.headers,
+            "http2": _http2_available(),
+            "timeout": httpx.Timeout(Config.SUPABASE_TIMEOUT_SECONDS),
+            "limits": httpx.Limits(
+                max_connections=Config.SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.SUPABASE_MAX_CONNECTIONS,
+                keepalive_expiry=Config.SUPABASE_KEEPALIVE_SECONDS,
+            ),
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(**self._client_options())
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the running event loop it will be bound to
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(**self._client_options())
+        return self._async_client
+
+    # --- Request plumbing ---
+
+    @classmethod
+    def _filter(cls, value):
+        if isinstance(value, Filter):
+            return f"{value.operator}.{value.value}"
+        if isinstance(value, (list, tuple)):
+            if value and all(isinstance(v, Filter) for v in value):
+                # Sent as a repeated query parameter, which PostgREST ANDs
+                return [cls._filter(v) for v in value]
+            return f"in.({','.join(str(v) for v in value)})"
+        return f"eq.{value}"
+
+    @classmethod
+    def _build(
+        cls,
+        method: str,
+        table: str,
+        filters: Dict = None,
+        columns: str = None,
+        values=None,
+        order: str = None,
+        limit: int = None,
+        offset: int = None,
+    ) -> Dict:
+        params = {column: cls._filter(value) for column, value in (filters or {}).items()}
+        headers = {}
+        if columns:
+            params["select"] = _compact(columns)
+        if order:
+            params["order"] = order
+        if limit is not None:
+            params["limit"] = limit
+        if offset:
+            params["offset"] = offset
+        if method != "GET":
+            # Writes only send rows back when the caller asked for columns
+            headers["Prefer"] = "return=representation" if columns else "return=minimal"
+        return {"method": method, "url": f"/{table}", "params": params, "json": values, "headers": headers}
+
+    @staticmethod
+    def _build_rpc(function: str, params: Dict) -> Dict:
+        return {"method": "POST", "url": f"/rpc/{function}", "params": {}, "json": params, "headers": {}}
+
+    @staticmethod
+    def _parse(request: Dict, response: httpx.Response) -> List[Dict]:
+        table = request["url"].lstrip("/")
+        outcome = "ok" if response.status_code < 400 else "error"
+        metrics.SUPABASE_REQUESTS.inc(table=table, method=request["method"], outcome=outcome)
+        if outcome == "error":
+            raise Exception(f"Supabase {request['method']} {table} failed: {response.status_code} {response.text}")
+        if not response.content:
+            return []
+        return response.json()
+
+    def _execute(self, request: Dict) -> List[Dict]:
+        return self._parse(request, self.client.request(**request))
+
+    async def _execute_async(self, request: Dict) -> List[Dict]:
+        return self._parse(request, await self.async_client.request(**request))
+
+    # --- Blocking API (pipelines, worker) ---
+
+    def select(self, table: str, columns: str, filters: Dict, order: str = None, limit: int = None, offset: int = None) -> List[Dict]:
+        """`order` is PostgREST syntax ("created_at.asc,id"); `limit`/`offset` page through large results."""
+        return self._execute(self._build("GET", table, filters, columns, order=order, limit=limit, offset=offset))
+
+    def insert(self, table: str, rows, returning: str = None) -> List[Dict]:
+        return self._execute(self._build("POST", table, columns=returning, values=rows))
+
+    def update(self, table: str, values: Dict, filters: Dict, returning: str = None) -> List[Dict]:
+        return self._execute(self._build("PATCH", table, filters, returning, values))
+
+    def rpc(self, function: str, params: Dict):
+        """Calls a Postgres function through PostgREST (`POST /rpc/<function>`)."""
+        return self._execute(self._build_rpc(function, params))
+
+    def update_row(self, table: str, row_id: str, values: Dict, defer: bool = False):
+        """
+        Updates one row by id. With `defer`, the values are held in the write-behind
+        buffer and merged into the row's next write instead of costing a round trip now;
+        anything still pending after SUPABASE_WRITE_BEHIND_SECONDS is flushed on its own.
+        A normal update also carries whatever is pending for the row. Only defer values
+        that a later write in the same process supersedes: the buffer is per process, and
+        pending values are lost if it dies.
+        """
+        if defer:
+            self.write_behind.defer(table, row_id, values)
+            return
+        pending = self.write_behind.take(table, row_id)
+        self.update(table, {**pending, **values}, {"id": row_id})
+
+    # --- Async API (request handlers) ---
+
+    async def select_async(self, table: str, columns: str, filters: Dict) -> List[Dict]:
+        return await self._execute_async(self._build("GET", table, filters, columns))
+
+    async def insert_async(self, table: str, rows, returning: str = None) -> List[Dict]:
+        return await self._execute_async(self._build("POST", table, columns=returning, values=rows))
+
+    async def update_async(self, table: str, values: Dict, filters: Dict, returning: str = None) -> List[Dict]:
+        return await self._execute_async(self._build("PATCH", table, filters, returning, values))
+
+    async def rpc_async(self, function: str, params: Dict):
+        return await self._execute_async(self._build_rpc(function, params))
+
+    def close(self):
+        self.write_behind.flush()
+        if self._client is not None:
+            self._client.close()
+
+    async def close_async(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+
+
+class _Pending:
+    __slots__ = ("values", "due_at")
+
+    def __init__(self, values: Dict, due_at: float):
+        self.values = values
+        self.due_at = due_at
+
+
+class WriteBehindBuffer:
+    """
+    Per-row pending patches for intermediate writes (e.g. an asset's generated Markdown).
+    Later deferrals merge over earlier ones, so a burst of transitions costs one write.
+    A background thread flushes patches that have waited SUPABASE_WRITE_BEHIND_SECONDS;
+    an immediate write for the same row waits for any in-progress flush of it, so a
+    stale status can never land after a newer one.
+    """
+
+    def __init__(self, repository: SupabaseRepository, delay_seconds: float = None):
+        self.repository = repository
+        self.delay_seconds = delay_seconds if delay_seconds is not None else Config.SUPABASE_WRITE_BEHIND_SECONDS
+        self._pending: Dict[RowKey, _Pending] = {}
+        self._flushing = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def defer(self, table: str, row_id: str, values: Dict):
+        with self._cond:
+            entry = self._pending.get((table, row_id))
+            if entry is None:
+                self._pending[(table, row_id)] = _Pending(dict(values), time.monotonic() + self.delay_seconds)
+            else:
+                entry.values.update(values)
+            self._ensure_thread()
+
+    def take(self, table: str, row_id: str) -> Dict:
+        """Removes and returns the row's pending values ({} if none)."""
+        key = (table, row_id)
+        with self._cond:
+            while key in self._flushing:
+                self._cond.wait()
+            entry = self._pending.pop(key, None)
+        return entry.values if entry else {}
+
+    def flush(self, due_only: bool = False):
+        """Writes pending patches (all of them, or only those past their delay)."""
+        now = time.monotonic()
+        with self._cond:
+            keys = [k for k, e in self._pending.items() if not due_only or e.due_at <= now]
+            batch = {k: self._pending.pop(k).values for k in keys}
+            self._flushing.update(batch)
+        try:
+            for (table, row_id), values in batch.items():
+                try:
+                    self.repository.update(table, values, {"id": row_id})
+                except Exception as e:
+                    print(f"Warning: Deferred {table} write for {row_id} failed: {e}")
+        finally:
+            with self._cond:
+                self._flushing.difference_update(batch)
+                self._cond.notify_all()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="supabase-write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(min(1.0, self.delay_seconds) or 0.1)
+            self.flush(due_only=True)
+
+
+_repository: Optional[SupabaseRepository] = None
+_lock = threading.Lock()
+
+def get_repository() -> SupabaseRepository:
+    global _repository
+    if _repository is None:
+        with _lock:
+            if _repository is None:
+                _repository = SupabaseRepository()
+    return _repository
+
+def shutdown_repository():
+    """Flushes written-behind updates and closes the blocking pool, if the repository was used."""
+    if _repository is not None:
+        _repository.close()
+
+async def shutdown_repository_async():
+    if _repository is not None:
+        await _repository.close_async()
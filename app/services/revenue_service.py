@@ -1,33 +1,168 @@
-from app.services.supabase_client import get_supabase
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.services.repository import get_repository
 from fastapi import HTTPException
 
+# Stripe subscription.status -> churches.subscription_status
+STRIPE_STATUS_MAP = {
+    "active": "active",
+    "trialing": "active",
+    "past_due": "past_due",
+    "unpaid": "past_due",
+}
+SUBSCRIPTION_EVENTS = (
+    "customer.subscription.created",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+)
+
+
+class EntitlementCache:
+    """
+    In-process TTL cache of church_id -> subscription_status.
+    Church rows the request already fetched are fed in with `prime`, and the Stripe
+    webhook calls `invalidate`, so the gate normally never queries Supabase itself.
+    Other replicas pick up a webhook change when their entry expires (ENTITLEMENT_CACHE_TTL_SECONDS).
+    """
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.ENTITLEMENT_CACHE_TTL_SECONDS
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, church_id: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(church_id)
+            if entry is None:
+                return None
+            status, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[church_id]
+                return None
+            return status
+
+    def prime(self, church_id: str, status: Optional[str]):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()  # crude, but the cache refills from request rows
+            self._entries[church_id] = (status or "inactive", time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, church_id: str):
+        with self._lock:
+            self._entries.pop(church_id, None)
+
+
+_entitlements = EntitlementCache()
+
+def get_entitlement_cache() -> EntitlementCache:
+    return _entitlements
+
+
 class RevenueService:
     def __init__(self):
-        pass
+        self.entitlements = get_entitlement_cache()
 
-    async def ensure_active_subscription(self, church_id: str):
+    async def ensure_active_subscription(self, church_id: str, church_row: Dict = None):
         """
         Checks if the church has an active subscription.
         Raises HTTPException(402) if not active.
+        Pass `church_row` when the caller already fetched the church (e.g. the
+        `churches(*)` join in load_context); it is used as-is and refreshes the cache.
+        Otherwise the cached status is used, and Supabase is only queried on a miss.
         """
-        supabase = get_supabase()
-        
-        # Determine subscription status
-        # We query the church table directly. 
-        # In a real impl, we might cache this or check Stripe API directly (latency hit).
-        # Trusting DB is faster for middleware gating.
-        
-        response = supabase.table("churches").select("subscription_status").eq("id", church_id).execute()
-        
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Church not found")
-            
-        status = response.data[0].get("subscription_status", "inactive")
-        
+        if church_row is not None and "subscription_status" in church_row:
+            status = church_row.get("subscription_status") or "inactive"
+            self.entitlements.prime(church_id, status)
+        else:
+            status = self.entitlements.get(church_id)
+            if status is None:
+                status = await self._fetch_status(church_id)
+                self.entitlements.prime(church_id, status)
+
         if status != "active":
             raise HTTPException(
-                status_code=402, 
+                status_code=402,
                 detail="Payment Required: Active subscription needed for this feature."
             )
-        
+
         return True
+
+    async def _fetch_status(self, church_id: str) -> str:
+        rows = await get_repository().select_async("churches", "subscription_status", {"id": church_id})
+
+        if not rows:
+            raise HTTPException(status_code=404, detail="Church not found")
+
+        return rows[0].get("subscription_status") or "inactive"
+
+    def construct_webhook_event(self, payload: bytes, signature: str):
+        """Verifies the Stripe-Signature header and parses the event. Raises HTTPException(400) if invalid."""
+        if not Config.STRIPE_WEBHOOK_SECRET:
+            raise HTTPException(status_code=503, detail="Stripe webhook secret not configured")
+        import stripe
+
+        try:
+            return stripe.Webhook.construct_event(payload, signature, Config.STRIPE_WEBHOOK_SECRET)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid payload")
+        except stripe.SignatureVerificationError:
+            raise HTTPException(status_code=400, detail="Invalid signature")
+
+    def apply_webhook_event(self, event) -> List[str]:
+        """
+        Writes the subscription change in a Stripe event to `churches` and invalidates the
+        cached entitlement. Blocking (sync repository client); returns the affected church ids.
+        """
+        if hasattr(event, "to_dict"):
+            # stripe.Event: since stripe-python 15 its objects are not dicts (no .get)
+            event = event.to_dict()
+        event_type = event["type"]
+        obj = event["data"]["object"]
+        metadata = obj.get("metadata") or {}
+
+        if event_type == "checkout.session.completed":
+            church_id = obj.get("client_reference_id") or metadata.get("church_id")
+            if not church_id or obj.get("mode") != "subscription":
+                return []
+            values = {"stripe_customer_id": obj.get("customer")}
+            if obj.get("payment_status") in ("paid", "no_payment_required"):
+                values["subscription_status"] = "active"
+            return self._update_churches(values, "id", church_id)
+
+        if event_type in SUBSCRIPTION_EVENTS:
+            status = STRIPE_STATUS_MAP.get(obj.get("status"), "inactive")
+            if event_type == "customer.subscription.deleted":
+                status = "inactive"
+            if metadata.get("church_id"):
+                return self._update_churches({"subscription_status": status}, "id", metadata["church_id"])
+            return self._update_churches({"subscription_status": status}, "stripe_customer_id", obj.get("customer"))
+
+        return []
+
+    def _update_churches(self, values: Dict, column: str, value: str) -> List[str]:
+        if not value:
+            return []
+        rows = get_repository().update("churches", values, {column: value}, returning="id")
+        church_ids = [row["id"] for row in rows]
+        if column == "id" and value not in church_ids:
+            church_ids.append(value)
+        for church_id in church_ids:
+            self.entitlements.invalidate(church_id)
+        print(f"Stripe webhook updated churches {church_ids}: {values}")
+        return church_ids
+
+
+_service: Optional[RevenueService] = None
+_lock = threading.Lock()
+
+def get_revenue_service() -> RevenueService:
+    global _service
+    if _service is None:
+        with _lock:
+            if _service is None:
+                _service = RevenueService()
+    return _service
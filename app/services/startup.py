@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.config import Config
+from app.services import metrics
+
+# Milestones, in seconds since the process started
+PHASE_IMPORT = "import"                # app.main imported
+PHASE_READY = "ready"                  # startup hooks done, accepting requests
+PHASE_FIRST_REQUEST = "first_request"  # first response sent
+# Duration of the warm-up itself (it may overlap serving)
+PHASE_WARMUP = "warmup"
+
+WARMUP_OFF = "off"
+WARMUP_BACKGROUND = "background"
+WARMUP_BLOCKING = "blocking"
+
+_IMPORTED_AT = time.monotonic()
+_milestones: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def process_uptime() -> float:
+    """
+    Seconds since this process started, interpreter start-up included. Read from /proc
+    on Linux; elsewhere it counts from when this module was imported.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields resume after its closing paren
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _IMPORTED_AT
+
+
+def mark(phase: str, seconds: float = None):
+    """Records a milestone once (later calls are ignored) in the startup gauge and the log."""
+    if phase in _milestones:
+        return
+    with _lock:
+        if phase in _milestones:
+            return
+        _milestones[phase] = process_uptime() if seconds is None else seconds
+    metrics.STARTUP_SECONDS.set(_milestones[phase], phase=phase)
+    print(f"Startup: {phase} after {_milestones[phase]:.2f}s")
+
+
+def milestones() -> Dict[str, float]:
+    return dict(_milestones)
+
+
+def _warm_repository():
+    from app.services.repository import get_repository
+    get_repository().client
+
+def _warm_supabase():
+    from app.services.supabase_client import get_supabase
+    get_supabase()
+
+def _warm_gemini():
+    from app.services.gemini_gateway import get_gemini_gateway
+    get_gemini_gateway()
+
+def _warm_services():
+    from app.services.generation_pipeline import get_generation_pipeline
+    from app.services.revenue_service import get_revenue_service
+    get_generation_pipeline()
+    get_revenue_service()
+
+def _warm_pdf():
+    from app.services.pdf_engine import warm_up_renderer
+    # With the render pool on, the workers warm themselves and this process never renders
+    if Config.PDF_RENDER_PROCESSES <= 0:
+        warm_up_renderer()
+
+
+WARMUP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("repository", _warm_repository),
+    ("supabase", _warm_supabase),
+    ("gemini", _warm_gemini),
+    ("services", _warm_services),
+    ("pdf", _warm_pdf),
+]
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Does up front what the first request would otherwise pay for: imports the SDKs,
+    builds the clients and service singletons, and (when PDFs render in this process)
+    loads ReportLab's fonts. A failing step, e.g. a missing key, is logged and skipped.
+    Returns each step's duration in seconds.
+    """
+    started = time.perf_counter()
+    timings = {}
+    for name, step in WARMUP_STEPS:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warning: Warm-up step {name} failed: {e}")
+        timings[name] = round(time.perf_counter() - step_started, 3)
+    mark(PHASE_WARMUP, time.perf_counter() - started)
+    print(f"Warm-up steps: {timings}")
+    return timings
+
+
+def start_warm_up(mode: str = None):
+    """Runs `warm_up` as STARTUP_WARMUP says: not at all, on a background thread, or inline."""
+    mode = mode or Config.STARTUP_WARMUP
+    if mode == WARMUP_BLOCKING:
+        warm_up()
+    elif mode == WARMUP_BACKGROUND:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
@@ -1,31 +1,176 @@
+import base64
+import hashlib
+import io
 import os
+import time
+from typing import BinaryIO, Dict, Optional
+from urllib.parse import quote
+
+from app.config import Config
+from app.services import metrics
 from app.services.supabase_client import get_supabase
 
+# Supabase's TUS endpoint requires every chunk except the last to be exactly 6MB.
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+# Read size when streaming a single-request upload body
+READ_SIZE = 1024 * 1024
+
+
 class StorageService:
-    def __init__(self):
+    def __init__(self, bucket_name: str = "sermon-audio"):
         self.supabase = get_supabase()
-        self.bucket_name = "sermon-audio"
+        self.bucket_name = bucket_name
+        self._http = None
+
+    @property
+    def http(self):
+        # One keep-alive client per service instance, reused across chunks and uploads
+        if self._http is None:
+            import httpx
+            self._http = httpx.Client(timeout=httpx.Timeout(60.0, connect=10.0))
+        return self._http
+
+    def _auth_headers(self) -> Dict[str, str]:
+        return {
+            "apikey": Config.SUPABASE_KEY,
+            "Authorization": f"Bearer {Config.SUPABASE_KEY}",
+        }
+
+    def _headers(self) -> Dict[str, str]:
+        return {**self._auth_headers(), "Tus-Resumable": "1.0.0"}
 
-    def upload_file(self, file_path: str, destination_path: str) -> str:
+    def upload_file(self, file_path: str, destination_path: str, content_type: str = "audio/mpeg") -> str:
         """
         Uploads a file to Supabase Storage and returns the public URL.
+        Streams from disk in fixed-size chunks, so memory use doesn't depend on file size.
         """
+        return self.upload_file_with_hash(file_path, destination_path, content_type)["public_url"]
+
+    def upload_file_with_hash(self, file_path: str, destination_path: str, content_type: str = "audio/mpeg") -> Dict:
+        """Like `upload_file`, but returns {"public_url", "sha256", "size"}."""
         try:
+            size = os.path.getsize(file_path)
             with open(file_path, "rb") as f:
-                file_bytes = f.read()
-            
-            # Check if bucket exists, if not, create it (or rely on setup)
-            # The python client api for bucket management might differ, sticking to upload
-            
-            # Upsert=true to overwrite if exists
-            self.supabase.storage.from_(self.bucket_name).upload(
-                path=destination_path,
-                file=file_bytes,
-                file_options={"content-type": "audio/mpeg", "upsert": "true"}
-            )
-            
-            # Get Public URL
-            public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(destination_path)
-            return public_url
+                return self.upload_fileobj(f, destination_path, content_type, size=size)
         except Exception as e:
             raise Exception(f"Storage upload failed: {str(e)}")
+
+    def upload_fileobj(self, fileobj: BinaryIO, destination_path: str, content_type: str, size: Optional[int] = None) -> Dict:
+        """
+        Uploads a seekable file object. Small objects go in one streamed request; anything
+        larger than one chunk uses the resumable (TUS) endpoint so a dropped connection
+        only costs the current chunk. Either way the file is read in pieces and the
+        SHA-256 is computed on the fly.
+        """
+        if size is None:
+            fileobj.seek(0, io.SEEK_END)
+            size = fileobj.tell()
+        fileobj.seek(0)
+
+        with metrics.span("storage", "upload", bucket=self.bucket_name, size=size):
+            if size <= TUS_CHUNK_SIZE:
+                sha256 = self._upload_single(fileobj, destination_path, content_type, size)
+            else:
+                sha256 = self._upload_resumable(fileobj, destination_path, content_type, size)
+        metrics.record_bytes("storage", "upload", size)
+
+        # Get Public URL
+        public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(destination_path)
+        return {"public_url": public_url, "sha256": sha256, "size": size}
+
+    def _upload_single(self, fileobj: BinaryIO, destination_path: str, content_type: str, size: int) -> str:
+        # supabase-py's upload() only takes whole bytes or a path, so post the body ourselves
+        digest = hashlib.sha256()
+
+        def _body():
+            for buf in iter(lambda: fileobj.read(READ_SIZE), b""):
+                digest.update(buf)
+                yield buf
+
+        r = self.http.post(
+            f"{Config.SUPABASE_URL}/storage/v1/object/{self.bucket_name}/{quote(destination_path)}",
+            content=_body(),
+            headers={
+                **self._auth_headers(),
+                "Content-Type": content_type,
+                "Content-Length": str(size),
+                "x-upsert": "true",  # overwrite if exists
+            },
+        )
+        r.raise_for_status()
+        return digest.hexdigest()
+
+    def _upload_resumable(self, fileobj: BinaryIO, destination_path: str, content_type: str, size: int) -> str:
+        endpoint = f"{Config.SUPABASE_URL}/storage/v1/upload/resumable"
+
+        def _b64(value: str) -> str:
+            return base64.b64encode(value.encode()).decode()
+
+        metadata = ",".join([
+            f"bucketName {_b64(self.bucket_name)}",
+            f"objectName {_b64(destination_path)}",
+            f"contentType {_b64(content_type)}",
+        ])
+        r = self.http.post(endpoint, headers={
+            **self._headers(),
+            "Upload-Length": str(size),
+            "Upload-Metadata": metadata,
+            "x-upsert": "true",
+        })
+        r.raise_for_status()
+        upload_url = r.headers["Location"]
+
+        digest = hashlib.sha256()
+        hashed_upto = 0
+
+        def _hash_through(target: int):
+            # Catch the digest up from the file when the server skipped us ahead
+            nonlocal hashed_upto
+            fileobj.seek(hashed_upto)
+            while hashed_upto < target:
+                buf = fileobj.read(min(1024 * 1024, target - hashed_upto))
+                if not buf:
+                    break
+                digest.update(buf)
+                hashed_upto += len(buf)
+
+        offset = 0
+        failures = 0
+        while offset < size:
+            fileobj.seek(offset)
+            chunk = fileobj.read(TUS_CHUNK_SIZE)
+            try:
+                r = self.http.patch(upload_url, content=chunk, headers={
+                    **self._headers(),
+                    "Upload-Offset": str(offset),
+                    "Content-Type": "application/offset+octet-stream",
+                })
+                r.raise_for_status()
+                new_offset = int(r.headers["Upload-Offset"])
+            except Exception as e:
+                failures += 1
+                if failures > Config.STORAGE_UPLOAD_MAX_RETRIES:
+                    raise
+                print(f"Chunk upload at offset {offset} failed ({e}); retrying")
+                time.sleep(min(30, 2 ** failures))
+                # Ask the server how much it actually has, then resume from there
+                try:
+                    head = self.http.head(upload_url, headers=self._headers())
+                    head.raise_for_status()
+                    offset = int(head.headers["Upload-Offset"])
+                except Exception:
+                    pass
+                continue
+
+            # Hash each byte once, in order, even if a chunk was partially retried
+            if new_offset > hashed_upto:
+                if offset <= hashed_upto:
+                    digest.update(chunk[hashed_upto - offset:new_offset - offset])
+                    hashed_upto = new_offset
+                else:
+                    _hash_through(new_offset)
+            offset = new_offset
+            failures = 0
+
+        _hash_through(size)
+        return digest.hexdigest()
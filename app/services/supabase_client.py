@@ -1,15 +1,25 @@
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING, Optional
+
 from app.config import Config
 
-# Initialize the client only if keys are present to avoid import errors during build if env vars missing
-# However, application logic requires it.
-try:
-    supabase: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
-except Exception as e:
-    print(f"Warning: Supabase client not initialized: {e}")
-    supabase = None
-
-def get_supabase() -> Client:
-    if not supabase:
-        raise ValueError("Supabase client is not initialized. check SUPABASE_URL and SUPABASE_KEY.")
-    return supabase
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Created on first use: supabase-py is slow to import and construct, and only Storage
+# uses it (tables go through the repository), so the API shouldn't pay for it at boot.
+_client: Optional["Client"] = None
+_lock = threading.Lock()
+
+def get_supabase() -> "Client":
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from supabase import create_client
+
+                try:
+                    _client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+                except Exception as e:
+                    raise ValueError(f"Supabase client is not initialized ({e}). check SUPABASE_URL and SUPABASE_KEY.")
+    return _client
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from app.config import Config
+from app.services.repository import get_repository
+from app.services.transcript_segments import format_timestamp, parse_lines
+
+# Segments longer than this are split even without a pause in the timestamps
+MAX_SEGMENT_CHARS = 1500
+
+_SQLITE_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transcript_segments USING fts5(
+    content,
+    church_key,
+    sermon_key,
+    sermon_id UNINDEXED,
+    start_seconds UNINDEXED,
+    end_seconds UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+
+def build_segments(transcript: str, window_seconds: float = None) -> List[Dict]:
+    """
+    Groups a `[HH:MM:SS]` transcript into searchable segments of about `window_seconds`
+    (TRANSCRIPT_INDEX_SEGMENT_SECONDS). Returns [{"start_seconds", "end_seconds", "text"}];
+    each segment ends where the next one starts.
+    """
+    window = window_seconds if window_seconds is not None else Config.TRANSCRIPT_INDEX_SEGMENT_SECONDS
+    segments: List[Dict] = []
+    current = None
+    last_ts = 0.0
+    for ts, text in parse_lines(transcript):
+        ts = last_ts if ts is None else ts
+        last_ts = ts
+        if current is None or ts - current["start_seconds"] >= window or len(current["text"]) >= MAX_SEGMENT_CHARS:
+            if current is not None:
+                current["end_seconds"] = max(current["end_seconds"], int(ts))
+            current = {"start_seconds": int(ts), "end_seconds": int(ts), "text": text}
+            segments.append(current)
+        else:
+            current["text"] = f"{current['text']} {text}"
+            current["end_seconds"] = int(ts)
+    return [s for s in segments if s["text"].strip()]
+
+
+def _hit(row: Dict) -> Dict:
+    return {
+        "sermon_id": row["sermon_id"],
+        "start_seconds": row["start_seconds"],
+        "end_seconds": row["end_seconds"],
+        "timestamp": format_timestamp(row["start_seconds"]),
+        "snippet": row["snippet"],
+        "rank": row["rank"],
+    }
+
+
+class PostgresTranscriptIndex:
+    """
+    Production index: `public.transcript_segments` with a generated tsvector and a
+    (church_id, tsv) GIN index (see supabase_schema.sql). Both operations are one
+    PostgREST RPC; replacing a sermon's segments is atomic.
+    """
+
+    def replace(self, church_id: str, sermon_id: str, segments: List[Dict]):
+        get_repository().rpc("replace_transcript_segments", {
+            "p_sermon_id": sermon_id, "p_church_id": church_id, "p_segments": segments,
+        })
+
+    def search(self, church_id: str, query: str, limit: int = 20) -> List[Dict]:
+        rows = get_repository().rpc("search_transcript_segments", self._search_params(church_id, query, limit))
+        return [_hit(row) for row in rows or []]
+
+    async def search_async(self, church_id: str, query: str, limit: int = 20) -> List[Dict]:
+        rows = await get_repository().rpc_async("search_transcript_segments", self._search_params(church_id, query, limit))
+        return [_hit(row) for row in rows or []]
+
+    @staticmethod
+    def _search_params(church_id: str, query: str, limit: int) -> Dict:
+        return {"p_church_id": church_id, "p_query": query, "p_limit": limit}
+
+
+class SqliteTranscriptIndex:
+    """
+    Local stand-in with the same interface: an FTS5 table in DATA_DIR, BM25-ranked.
+    The church and sermon ids are also indexed as single tokens (`_key`), so both the
+    per-church search and replacing a sermon's segments are index lookups.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.TRANSCRIPT_INDEX_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(_SQLITE_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(value: str) -> str:
+        # One token per id; the tokenizer would split a UUID at every hyphen
+        return "k" + re.sub(r"[^0-9A-Za-z]", "", str(value)).lower()
+
+    @staticmethod
+    def _phrase(value: str) -> str:
+        return '"' + value.replace('"', '""') + '"'
+
+    @classmethod
+    def to_match_query(cls, query: str) -> Optional[str]:
+        """
+        Turns free text into a safe FTS5 query with websearch-like semantics: words are
+        ANDed, "quoted phrases" match in order. Returns None if there is nothing to search.
+        """
+        terms = []
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            tokens = re.findall(r"\w+", phrase or word)
+            if tokens:
+                terms.append(cls._phrase(" ".join(tokens)))
+        return " AND ".join(terms) if terms else None
+
+    def replace(self, church_id: str, sermon_id: str, segments: List[Dict]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM transcript_segments WHERE rowid IN "
+                "(SELECT rowid FROM transcript_segments WHERE transcript_segments MATCH ?)",
+                (f"sermon_key : {self._key(sermon_id)}",),
+            )
+            conn.executemany(
+                "INSERT INTO transcript_segments (content, church_key, sermon_key, sermon_id, start_seconds, end_seconds) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (s["text"], self._key(church_id), self._key(sermon_id), sermon_id, s["start_seconds"], s["end_seconds"])
+                    for s in segments
+                ],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def search(self, church_id: str, query: str, limit: int = 20) -> List[Dict]:
+        match = self.to_match_query(query)
+        if match is None:
+            return []
+        # Only the content column contributes to the BM25 score
+        rows = self._conn().execute(
+            "SELECT sermon_id, start_seconds, end_seconds, "
+            "snippet(transcript_segments, 0, '<mark>', '</mark>', '…', 24) AS snippet, "
+            "-bm25(transcript_segments, 1.0, 0.0, 0.0) AS rank "
+            "FROM transcript_segments WHERE transcript_segments MATCH ? "
+            "ORDER BY rank DESC, sermon_id, start_seconds LIMIT ?",
+            (f"church_key : {self._key(church_id)} AND content : ({match})", min(limit, 100)),
+        ).fetchall()
+        return [_hit(dict(row)) for row in rows]
+
+    async def search_async(self, church_id: str, query: str, limit: int = 20) -> List[Dict]:
+        return await asyncio.to_thread(self.search, church_id, query, limit)
+
+
+_index = None
+_lock = threading.Lock()
+
+def get_transcript_index():
+    """The index selected by TRANSCRIPT_INDEX_BACKEND ("postgres" or "sqlite")."""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                if Config.TRANSCRIPT_INDEX_BACKEND == "sqlite":
+                    _index = SqliteTranscriptIndex()
+                else:
+                    _index = PostgresTranscriptIndex()
+    return _index
@@ -0,0 +1,80 @@
+import re
+from typing import List, Optional, Tuple
+
+# Matches a leading timestamp such as "[01:02:03]", "(12:34)", "12:34 -", "**[0:05]**"
+_TIMESTAMP_RE = re.compile(r"^\s*\**\s*[\[(]?\s*(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?:\.\d+)?\s*[\])]?\s*\**\s*[-–:]?\s*")
+
+
+def parse_timestamp(line: str) -> Tuple[Optional[float], str]:
+    """Splits a transcript line into (seconds, text). seconds is None if the line has no timestamp."""
+    match = _TIMESTAMP_RE.match(line)
+    if not match:
+        return None, line.strip()
+    hours, minutes, seconds = match.groups()
+    total = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+    return float(total), line[match.end():].strip()
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(max(0, seconds))
+    return f"[{seconds // 3600:02d}:{(seconds % 3600) // 60:02d}:{seconds % 60:02d}]"
+
+
+def rescale_timestamps(transcript: str, factor: float) -> str:
+    """Multiplies every line's leading timestamp by `factor` (e.g. to undo a sped-up recording)."""
+    lines = []
+    for raw in transcript.splitlines():
+        ts, text = parse_timestamp(raw)
+        lines.append(raw if ts is None else f"{format_timestamp(ts * factor)} {text}")
+    return "\n".join(lines)
+
+
+def parse_lines(transcript: str) -> List[Tuple[Optional[float], str]]:
+    """
+    Parses a timestamped transcript into (seconds, text) entries. Untimestamped lines
+    are folded into the preceding entry, since models often wrap long utterances.
+    """
+    entries: List[Tuple[Optional[float], str]] = []
+    for raw in transcript.splitlines():
+        if not raw.strip():
+            continue
+        ts, text = parse_timestamp(raw)
+        if ts is None and entries:
+            prev_ts, prev_text = entries[-1]
+            entries[-1] = (prev_ts, f"{prev_text} {text}".strip())
+        else:
+            entries.append((ts, text))
+    return entries
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9 ]", "", text.lower()).strip()
+
+
+def stitch_segments(segments: List[Tuple[float, float, float, str]]) -> str:
+    """
+    Merges per-chunk transcripts back into one.
+
+    `segments` is a list of (chunk_start, keep_from, keep_until, transcript) where the
+    chunk's timestamps are relative to `chunk_start` and only lines falling inside
+    [keep_from, keep_until) on the absolute timeline are kept. Chunks overlap, so this
+    window drops each overlap from one side, and an exact repeat of the previous kept
+    line across a boundary is removed as well.
+    """
+    output: List[str] = []
+    last_text = None
+    for chunk_start, keep_from, keep_until, transcript in sorted(segments, key=lambda s: s[0]):
+        for ts, text in parse_lines(transcript):
+            if ts is None:
+                # No timing at all for this line; keep it, we can't place it better
+                absolute = keep_from
+            else:
+                absolute = chunk_start + ts
+                if absolute < keep_from or absolute >= keep_until:
+                    continue
+            normalized = _normalize(text)
+            if normalized and normalized == last_text:
+                continue
+            last_text = normalized
+            output.append(f"{format_timestamp(absolute)} {text}")
+    return "\n".join(output)
@@ -1,17 +1,51 @@
 import os
-import time
-from google import genai
-from google.genai import types
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.config import Config
+from app.services.gemini_file_cache import get_gemini_file_cache
+from app.services.gemini_gateway import get_gemini_gateway
+from app.services.ingestion_service import get_ingestion_service
+from app.services.transcript_segments import rescale_timestamps, stitch_segments
+
+# Explicit timestamp format so segmented transcripts can be re-timed and stitched
+TRANSCRIPT_PROMPT = (
+    "Generate a full transcript of this audio file with timestamps. "
+    "Start every line with a timestamp in the form [HH:MM:SS] measured from the start of this audio."
+)
 
 class TranscriptionService:
     def __init__(self):
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY environment variable not set")
-        self.client = genai.Client(api_key=self.api_key)
+        # Shared client; raises GeminiError if GEMINI_API_KEY (or legacy GOOGLE_API_KEY) is missing
+        self.gateway = get_gemini_gateway()
         self.model_id = "gemini-2.5-flash" # Use Stable 2.5 Flash
+        self.ingestion = get_ingestion_service()
+
+    def generate_transcript(self, audio_uri: str, tempo: float = 1.0) -> str:
+        """
+        Long recordings go through the segmented path: split at silences, transcribe
+        the pieces concurrently, stitch. Short ones are sent whole.
+        `tempo` is the speed-up applied to the audio at ingest; timestamps are scaled
+        back by it so they match the original recording.
+        """
+        transcript = None
+        if Config.TRANSCRIPTION_SEGMENTED:
+            try:
+                duration = self.ingestion.probe_duration(audio_uri)
+            except Exception as e:
+                print(f"Warning: could not probe {audio_uri} ({e}); transcribing whole file.")
+                duration = 0
+            if duration > Config.TRANSCRIPTION_SEGMENT_MIN_DURATION:
+                transcript = self.generate_transcript_segmented(audio_uri, duration)
+        if transcript is None:
+            transcript = self._transcribe_whole(audio_uri)
+        if tempo != 1.0:
+            transcript = rescale_timestamps(transcript, tempo)
+        return transcript
 
-    def generate_transcript(self, audio_uri: str) -> str:
+    def _transcribe_whole(self, audio_uri: str) -> str:
         """
         Generates a timestamped transcript from an audio file URI (Supabase URL or local path).
         Ideally, we should upload the file to Gemini's File API first if it's large.
@@ -26,45 +60,92 @@ class TranscriptionService:
         """
         
         try:
-            # 1. Upload file to Gemini
-            print(f"Uploading file {audio_uri} to Gemini...")
-            # The SDK might have a different method signature, assuming 'files.upload' pattern
-            # For google-genai SDK 0.x/1.x patterns vary. 
-            # Using the patterns for the newer SDK based on recent docs knoweldge:
-            
-            with open(audio_uri, "rb") as f:
-                upload_result = self.client.files.upload(file=f, config={'display_name': os.path.basename(audio_uri)})
-            
-            file_name = upload_result.name
-            
-            # Wait for processing state if needed (usually for video, audio is fast but checks are good)
-            while True:
-                file_meta = self.client.files.get(name=file_name)
-                if file_meta.state.name == "ACTIVE":
-                    break
-                elif file_meta.state.name == "FAILED":
-                    raise Exception("Gemini File processing failed.")
-                time.sleep(2)
+            # 1. Upload file to Gemini (waits for the file to become ACTIVE).
+            # Content-addressed: if this audio was uploaded before (e.g. a retried job),
+            # the still-ACTIVE file is reused, and generation later reuses this upload.
+            file_meta = get_gemini_file_cache().get_or_upload(audio_uri)
 
             # 2. Generate Transcript
-            prompt = "Generate a full transcript of this audio file with timestamps."
-            
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=[
-                    types.Content(
-                        parts=[
-                            types.Part.from_uri(
-                                file_uri=file_meta.uri,
-                                mime_type=file_meta.mime_type or "audio/mpeg"
-                            ),
-                            types.Part.from_text(text=prompt)
-                        ]
-                    )
-                ]
-            )
-            
-            return response.text
+            return self._transcribe_file(file_meta)
             
         except Exception as e:
             raise Exception(f"Transcription failed: {str(e)}")
+
+    def _transcribe_file(self, file_meta) -> str:
+        from google.genai import types
+
+        response = self.gateway.generate_content(
+            model=self.model_id,
+            contents=[
+                types.Content(
+                    parts=[
+                        types.Part.from_uri(
+                            file_uri=file_meta.uri,
+                            mime_type=file_meta.mime_type or "audio/mpeg"
+                        ),
+                        types.Part.from_text(text=TRANSCRIPT_PROMPT)
+                    ]
+                )
+            ]
+        )
+        return response.text
+
+    def generate_transcript_segmented(self, audio_uri: str, duration: float) -> str:
+        """
+        Splits the audio at silence boundaries into overlapping chunks, transcribes them
+        with a bounded pool, then shifts each chunk's timestamps by its offset and drops
+        the duplicated overlap. Wall-clock is roughly one chunk's latency.
+        """
+        overlap = Config.TRANSCRIPTION_SEGMENT_OVERLAP_SECONDS
+        work_dir = tempfile.mkdtemp(prefix="segments_", dir=self.ingestion.upload_dir)
+        try:
+            silences = self.ingestion.detect_silences(audio_uri)
+            boundaries = self.ingestion.plan_segments(duration, silences, Config.TRANSCRIPTION_SEGMENT_SECONDS)
+            print(f"Transcribing {audio_uri} in {len(boundaries) - 1} segments")
+
+            _, ext = os.path.splitext(audio_uri)
+            jobs = []
+            for i in range(len(boundaries) - 1):
+                keep_from, keep_until = boundaries[i], boundaries[i + 1]
+                chunk_start = max(0.0, keep_from - overlap)
+                chunk_end = min(duration, keep_until + overlap)
+                if i == len(boundaries) - 2:
+                    keep_until = float("inf")  # don't drop a trailing line stamped at the very end
+                jobs.append((i, chunk_start, chunk_end, keep_from, keep_until))
+
+            def _run(job):
+                i, chunk_start, chunk_end, keep_from, keep_until = job
+                chunk_path = os.path.join(work_dir, f"segment_{i:03d}{ext or '.mp3'}")
+                self.ingestion.cut_segment(audio_uri, chunk_start, chunk_end - chunk_start, chunk_path)
+                # Chunks are single-use, so bypass the file cache and delete them right away
+                file_ref = self.gateway.upload_file(chunk_path)
+                try:
+                    file_ref = self.gateway.wait_until_active(file_ref)
+                    text = self._transcribe_file(file_ref)
+                finally:
+                    try:
+                        self.gateway.delete_file(file_ref.name)
+                    except Exception:
+                        pass
+                return (chunk_start, keep_from, keep_until, text)
+
+            with ThreadPoolExecutor(max_workers=Config.TRANSCRIPTION_MAX_CONCURRENCY, thread_name_prefix="transcribe") as pool:
+                segments = list(pool.map(_run, jobs))
+
+            return stitch_segments(segments)
+        except Exception as e:
+            raise Exception(f"Transcription failed: {str(e)}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+_service: Optional[TranscriptionService] = None
+_lock = threading.Lock()
+
+def get_transcription_service() -> TranscriptionService:
+    global _service
+    if _service is None:
+        with _lock:
+            if _service is None:
+                _service = TranscriptionService()
+    return _service
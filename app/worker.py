@@ -0,0 +1,154 @@
+"""
+Ingestion worker. Runs separately from the API so downloads, transcodes and
+transcription never compete with request handling:
+
+    python -m app.worker
+
+Each stage gets its own pool of threads (WORKER_CONCURRENCY_* in Config), so a
+burst of uploads can't starve transcription and vice versa. Any number of
+worker processes can share one queue file.
+"""
+import signal
+import socket
+import threading
+import traceback
+import uuid
+
+from app.config import Config
+from app.services.job_queue import JobQueue, get_job_queue
+from app.services.gemini_file_cache import get_gemini_file_cache
+from app.services import metrics
+from app.services.repository import shutdown_repository
+from app.services.ingestion_pipeline import (
+    IngestionPipeline,
+    STAGE_MEDIA,
+    STAGE_UPLOAD,
+    STAGE_TRANSCRIBE,
+    STAGE_DONE,
+)
+
+
+class IngestionWorker:
+    def __init__(self, queue: JobQueue = None, pipeline: IngestionPipeline = None):
+        self.queue = queue or get_job_queue()
+        self.pipeline = pipeline or IngestionPipeline()
+        self.worker_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self.stage_concurrency = {
+            STAGE_MEDIA: Config.WORKER_CONCURRENCY_MEDIA,
+            STAGE_UPLOAD: Config.WORKER_CONCURRENCY_UPLOAD,
+            STAGE_TRANSCRIBE: Config.WORKER_CONCURRENCY_TRANSCRIBE,
+        }
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for stage, count in self.stage_concurrency.items():
+            for i in range(count):
+                t = threading.Thread(target=self._loop, args=(stage,), name=f"{stage}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        t = threading.Thread(target=self._gc_loop, name="gemini-file-gc", daemon=True)
+        t.start()
+        print(f"Worker {self.worker_id} started: {self.stage_concurrency}")
+
+    def request_stop(self):
+        self._stop.set()
+
+    def wait(self):
+        """Blocks until stop is requested, then waits for in-flight stages to finish."""
+        while not self._stop.wait(1):
+            pass
+        for t in self._threads:
+            t.join()
+
+    def _loop(self, stage: str):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim([stage], self.worker_id)
+            except Exception as e:
+                print(f"Queue claim failed: {e}")
+                job = None
+
+            if job is None:
+                self._stop.wait(Config.JOB_POLL_SECONDS)
+                continue
+
+            self._run(job)
+
+    def _run(self, job: dict):
+        job_id = job["id"]
+        payload = job["payload"]
+        sermon_id = payload["sermon_id"]
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True)
+        heartbeat.start()
+        try:
+            print(f"Job {job_id}: sermon {sermon_id} stage={job['stage']} attempt={job['attempts']}")
+            next_stage, payload = self.pipeline.run_stage(job["stage"], sermon_id, payload)
+            if next_stage == STAGE_DONE:
+                self.queue.complete(job_id, self.worker_id, payload)
+                self._release_followers(job_id, sermon_id)
+            else:
+                self.queue.advance(job_id, self.worker_id, next_stage, payload)
+        except Exception as e:
+            traceback.print_exc()
+            will_retry = self.queue.fail(job_id, self.worker_id, str(e))
+            if not will_retry:
+                self.pipeline.mark_failed(sermon_id, payload, str(e), self.queue.followers(job_id))
+        finally:
+            done.set()
+            heartbeat.join()
+
+    def _release_followers(self, job_id: str, sermon_id: str):
+        """
+        Copies the finished sermon onto duplicates that attached while it ran. Read after
+        complete(): a duplicate submitted from then on is linked by /ingest itself.
+        """
+        followers = self.queue.followers(job_id)
+        if not followers:
+            return
+        try:
+            if not self.pipeline.link_duplicates(sermon_id, followers):
+                self.pipeline.fail_duplicates(followers, f"Source sermon {sermon_id} is no longer available")
+        except Exception as e:
+            print(f"Warning: Failed to update duplicates {followers} of sermon {sermon_id}: {e}")
+
+    def _heartbeat(self, job_id: str, done: threading.Event):
+        interval = max(1, Config.JOB_LEASE_SECONDS / 3)
+        while not done.wait(interval):
+            if not self.queue.heartbeat(job_id, self.worker_id):
+                print(f"Job {job_id}: lease lost")
+                return
+
+    def _gc_loop(self):
+        """Periodically deletes expired or orphaned Gemini File API uploads."""
+        while not self._stop.wait(Config.GEMINI_FILE_GC_INTERVAL_SECONDS):
+            try:
+                deleted = get_gemini_file_cache().gc()
+                print(f"Gemini file GC: deleted {deleted} remote files")
+            except Exception as e:
+                print(f"Gemini file GC failed: {e}")
+
+
+def main():
+    metrics.configure_tracing("sermonflow-worker")
+    if Config.WORKER_METRICS_PORT > 0:
+        metrics.start_metrics_server(Config.WORKER_METRICS_PORT)
+    worker = IngestionWorker()
+
+    def _shutdown(signum, frame):
+        print("Shutting down worker, finishing in-flight jobs...")
+        worker.request_stop()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    worker.start()
+    worker.wait()
+    # Write out any status updates still held in the write-behind buffer
+    shutdown_repository()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark cases. Each case is `name[size]`; its setup runs once (outside the timed
+region) and returns the zero-argument callable that is timed.
+"""
+import os
+import tempfile
+from typing import Callable, Dict, Optional
+
+from benchmarks import fixtures
+
+SIZES = ("small", "medium", "large")
+
+# Where ffmpeg-generated media is kept between runs
+MEDIA_DIR = os.path.join(tempfile.gettempdir(), "sermonflow-bench-media")
+
+
+def prompt_build(size: str) -> Callable:
+    from app.services.prompt_builder import PromptBuilder
+
+    builder = PromptBuilder()
+    profile = fixtures.profile()
+    transcript = fixtures.transcript(size)
+
+    def run():
+        builder.build_system_prompt(profile)
+        builder.build_user_prompt("small_group", transcript)
+    return run
+
+
+def markdown_compile(size: str) -> Callable:
+    from app.services.pdf_engine import PDFEngine
+
+    engine = PDFEngine()
+    markdown = fixtures.markdown_asset(size)
+    branding = fixtures.branding()
+    return lambda: engine._markdown_to_flowables(markdown, branding)
+
+
+def pdf_render(size: str) -> Callable:
+    from app.services.pdf_engine import PDFEngine
+
+    engine = PDFEngine()
+    markdown = fixtures.markdown_asset(size)
+    branding = fixtures.branding()
+
+    def run():
+        with engine.generate_pdf_file(markdown, branding) as pdf_file:
+            pdf_file.seek(0, os.SEEK_END)
+    return run
+
+
+def transcript_stitch(size: str) -> Callable:
+    from app.services.transcript_segments import stitch_segments
+
+    segments = fixtures.transcript_chunks(size)
+    return lambda: stitch_segments(segments)
+
+
+def extract_audio(size: str) -> Optional[Callable]:
+    from app.services.ingestion_service import IngestionService
+
+    source = fixtures.media_file(size, MEDIA_DIR, video=True)
+    if source is None:
+        return None
+    work_dir = tempfile.mkdtemp(prefix="sermonflow-bench-")
+    service = IngestionService(upload_dir=work_dir)
+
+    def run():
+        os.remove(service.extract_audio_from_video(source))
+    return run
+
+
+def transcode(size: str) -> Optional[Callable]:
+    """The media stage's single ffmpeg pass: archival MP3 plus the Opus speech copy."""
+    from app.services.ingestion_service import IngestionService
+
+    source = fixtures.media_file(size, MEDIA_DIR, video=True)
+    if source is None:
+        return None
+    service = IngestionService(upload_dir=tempfile.mkdtemp(prefix="sermonflow-bench-"))
+
+    def run():
+        for path in service.transcode(source).values():
+            os.remove(path)
+    return run
+
+
+def generate_asset(size: str) -> Callable:
+    """The whole asset pipeline after the audio download, against fake Gemini and Supabase."""
+    from benchmarks import fakes
+
+    fakes.install(fixtures.markdown_asset(size))
+    from app.services.generation_pipeline import GenerationPipeline
+
+    pipeline = GenerationPipeline()
+    context = {
+        "sermon_id": "benchmark-sermon",
+        "profile": fixtures.profile(),
+        "branding": fixtures.branding(),
+        "transcript": fixtures.transcript(size),
+        "audio_url": None,
+        "use_cache": False,
+    }
+
+    def run():
+        asset_ids = pipeline.create_assets(context["sermon_id"], ["small_group"])
+        result = pipeline.run_batch(asset_ids, context)["small_group"]
+        if result["status"] != "success":
+            raise RuntimeError(result.get("error"))
+    return run
+
+
+CASES: Dict[str, Callable] = {
+    "prompt_build": prompt_build,
+    "markdown_compile": markdown_compile,
+    "pdf_render": pdf_render,
+    "transcript_stitch": transcript_stitch,
+    "extract_audio": extract_audio,
+    "transcode": transcode,
+    "generate_asset": generate_asset,
+}
+
+# Iterations per case; slow cases run fewer times
+ITERATIONS = {"extract_audio": 3, "transcode": 3, "pdf_render": 10, "generate_asset": 10}
+DEFAULT_ITERATIONS = 30
+
+
+def all_case_names():
+    return [f"{name}[{size}]" for name in CASES for size in SIZES]
+
+
+def setup(case_name: str) -> Optional[Callable]:
+    """Returns the timed callable for `name[size]`, or None if the case can't run here."""
+    name, size = case_name.rstrip("]").split("[")
+    return CASES[name](size)
@@ -0,0 +1,159 @@
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Dict, List
+
+import httpx
+
+from app.services.repository import SupabaseRepository
+
+
+class FakeGeminiGateway:
+    """
+    Stands in for GeminiGateway: same methods, no network. `generate_content` returns
+    `response_text` after `latency` seconds, so generation benchmarks measure our own
+    overhead (prompt building, caches, PDF, upload) rather than the model's.
+    """
+
+    def __init__(self, response_text: str, latency: float = 0.0):
+        self.api_key = "benchmark"
+        self.key_id = "benchmark"
+        self.response_text = response_text
+        self.latency = latency
+        self.calls = 0
+        self._batches: Dict[str, SimpleNamespace] = {}
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def generate_content(self, model: str, contents, config=None):
+        self._count()
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(text=self.response_text)
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        self._count()
+        if self.latency:
+            time.sleep(self.latency)
+        step = max(1, len(self.response_text) // 20)
+        return iter([
+            SimpleNamespace(text=self.response_text[i:i + step])
+            for i in range(0, len(self.response_text), step)
+        ])
+
+    def count_tokens(self, model: str, contents):
+        return SimpleNamespace(total_tokens=sum(len(str(c)) for c in contents) // 4)
+
+    def create_batch(self, model: str, src, config=None):
+        """Completes at once: every inlined request gets `response_text`."""
+        self._count()
+        responses = [SimpleNamespace(response=SimpleNamespace(text=self.response_text), error=None) for _ in src]
+        job = SimpleNamespace(
+            name=f"batches/{uuid.uuid4().hex}",
+            state=SimpleNamespace(name="JOB_STATE_SUCCEEDED"),
+            dest=SimpleNamespace(inlined_responses=responses),
+        )
+        with self._lock:
+            self._batches[job.name] = job
+        return job
+
+    def get_batch(self, name: str):
+        with self._lock:
+            return self._batches[name]
+
+    def create_cache(self, model: str, config):
+        self._count()
+        return SimpleNamespace(name=f"cachedContents/{uuid.uuid4().hex}", expire_time=None)
+
+    def update_cache(self, name: str, config):
+        return SimpleNamespace(name=name, expire_time=None)
+
+    def upload_file(self, path: str, config: Dict = None):
+        self._count()
+        return SimpleNamespace(name=f"files/{uuid.uuid4().hex}", uri="fake://file", state=None, expiration_time=None)
+
+    def get_file(self, name: str):
+        return SimpleNamespace(name=name, uri="fake://file", state=None, expiration_time=None)
+
+    def delete_file(self, name: str):
+        return None
+
+    def list_files(self):
+        return []
+
+    def wait_until_active(self, file_ref, timeout: float = 300):
+        return file_ref
+
+
+class FakeRepository(SupabaseRepository):
+    """
+    SupabaseRepository without the network: inserts echo their rows back with generated
+    ids, every other call returns no rows. Requests are counted per method, so a
+    benchmark can check round trips as well as time.
+    """
+
+    def __init__(self):
+        super().__init__("http://supabase.invalid", "benchmark")
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _execute(self, request: Dict) -> List[Dict]:
+        with self._lock:
+            self.requests[request["method"]] = self.requests.get(request["method"], 0) + 1
+        if request["method"] != "POST":
+            return []
+        rows = request["json"] if isinstance(request["json"], list) else [request["json"]]
+        return [{"id": str(uuid.uuid4()), **row} for row in rows]
+
+    async def _execute_async(self, request: Dict) -> List[Dict]:
+        return self._execute(request)
+
+
+class _FakeBucket:
+    def __init__(self, name: str):
+        self.name = name
+
+    def get_public_url(self, path: str) -> str:
+        return f"https://storage.invalid/{self.name}/{path}"
+
+
+class _FakeStorage:
+    def from_(self, bucket: str) -> _FakeBucket:
+        return _FakeBucket(bucket)
+
+
+class FakeSupabase:
+    """
+    Minimal stand-in for the supabase-py client, which now only serves Storage, plus the
+    httpx transport StorageService uploads over: uploads are counted and dropped.
+    Objects above the single-request limit would go to the TUS endpoint, which this
+    does not fake, so benchmark PDFs stay well under 6MB.
+    """
+
+    def __init__(self):
+        self.storage = _FakeStorage()
+        self.bytes_uploaded = 0
+        self.http = httpx.Client(transport=httpx.MockTransport(self._handle))
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST" or "/storage/v1/object/" not in request.url.path:
+            return httpx.Response(501)
+        self.bytes_uploaded += len(request.read())
+        return httpx.Response(200, json={"Key": request.url.path})
+
+
+def install(gemini_response: str, gemini_latency: float = 0.0):
+    """Points the app's Gemini gateway, repository and Supabase client singletons at the fakes."""
+    from app.services import gemini_gateway, repository, storage_service, supabase_client
+
+    gateway = FakeGeminiGateway(gemini_response, latency=gemini_latency)
+    supabase = FakeSupabase()
+    gemini_gateway._gateway = gateway
+    repository._repository = FakeRepository()
+    supabase_client._client = supabase
+    storage_service.StorageService.http = property(lambda self: supabase.http)
+    return gateway, supabase
@@ -0,0 +1,121 @@
+import os
+import random
+import shutil
+import subprocess
+from typing import List, Optional
+
+from app.models.schemas import BrandingAssets, DeepResearchProfile
+
+# Sermon lengths in minutes; ~140 spoken words per minute
+TRANSCRIPT_MINUTES = {"small": 10, "medium": 40, "large": 90}
+# Sections per generated asset (a section is a heading, prose, a list and a quote)
+MARKDOWN_SECTIONS = {"small": 4, "medium": 16, "large": 64}
+MEDIA_SECONDS = {"small": 30, "medium": 300, "large": 1200}
+
+_WORDS = (
+    "grace faith hope love mercy kingdom gospel spirit prayer worship church family "
+    "community scripture promise covenant redemption forgiveness justice peace joy "
+    "we you they today really know just going because when what where together "
+    "Jesus God Lord Father Paul Peter Romans John Psalm chapter verse the a and of to in "
+    "is that it for with on as this his he our us be are was not but all"
+).split()
+
+
+def _sentence(rng: random.Random, min_words: int = 6, max_words: int = 22) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+
+
+def transcript(size: str, seed: int = 7) -> str:
+    """A `[HH:MM:SS]`-timestamped transcript roughly as long as a sermon of the given size."""
+    rng = random.Random(seed)
+    total_seconds = TRANSCRIPT_MINUTES[size] * 60
+    lines, t = [], 0
+    while t < total_seconds:
+        lines.append(f"[{t // 3600:02d}:{(t % 3600) // 60:02d}:{t % 60:02d}] {_sentence(rng)}")
+        t += rng.randint(4, 9)
+    return "\n".join(lines)
+
+
+def transcript_chunks(size: str, chunk_seconds: int = 600, overlap: int = 5, seed: int = 7) -> List[tuple]:
+    """Splits `transcript(size)` into overlapping chunk-relative transcripts, as segmented transcription produces."""
+    from app.services.transcript_segments import format_timestamp, parse_lines
+
+    entries = parse_lines(transcript(size, seed))
+    total = TRANSCRIPT_MINUTES[size] * 60
+    segments = []
+    for start in range(0, total, chunk_seconds):
+        end = min(total, start + chunk_seconds)
+        chunk_start = max(0, start - overlap)
+        lines = [
+            f"{format_timestamp(ts - chunk_start)} {text}"
+            for ts, text in entries
+            if chunk_start <= ts < min(total, end + overlap)
+        ]
+        segments.append((chunk_start, start, end, "\n".join(lines)))
+    return segments
+
+
+def markdown_asset(size: str, seed: int = 11) -> str:
+    """A generated asset in the shape Gemini returns: headings, wrapped prose, lists, quotes, emphasis."""
+    rng = random.Random(seed)
+    parts = [f"# Small Group Guide: {_sentence(rng, 3, 6)[:-1]}", ""]
+    for section in range(1, MARKDOWN_SECTIONS[size] + 1):
+        parts += [f"## {section}. {_sentence(rng, 2, 5)[:-1]}", ""]
+        for _ in range(2):
+            # Soft-wrapped paragraph with some inline markup and characters that need escaping
+            words = f"{_sentence(rng)} **{_sentence(rng, 2, 4)}** {_sentence(rng)} *{_sentence(rng, 2, 4)}* R&D <note>".split()
+            parts += [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)] + [""]
+        parts += [f"{n}. {_sentence(rng)}" for n in range(1, 5)]
+        parts += [f"   - {_sentence(rng, 3, 8)}" for _ in range(2)] + [""]
+        parts += [f"> {_sentence(rng)}", f"> {_sentence(rng)}", ""]
+    return "\n".join(parts)
+
+
+def profile() -> DeepResearchProfile:
+    return DeepResearchProfile(
+        church_name="Benchmark Community Church",
+        theology="Evangelical, grace-centred, with an emphasis on discipleship in community.",
+        voice_tone=["Warm", "Direct", "Hopeful"],
+        slogan="Love God, love people.",
+        insider_lexicon={f"Term {i}": _sentence(random.Random(i), 4, 10) for i in range(12)},
+    )
+
+
+def branding() -> BrandingAssets:
+    return BrandingAssets(
+        primary_color="#1f3a5f",
+        secondary_color="#c0392b",
+        logo_url="https://example.com/logo.png",
+        font_header="Helvetica",
+        font_body="Helvetica",
+    )
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def media_file(size: str, directory: str, video: bool = True) -> Optional[str]:
+    """
+    Generates a test recording with ffmpeg (a test pattern plus a tone interrupted by
+    silences, so silence detection has something to find). Cached per size in
+    `directory`. Returns None if ffmpeg isn't installed.
+    """
+    if not ffmpeg_available():
+        return None
+    os.makedirs(directory, exist_ok=True)
+    seconds = MEDIA_SECONDS[size]
+    path = os.path.join(directory, f"{size}.{'mp4' if video else 'mp3'}")
+    if os.path.exists(path):
+        return path
+
+    # 8s of tone, 2s of silence, repeated
+    audio = "sine=frequency=220:sample_rate=44100,volume='if(lt(mod(t,10),8),1,0)':eval=frame"
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-t", str(seconds), "-i", audio]
+    if video:
+        cmd += ["-f", "lavfi", "-t", str(seconds), "-i", "testsrc=size=320x240:rate=15",
+                "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p"]
+    cmd += ["-c:a", "aac" if video else "libmp3lame", "-shortest", path]
+    subprocess.run(cmd, check=True)
+    return path
@@ -0,0 +1,95 @@
+"""
+Import-time report for the API's cold start: imports a module (default `app.main`)
+in a fresh interpreter under `python -X importtime` and summarizes where the time went.
+
+    python -m benchmarks.import_report                  # top packages and app modules
+    python -m benchmarks.import_report --max-ms 500     # also fail if the import takes longer
+    python -m benchmarks.import_report --json           # machine-readable, for tracking over time
+
+The import runs with the benchmark environment (fake credentials, temp data dir), so
+nothing is contacted. Timings vary run to run; the median of `--runs` is reported.
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+from benchmarks.run import _child_env
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module: str) -> Dict[str, Dict[str, int]]:
+    """{module: {"self_us", "cumulative_us"}} for one import of `module` in a new interpreter."""
+    with tempfile.TemporaryDirectory(prefix="sermonflow-import-") as data_dir:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            env=_child_env(data_dir),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            modules[m.group(4)] = {"self_us": int(m.group(1)), "cumulative_us": int(m.group(2))}
+    if module not in modules:
+        raise RuntimeError(f"{module} missing from the -X importtime output")
+    return modules
+
+
+def summarize(runs: List[Dict[str, Dict[str, int]]], module: str, top: int) -> Dict:
+    def median(name: str, field: str) -> float:
+        return statistics.median(run.get(name, {}).get(field, 0) for run in runs) / 1000
+
+    names = set().union(*runs)
+    packages: Dict[str, float] = {}
+    for name in names:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0.0) + median(name, "self_us")
+    app_modules = {name: median(name, "cumulative_us") for name in names if name.startswith("app.")}
+    return {
+        "module": module,
+        "total_ms": round(median(module, "cumulative_us"), 1),
+        "packages_ms": {k: round(v, 1) for k, v in sorted(packages.items(), key=lambda kv: -kv[1])[:top]},
+        "app_modules_ms": {k: round(v, 1) for k, v in sorted(app_modules.items(), key=lambda kv: -kv[1])[:top]},
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None, help="exit non-zero if the import takes longer")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = summarize([measure(args.module) for _ in range(max(1, args.runs))], args.module, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {report['module']}: {report['total_ms']:.1f} ms (median of {args.runs})")
+        print("\nBy package (self time summed over its modules):")
+        for name, ms in report["packages_ms"].items():
+            print(f"  {name:<40} {ms:>9.1f} ms")
+        print("\nApp modules (cumulative):")
+        for name, ms in report["app_modules_ms"].items():
+            print(f"  {name:<40} {ms:>9.1f} ms")
+
+    if args.max_ms is not None and report["total_ms"] > args.max_ms:
+        print(f"FAIL: import took {report['total_ms']:.1f} ms (limit {args.max_ms:.0f} ms)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Offline benchmarks for the SermonFlow hot paths.
+
+    python -m benchmarks.run                        # run everything, compare to the baseline if present
+    python -m benchmarks.run --case pdf_render      # only cases starting with "pdf_render"
+    python -m benchmarks.run --save-baseline        # record this run as the baseline
+    python -m benchmarks.run --threshold 0.25       # fail on >25% p50 slowdown
+
+Every case runs in its own subprocess so its peak RSS is its own. Gemini and Supabase
+are replaced by in-process fakes; no network or credentials are needed. Cases that
+need ffmpeg are skipped when it isn't installed.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+WARMUP_ITERATIONS = 2
+# Slowdowns smaller than this are timer noise, whatever the percentage
+NOISE_FLOOR_MS = 0.05
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux; children covers ffmpeg subprocesses
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+def run_case(case_name: str, iterations: int) -> Dict:
+    """Runs one case in this process. Called in the per-case subprocess."""
+    from benchmarks import cases
+
+    fn = cases.setup(case_name)
+    if fn is None:
+        return {"case": case_name, "skipped": True}
+
+    for _ in range(WARMUP_ITERATIONS):
+        fn()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "case": case_name,
+        "iterations": iterations,
+        "throughput_per_s": round(iterations / elapsed, 3),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(elapsed / iterations * 1000, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _child_env(data_dir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "SERMONFLOW_DATA_DIR": data_dir,
+        "SERMONFLOW_UPLOAD_DIR": os.path.join(data_dir, "uploads"),
+        "GEMINI_API_KEY": "benchmark",
+        "SUPABASE_URL": "http://supabase.invalid",
+        "SUPABASE_KEY": "benchmark",
+        # Measure our own work: no response cache hits, render in-process
+        "LLM_CACHE_ENABLED": "false",
+        "PDF_RENDER_PROCESSES": "0",
+    })
+    return env
+
+
+def run_in_subprocess(case_name: str, iterations: int) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="sermonflow-bench-") as data_dir:
+        result_path = os.path.join(data_dir, "result.json")
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--child", case_name,
+             "--iterations", str(iterations), "--result-file", result_path],
+            env=_child_env(data_dir),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        if proc.returncode != 0 or not os.path.exists(result_path):
+            return {"case": case_name, "error": proc.stdout[-2000:]}
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def compare(results: List[Dict], baseline: Dict, threshold: float, rss_threshold: float) -> List[str]:
+    """Returns a description of every case that regressed against `baseline`."""
+    previous = {r["case"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        base = previous.get(result["case"])
+        if not base or "p50_ms" not in base or "p50_ms" not in result:
+            continue
+        slower = result["p50_ms"] - base["p50_ms"]
+        if result["p50_ms"] > base["p50_ms"] * (1 + threshold) and slower > NOISE_FLOOR_MS:
+            regressions.append(
+                f"{result['case']}: p50 {result['p50_ms']:.3f}ms vs baseline {base['p50_ms']:.3f}ms"
+            )
+        if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + rss_threshold):
+            regressions.append(
+                f"{result['case']}: peak RSS {result['peak_rss_mb']}MB vs baseline {base['peak_rss_mb']}MB"
+            )
+    return regressions
+
+
+def _print_table(results: List[Dict], baseline: Optional[Dict]):
+    previous = {r["case"]: r for r in (baseline or {}).get("results", [])}
+    print(f"{'case':<28} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'RSS MB':>8} {'vs base':>8}")
+    for r in results:
+        if r.get("skipped"):
+            print(f"{r['case']:<28} {'skipped':>10}")
+            continue
+        if r.get("error"):
+            print(f"{r['case']:<28} {'ERROR':>10}")
+            continue
+        base = previous.get(r["case"])
+        delta = f"{(r['p50_ms'] / base['p50_ms'] - 1) * 100:+.0f}%" if base and base.get("p50_ms") else ""
+        print(f"{r['case']:<28} {r['throughput_per_s']:>10.1f} {r['p50_ms']:>10.3f} "
+              f"{r['p99_ms']:>10.3f} {r['peak_rss_mb']:>8.1f} {delta:>8}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SermonFlow offline benchmarks")
+    parser.add_argument("--case", action="append", default=[], help="Run cases whose name starts with this (repeatable)")
+    parser.add_argument("--iterations", type=int, default=None, help="Override the per-case iteration count")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline")
+    parser.add_argument("--output", help="Also write this run's results to a JSON file")
+    parser.add_argument("--threshold", type=float, default=0.20, help="Allowed p50 slowdown (0.20 = 20%%)")
+    parser.add_argument("--rss-threshold", type=float, default=0.25, help="Allowed peak RSS growth")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        result = run_case(args.child, args.iterations)
+        with open(args.result_file, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    from benchmarks import cases
+
+    names = [n for n in cases.all_case_names() if not args.case or any(n.startswith(c) for c in args.case)]
+    if not names:
+        print(f"No cases match {args.case}")
+        return 2
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = []
+    for name in names:
+        base_name = name.split("[")[0]
+        iterations = args.iterations or cases.ITERATIONS.get(base_name, cases.DEFAULT_ITERATIONS)
+        print(f"Running {name} x{iterations}...", flush=True)
+        results.append(run_in_subprocess(name, iterations))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+
+    print()
+    _print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    errors = [r for r in results if r.get("error")]
+    for r in errors:
+        print(f"\n{r['case']} failed:\n{r['error']}")
+
+    regressions = compare(results, baseline, args.threshold, args.rss_threshold) if baseline else []
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+
+    return 1 if regressions or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,6 +21,7 @@ create table public.sermons (
   series_title text, -- Optional but helpful for "Current Series" context
   status text default 'pending_processing',
   audio_url text,
+  speech_audio_url text, -- 16 kHz mono Opus copy sent to Gemini (see INGEST_SPEECH_RENDITION)
   processing_error text,
   created_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
@@ -73,3 +74,50 @@ create policy "Enable insert for authenticated users" on public.onboarding_reque
 
 create policy "Enable read for users based on user_id" on public.onboarding_requests
   for select using (auth.uid() = user_id);
+
+-- 7. TRANSCRIPT SEARCH INDEX (segment-level, per church; written by the ingestion worker)
+create extension if not exists btree_gin;
+
+create table public.transcript_segments (
+  id bigint generated always as identity primary key,
+  sermon_id uuid references public.sermons(id) on delete cascade not null,
+  church_id uuid references public.churches(id) not null,
+  start_seconds integer not null,
+  end_seconds integer not null,
+  content text not null,
+  tsv tsvector generated always as (to_tsvector('english', content)) stored
+);
+
+-- church_id inside the GIN index keeps a search proportional to one church's matches
+create index transcript_segments_search_idx on public.transcript_segments using gin (church_id, tsv);
+create index transcript_segments_sermon_idx on public.transcript_segments (sermon_id);
+
+alter table public.transcript_segments enable row level security;
+create policy "Enable read access for all users" on public.transcript_segments for select using (true);
+
+-- Replaces a sermon's segments in one transaction. p_segments: [{"start_seconds", "end_seconds", "text"}]
+create or replace function public.replace_transcript_segments(p_sermon_id uuid, p_church_id uuid, p_segments jsonb)
+returns void language sql as $$
+  delete from public.transcript_segments where sermon_id = p_sermon_id;
+  insert into public.transcript_segments (sermon_id, church_id, start_seconds, end_seconds, content)
+  select p_sermon_id, p_church_id, (seg->>'start_seconds')::int, (seg->>'end_seconds')::int, seg->>'text'
+  from jsonb_array_elements(p_segments) as seg;
+$$;
+
+-- Ranked search (websearch syntax: words, "phrases", OR, -exclude). Snippets are only built for the returned page.
+create or replace function public.search_transcript_segments(p_church_id uuid, p_query text, p_limit integer default 20)
+returns table (sermon_id uuid, start_seconds integer, end_seconds integer, snippet text, rank real)
+language sql stable as $$
+  select hits.sermon_id, hits.start_seconds, hits.end_seconds,
+         ts_headline('english', hits.content, websearch_to_tsquery('english', p_query),
+                     'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=12') as snippet,
+         hits.rank
+  from (
+    select s.sermon_id, s.start_seconds, s.end_seconds, s.content, ts_rank_cd(s.tsv, q) as rank
+    from public.transcript_segments s, websearch_to_tsquery('english', p_query) as q
+    where s.church_id = p_church_id and s.tsv @@ q
+    order by rank desc, s.sermon_id, s.start_seconds
+    limit least(greatest(p_limit, 1), 100)
+  ) as hits
+  order by hits.rank desc, hits.sermon_id, hits.start_seconds;
+$$;
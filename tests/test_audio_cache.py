@@ -0,0 +1,76 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from app.services.audio_cache import AudioCache
+
+
+def _source(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(name.encode().ljust(size, b"\0"))
+    return str(path)
+
+
+def _age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AudioCache(str(tmp_path / "cache"), max_bytes=1000)
+
+
+def test_abandoned_link_is_swept_while_under_budget(cache, tmp_path):
+    sha256 = cache.put(_source(tmp_path, "a", 100), "https://storage/a.mp3")
+    stale = os.path.join(cache.work_dir, f"{int(time.time()) - 2 * 24 * 3600}-crashed.mp3")
+    os.link(cache._object_path(sha256), stale)
+    # A live checkout of the same audio refreshes the shared inode's mtime
+    live, _ = cache.fetch("https://storage/a.mp3")
+
+    cache.evict()
+
+    assert os.listdir(cache.work_dir) == [os.path.basename(live)]
+    assert os.path.exists(cache._object_path(sha256))
+
+
+def test_evict_removes_least_recently_used_first(cache, tmp_path):
+    old = cache.put(_source(tmp_path, "old", 400))
+    mid = cache.put(_source(tmp_path, "mid", 400))
+    _age(cache._object_path(old), 300)
+    _age(cache._object_path(mid), 200)
+
+    new = cache.put(_source(tmp_path, "new", 400))
+
+    assert not os.path.exists(cache._object_path(old))
+    assert os.path.exists(cache._object_path(mid))
+    assert os.path.exists(cache._object_path(new))
+
+
+def test_checked_out_audio_counts_and_is_kept(cache, tmp_path):
+    held = cache.put(_source(tmp_path, "held", 400), "https://storage/held.mp3")
+    link, _ = cache.fetch("https://storage/held.mp3")
+    _age(cache._object_path(held), 300)
+    # A copy in work/ (no hardlink support) holds its own bytes
+    shutil.copyfile(_source(tmp_path, "copy", 400), os.path.join(cache.work_dir, f"{int(time.time())}-copy.mp3"))
+    other = cache.put(_source(tmp_path, "other", 100))
+    _age(cache._object_path(other), 200)
+
+    cache.put(_source(tmp_path, "new", 150))
+
+    assert os.path.exists(cache._object_path(held))  # checked out: deleting it frees nothing
+    assert not os.path.exists(cache._object_path(other))
+    assert os.path.exists(link)
+
+
+def test_put_is_atomic_and_content_addressed(cache, tmp_path):
+    first = cache.put(_source(tmp_path, "a", 100), "https://storage/a.mp3?token=1")
+    second = cache.put(_source(tmp_path, "a", 100))
+    with pytest.raises(FileNotFoundError):
+        cache.put(str(tmp_path / "missing.mp3"))
+
+    assert first == second
+    assert os.listdir(cache.objects_dir) == [first]
+    assert cache.lookup("https://storage/a.mp3?token=2") == first
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from app.config import Config
+from app.services import audio_cache, ingestion_pipeline, repository
+from app.services.audio_cache import AudioCache
+from app.services.ingestion_pipeline import (
+    PENDING_VALUES,
+    STAGE_DONE,
+    STAGE_MEDIA,
+    STAGE_TRANSCRIBE,
+    STAGE_UPLOAD,
+    IngestionPipeline,
+)
+from app.services.repository import SupabaseRepository
+
+
+class CountingRepository(SupabaseRepository):
+    """Records every PostgREST request instead of sending it."""
+
+    def __init__(self):
+        super().__init__("http://supabase.invalid", "test")
+        self.requests = []
+
+    def _execute(self, request):
+        self.requests.append((request["method"], request["url"].strip("/"), request["json"]))
+        return []
+
+
+class FakeIngestion:
+    def validate_audio_file(self, path):
+        pass
+
+
+class FakeStorage:
+    def upload_file(self, path, destination, content_type):
+        return f"https://storage/{destination}"
+
+
+class FakeTranscription:
+    def __init__(self, error=None):
+        self.error = error
+
+    def generate_transcript(self, path, tempo=1.0):
+        if self.error:
+            raise Exception(self.error)
+        return "[00:00] Grace and peace."
+
+
+class FakeIndex:
+    def replace(self, church_id, sermon_id, segments):
+        pass
+
+
+@pytest.fixture
+def repo(monkeypatch, tmp_path):
+    repo = CountingRepository()
+    monkeypatch.setattr(repository, "_repository", repo)
+    monkeypatch.setattr(audio_cache, "_cache", AudioCache(str(tmp_path / "audio_cache")))
+    monkeypatch.setattr(ingestion_pipeline, "get_transcript_index", lambda: FakeIndex())
+    monkeypatch.setattr(Config, "INGEST_SPEECH_RENDITION", False)
+    return repo
+
+
+def _pipeline(transcription):
+    pipeline = IngestionPipeline()
+    pipeline.ingestion = FakeIngestion()
+    pipeline._storage = FakeStorage()
+    pipeline._transcription = transcription
+    return pipeline
+
+
+def _upload(tmp_path):
+    path = tmp_path / "sermon.mp3"
+    path.write_bytes(b"ID3 audio")
+    return IngestionPipeline.initial_payload("sermon-1", str(path), is_youtube=False, church_id="church-1")
+
+
+def test_a_run_writes_the_sermon_twice(repo, tmp_path):
+    pipeline = _pipeline(FakeTranscription())
+    stage, payload = STAGE_MEDIA, _upload(tmp_path)
+    stages = []
+    while stage != STAGE_DONE:
+        stages.append(stage)
+        # Round-trip through JSON like the queue does between stages
+        stage, payload = pipeline.run_stage(stage, "sermon-1", json.loads(json.dumps(payload)))
+
+    assert stages == [STAGE_MEDIA, STAGE_UPLOAD, STAGE_TRANSCRIBE]
+    assert repo.requests == [
+        ("PATCH", "sermons", {"status": "processing_audio"}),
+        ("PATCH", "sermons", {
+            "audio_url": "https://storage/sermon-1/sermon.mp3",
+            "status": "completed",
+            "transcript": "[00:00] Grace and peace.",
+        }),
+    ]
+
+
+def test_failure_keeps_the_uploaded_audio_url(repo, tmp_path):
+    pipeline = _pipeline(FakeTranscription(error="quota"))
+    _, payload = pipeline.run_stage(STAGE_MEDIA, "sermon-1", _upload(tmp_path))
+    _, payload = pipeline.run_stage(STAGE_UPLOAD, "sermon-1", payload)
+    assert payload[PENDING_VALUES] == {"audio_url": "https://storage/sermon-1/sermon.mp3"}
+    assert len(repo.requests) == 1
+
+    with pytest.raises(Exception, match="quota"):
+        pipeline.run_stage(STAGE_TRANSCRIBE, "sermon-1", payload)
+    pipeline.mark_failed("sermon-1", payload, "quota")
+
+    assert repo.requests[1:] == [
+        ("PATCH", "sermons", {
+            "audio_url": "https://storage/sermon-1/sermon.mp3",
+            "status": "failed",
+            "processing_error": "quota",
+        }),
+    ]
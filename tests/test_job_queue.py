@@ -0,0 +1,99 @@
+import pytest
+
+from app.config import Config
+from app.services import job_queue
+from app.services.job_queue import (
+    ALREADY_DONE,
+    ATTACHED,
+    ENQUEUED,
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    JobQueue,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue, "time", clock)
+    monkeypatch.setattr(job_queue.random, "uniform", lambda a, b: 0)
+    monkeypatch.setattr(Config, "JOB_RETRY_BASE_SECONDS", 10)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def test_expired_lease_requeues_the_job(queue, clock):
+    job_id = queue.enqueue("ingest", "media", {"n": 1})
+    assert queue.claim(["media"], "worker-a", lease_seconds=60)["id"] == job_id
+    assert queue.claim(["media"], "worker-b", lease_seconds=60) is None
+
+    clock.now += 61
+    job = queue.claim(["media"], "worker-b", lease_seconds=60)
+    assert job["id"] == job_id
+    assert job["attempts"] == 2
+    # The crashed worker has lost the job
+    assert not queue.heartbeat(job_id, "worker-a")
+    assert not queue.advance(job_id, "worker-a", "upload", {})
+    assert queue.heartbeat(job_id, "worker-b")
+
+
+def test_failed_attempts_back_off_then_fail_permanently(queue, clock):
+    job_id = queue.enqueue("ingest", "media", {}, max_attempts=2)
+
+    queue.claim(["media"], "w")
+    assert queue.fail(job_id, "w", "boom")
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_PENDING
+    assert job["available_at"] == clock.now + 10
+    assert job["last_error"] == "boom"
+
+    assert queue.claim(["media"], "w") is None
+    clock.now += 10
+    assert queue.claim(["media"], "w")["attempts"] == 2
+    assert not queue.fail(job_id, "w", "boom again")
+    assert queue.get(job_id)["status"] == STATUS_FAILED
+
+
+def test_advance_resumes_at_the_next_stage_with_its_payload(queue):
+    job_id = queue.enqueue("ingest", "media", {"input_path": "a.mp4"}, max_attempts=1)
+    queue.claim(["media"], "w")
+    assert queue.advance(job_id, "w", "upload", {"input_path": "a.mp4", "audio_path": "a.mp3"})
+
+    assert queue.claim(["media"], "w") is None
+    job = queue.claim(["upload"], "w")
+    assert job["id"] == job_id
+    assert job["payload"] == {"input_path": "a.mp4", "audio_path": "a.mp3"}
+    # Attempts are per stage, so one failure at a new stage is still retried
+    assert job["attempts"] == 1
+
+    assert queue.complete(job_id, "w")
+    assert queue.get(job_id)["status"] == STATUS_DONE
+
+
+def test_duplicate_submissions_attach_to_the_running_job(queue):
+    outcome, job = queue.enqueue_or_attach("ingest", "media", {}, "sermon-1", "church", "video")
+    assert outcome == ENQUEUED
+
+    outcome, attached = queue.enqueue_or_attach("ingest", "media", {}, "sermon-2", "church", "video")
+    assert outcome == ATTACHED
+    assert attached["id"] == "sermon-1"
+    assert queue.followers("sermon-1") == ["sermon-2"]
+
+    queue.claim(["media"], "w")
+    queue.complete("sermon-1", "w")
+    outcome, done = queue.enqueue_or_attach("ingest", "media", {}, "sermon-3", "church", "video")
+    assert outcome == ALREADY_DONE
+    assert done["id"] == "sermon-1"
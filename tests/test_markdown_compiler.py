@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("reportlab")
+
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import HRFlowable, ListFlowable, Paragraph, Preformatted
+
+from app.services.markdown_compiler import compile_markdown, inline_markup
+
+
+@pytest.fixture(scope="module")
+def styles():
+    sheet = getSampleStyleSheet()
+    return {
+        "h1": sheet["Heading1"],
+        "h2": sheet["Heading2"],
+        "h3": sheet["Heading3"],
+        "body": sheet["BodyText"],
+        "list": sheet["Bullet"],
+        "quote": sheet["Italic"],
+        "code": sheet["Code"],
+    }
+
+
+def _items(flowable):
+    """Each list item's flowables."""
+    return [item._flowables for item in flowable._flowables]
+
+
+@pytest.mark.parametrize("text, markup", [
+    ("**bold _nested_**", "<b>bold <i>nested</i></b>"),
+    ("***both***", "<b><i>both</i></b>"),
+    ("use `a < b` here", 'use <font face="Courier">a &lt; b</font> here'),
+    ("[Give](https://example.org/?a=1&b=2)", '<link href="https://example.org/?a=1&amp;b=2" color="blue">Give</link>'),
+    ("snake_case_name", "snake_case_name"),
+    ("2 * 3 * 4", "2 * 3 * 4"),
+    (r"\*not italic\*", "*not italic*"),
+    ("**never closed", "**never closed"),
+    ("**crossed _tags** here_", "<b>crossed _tags</b> here_"),
+])
+def test_inline_markup(text, markup):
+    assert inline_markup(text) == markup
+
+
+def test_headings_and_paragraphs(styles):
+    flowables = compile_markdown("# Title\n#### Deep ##\nFirst line\nsoft-wrapped  \nhard break\n\nSecond", styles)
+
+    assert [type(f) for f in flowables] == [Paragraph] * 4
+    assert [(f.text, f.style.name) for f in flowables] == [
+        ("Title", "Heading1"),
+        ("Deep", "Heading3"),  # levels past 3 use the h3 style
+        ("First line soft-wrapped<br/>hard break", "BodyText"),
+        ("Second", "BodyText"),
+    ]
+
+
+def test_nested_and_ordered_lists(styles):
+    flowables = compile_markdown("- one\n- **two**\n  - inner\n\nAfter\n\n3. three\n4. four", styles)
+
+    bullets, after, ordered = flowables
+    assert isinstance(bullets, ListFlowable)
+    one, two = _items(bullets)
+    assert [p.text for p in one] == ["one"]
+    assert two[0].text == "<b>two</b>"
+    assert [p.text for p in _items(two[1])[0]] == ["inner"]
+    assert after.text == "After"
+    assert ordered._start == 3
+    assert [item[0].text for item in _items(ordered)] == ["three", "four"]
+
+
+def test_quotes_code_and_rules(styles):
+    flowables = compile_markdown("> quoted\n> on two lines\n```\nx < y\n  **raw**\n```\n---", styles)
+
+    quote, code, rule = flowables
+    assert (quote.text, quote.style.name) == ("quoted on two lines", "Italic")
+    assert isinstance(code, Preformatted)
+    assert code.lines == ["x < y", "  **raw**"]
+    assert isinstance(rule, HRFlowable)
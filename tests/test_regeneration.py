@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+from app.config import Config
+from app.services import regeneration
+from app.services.regeneration import (
+    ITEM_DONE,
+    ITEM_FAILED,
+    ITEM_PENDING,
+    MODE_BATCH,
+    MODE_GENERATE,
+    CatalogRegenerator,
+    LocalBatchBackend,
+    RegenerationCheckpoint,
+    Selection,
+)
+
+SELECTION = Selection(church_id="church-1")
+ITEMS = [
+    {"asset_id": f"{sermon}-{asset_type}", "sermon_id": sermon, "asset_type": asset_type}
+    for sermon in ("s1", "s2", "s3")
+    for asset_type in ("small_group", "devotional")
+]
+
+
+class FakeContentEngine:
+    def __init__(self):
+        self.stored = {}
+
+    def batch_request(self, profile, transcript, asset_type, use_cache=True, sources=None):
+        key = f"{transcript}:{asset_type}"
+        return key, {"contents": key}, None
+
+    def store_response(self, key, text):
+        self.stored[key] = text
+
+
+class FakePipeline:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.content_engine = FakeContentEngine()
+        self.generated = []
+        self.published = {}
+        self._lock = threading.Lock()
+
+    def load_context(self, sermon_id, columns):
+        return {"sermon_id": sermon_id, "transcript": sermon_id, "profile": None}
+
+    def run_batch(self, asset_ids, context):
+        with self._lock:
+            self.generated.extend(asset_ids.values())
+        return {
+            asset_type: {"status": "error", "error": "boom"} if asset_id in self.failing else {"status": "success"}
+            for asset_type, asset_id in asset_ids.items()
+        }
+
+    def publish(self, asset_id, asset_type, context, markdown, save_markdown=True):
+        with self._lock:
+            self.published[asset_id] = markdown
+        return {"status": "success"}
+
+
+@pytest.fixture
+def checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(regeneration, "select_assets", lambda selection: [dict(item) for item in ITEMS])
+    monkeypatch.setattr(Config, "GENERATION_TOKEN_COUNTER", "local")
+    monkeypatch.setattr(Config, "REGENERATION_BATCH_POLL_SECONDS", 0)
+    return RegenerationCheckpoint(str(tmp_path / "regeneration.db"))
+
+
+def _statuses(checkpoint, run_id):
+    return {item["asset_id"]: item["status"] for item in checkpoint.items(run_id, (ITEM_PENDING, ITEM_DONE, ITEM_FAILED))}
+
+
+def test_resume_retries_only_failed_and_pending_assets(checkpoint):
+    first = FakePipeline(failing={"s2-devotional"})
+    counts = CatalogRegenerator(MODE_GENERATE, concurrency=2, checkpoint=checkpoint, pipeline=first).run(SELECTION, run_id="r")
+    assert counts == {ITEM_DONE: 5, ITEM_FAILED: 1}
+
+    # As if the process was killed before reaching s3
+    checkpoint.mark("r", "s3-small_group", ITEM_PENDING)
+    checkpoint.mark("r", "s3-devotional", ITEM_PENDING)
+
+    second = FakePipeline()
+    counts = CatalogRegenerator(MODE_GENERATE, concurrency=2, checkpoint=checkpoint, pipeline=second).run(SELECTION, run_id="r")
+
+    assert sorted(second.generated) == ["s2-devotional", "s3-devotional", "s3-small_group"]
+    assert counts == {ITEM_DONE: 6}
+
+
+def test_restart_discards_the_checkpoint(checkpoint):
+    CatalogRegenerator(MODE_GENERATE, checkpoint=checkpoint, pipeline=FakePipeline()).run(SELECTION, run_id="r")
+    pipeline = FakePipeline()
+    CatalogRegenerator(MODE_GENERATE, checkpoint=checkpoint, pipeline=pipeline).run(SELECTION, run_id="r", restart=True)
+    assert sorted(pipeline.generated) == sorted(item["asset_id"] for item in ITEMS)
+
+
+def test_local_batch_results_map_back_by_batch_index(checkpoint, monkeypatch):
+    def generate(request):
+        # Finish out of order; results must still line up with the requests
+        time.sleep(0.01 * (hash(request["contents"]) % 3))
+        return f"text for {request['contents']}", None
+
+    monkeypatch.setattr(LocalBatchBackend, "_generate", staticmethod(generate))
+    monkeypatch.setattr(Config, "REGENERATION_BATCH_MAX_REQUESTS", 4)
+    pipeline = FakePipeline()
+
+    counts = CatalogRegenerator(
+        MODE_BATCH, concurrency=3, checkpoint=checkpoint, pipeline=pipeline, batch_backend=LocalBatchBackend()
+    ).run(SELECTION, run_id="b")
+
+    assert counts == {ITEM_DONE: 6}
+    assert pipeline.published == {
+        item["asset_id"]: f"text for {item['sermon_id']}:{item['asset_type']}" for item in ITEMS
+    }
+    assert pipeline.content_engine.stored == {
+        f"{item['sermon_id']}:{item['asset_type']}": f"text for {item['sermon_id']}:{item['asset_type']}" for item in ITEMS
+    }
+
+
+def test_batch_preparation_failure_only_fails_that_sermon(checkpoint, monkeypatch):
+    class Planner(regeneration.SermonInputPlanner):
+        def __init__(self, transcript, *args, **kwargs):
+            if transcript == "s2":
+                raise RuntimeError("bad transcript")
+            super().__init__(transcript, *args, **kwargs)
+
+    monkeypatch.setattr(regeneration, "SermonInputPlanner", Planner)
+    monkeypatch.setattr(LocalBatchBackend, "_generate", staticmethod(lambda request: ("ok", None)))
+
+    counts = CatalogRegenerator(
+        MODE_BATCH, concurrency=2, checkpoint=checkpoint, pipeline=FakePipeline(), batch_backend=LocalBatchBackend()
+    ).run(SELECTION, run_id="b")
+
+    assert counts == {ITEM_DONE: 4, ITEM_FAILED: 2}
+    assert _statuses(checkpoint, "b")["s2-small_group"] == ITEM_FAILED
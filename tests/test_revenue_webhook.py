@@ -0,0 +1,71 @@
+import pytest
+
+stripe = pytest.importorskip("stripe")
+
+from app.services import revenue_service
+from app.services.revenue_service import RevenueService
+
+
+class FakeRepository:
+    def __init__(self, rows):
+        self.rows = rows
+        self.updates = []
+
+    def update(self, table, values, filters, returning=None):
+        self.updates.append((table, values, filters))
+        return self.rows
+
+
+def _event(event_type, obj):
+    return stripe.Event.construct_from(
+        {"id": "evt_test", "object": "event", "type": event_type, "data": {"object": obj}},
+        "sk_test",
+    )
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    repository = FakeRepository([{"id": "church-1"}])
+    monkeypatch.setattr(revenue_service, "get_repository", lambda: repository)
+    return repository
+
+
+def test_subscription_updated_by_customer(repository):
+    service = RevenueService()
+    service.entitlements.prime("church-1", "active")
+    event = _event("customer.subscription.updated", {
+        "object": "subscription", "id": "sub_1", "customer": "cus_1", "status": "past_due", "metadata": {},
+    })
+
+    assert service.apply_webhook_event(event) == ["church-1"]
+    assert repository.updates == [("churches", {"subscription_status": "past_due"}, {"stripe_customer_id": "cus_1"})]
+    assert service.entitlements.get("church-1") is None
+
+
+def test_subscription_deleted_by_church_metadata(repository):
+    event = _event("customer.subscription.deleted", {
+        "object": "subscription", "id": "sub_1", "customer": "cus_1", "status": "active",
+        "metadata": {"church_id": "church-1"},
+    })
+
+    assert RevenueService().apply_webhook_event(event) == ["church-1"]
+    assert repository.updates == [("churches", {"subscription_status": "inactive"}, {"id": "church-1"})]
+
+
+def test_checkout_completed(repository):
+    event = _event("checkout.session.completed", {
+        "object": "checkout.session", "id": "cs_1", "mode": "subscription", "customer": "cus_1",
+        "client_reference_id": "church-1", "payment_status": "paid",
+    })
+
+    assert RevenueService().apply_webhook_event(event) == ["church-1"]
+    assert repository.updates == [
+        ("churches", {"stripe_customer_id": "cus_1", "subscription_status": "active"}, {"id": "church-1"})
+    ]
+
+
+def test_unhandled_event_is_ignored(repository):
+    event = _event("invoice.paid", {"object": "invoice", "id": "in_1", "customer": "cus_1"})
+
+    assert RevenueService().apply_webhook_event(event) == []
+    assert repository.updates == []
@@ -0,0 +1,64 @@
+import hashlib
+import io
+
+import httpx
+import pytest
+
+from app.config import Config
+from app.services import storage_service, supabase_client
+from app.services.storage_service import READ_SIZE, StorageService
+
+
+class RecordingFile(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+class FakeSupabase:
+    class storage:
+        @staticmethod
+        def from_(bucket):
+            return type("Bucket", (), {"get_public_url": lambda self, path: f"https://cdn/{bucket}/{path}"})()
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    requests = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append((request, request.read()))
+        return httpx.Response(200, json={})
+
+    client = httpx.Client(transport=httpx.MockTransport(handle))
+    monkeypatch.setattr(supabase_client, "_client", FakeSupabase())
+    monkeypatch.setattr(storage_service.StorageService, "http", property(lambda self: client))
+    monkeypatch.setattr(Config, "SUPABASE_URL", "https://project.supabase.co")
+    monkeypatch.setattr(Config, "SUPABASE_KEY", "service-key")
+    return requests
+
+
+def test_small_upload_streams_in_pieces(requests):
+    data = bytes(range(256)) * (2 * READ_SIZE // 256 + 100)
+    fileobj = RecordingFile(data)
+
+    result = StorageService("assets").upload_fileobj(fileobj, "sermon 1/guide.pdf", "application/pdf")
+
+    assert result == {
+        "public_url": "https://cdn/assets/sermon 1/guide.pdf",
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "size": len(data),
+    }
+    assert all(0 < size <= READ_SIZE for size in fileobj.reads)
+    (request, body), = requests
+    assert request.method == "POST"
+    assert request.url.path == "/storage/v1/object/assets/sermon 1/guide.pdf"
+    assert request.headers["content-type"] == "application/pdf"
+    assert request.headers["content-length"] == str(len(data))
+    assert request.headers["x-upsert"] == "true"
+    assert request.headers["authorization"] == "Bearer service-key"
+    assert body == data